@@ -6,16 +6,24 @@ View README.md for usage: https://github.com/Mcaruano/MTGGoldfishScraper/blob/ma
 from __future__ import print_function
 import six
 from six.moves import cPickle as pickle
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.parse import parse_qs, quote, urlparse, urlunparse
+from six.moves.urllib.request import urlopen
 from datetime import datetime
 import errno
+import hashlib
+import heapq
+import json
 from optparse import OptionParser
 import os
-from progress.bar import IncrementalBar
 import re
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
+import socket
+import sqlite3
 import sys
+import threading
 import time
+import unicodedata
+import zlib
 
 __author__ = "Matthew Caruano"
 __date__ = "10/5/2017"
@@ -42,6 +50,428 @@ DECK_PRICE_KEY = 'Deck Price'
 SHARED_CARDS_KEY = 'Shared Cards'
 SHARED_VALUE_KEY = 'Shared Value'
 
+# Cheapest completion path dict keys
+BUY_PATH_KEY = 'Buy Path'
+DIRECT_COST_KEY = 'Direct Cost'
+EXTRA_SPEND_KEY = 'Extra Spend'
+STEP_KEY = 'Step'
+STEP_COST_KEY = 'Step Cost'
+STEP_VALUE_KEY = 'Step Value'
+TOTAL_SPEND_KEY = 'Total Spend'
+BUY_PATH_MAX_STEPS = 3
+
+# What to buy next dict keys
+COPIES_NEEDED_KEY = 'Copies Needed'
+DECKS_USING_KEY = 'Decks Using'
+WEIGHTED_VALUE_KEY = 'Weighted Value'
+BUY_NEXT_CARD_COUNT = 25
+
+# Card statistics dict keys
+PLAY_RATE_KEY = 'Play Rate'
+TOTAL_COPIES_KEY = 'Total Copies'
+TOTAL_VALUE_KEY = 'Total Value'
+CARD_STATISTICS_SORT_KEYS = {'decks': DECKS_USING_KEY, 'copies': TOTAL_COPIES_KEY, 'value': TOTAL_VALUE_KEY}
+
+# Spend limit completion plan dict keys
+CANDIDATE_DECK_COUNT_KEY = 'Candidate Decks'
+COMPLETED_DECKS_KEY = 'Completed Decks'
+PLAN_IS_OPTIMAL_KEY = 'Optimal'
+SPEND_LIMIT_KEY = 'Spend Limit'
+SPEND_PLAN_MAX_SEARCH_NODES = 20000
+
+# Report model keys, as used by the report renderers
+BUDGET_DECKS_KEY = 'Budget Decks'
+CLUSTER_KEY = 'Cluster'
+CLUSTER_DECKS_KEY = 'Decks'
+DECK_NAME_KEY = 'Deck Name'
+DESIRED_DECK_NAME_KEY = 'Desired Deck Name'
+DESIRED_DECK_PRICE_KEY = 'Desired Deck Price'
+PRICE_UNIT_KEY = 'Price Unit'
+RANK_KEY = 'Rank'
+REMAINING_COST_KEY = 'Remaining Cost'
+REPORT_ENTRIES_KEY = 'Entries'
+REPORT_SECTION_KEY = 'Section'
+REPORT_SECTIONS_KEY = 'Sections'
+SIMILAR_DECKS_KEY = 'Similar Decks'
+SIMILARITY_KEY = 'Similarity'
+
+# Report section types
+REPORT_SECTION_OWNED_CARDS = 'Owned Cards'
+REPORT_SECTION_METAGAME = 'Metagame Recommendation'
+REPORT_SECTION_BUDGET = 'Budget'
+REPORT_SECTION_SIMILAR_DECKS = 'Similar Metagame Decks'
+REPORT_SECTION_DECK_CLUSTERS = 'Metagame Deck Clusters'
+REPORT_SECTION_BUY_PATH = 'Cheapest Completion Path'
+REPORT_SECTION_BUY_NEXT = 'What To Buy Next'
+REPORT_SECTION_SPEND_PLAN = 'Spend Limit Completion Plan'
+REPORT_SECTION_CARD_STATISTICS = 'Card Statistics'
+
+# The columns of the tabular (CSV and Parquet) reports
+REPORT_TABLE_COLUMNS = [REPORT_SECTION_KEY, DESIRED_DECK_NAME_KEY, DESIRED_DECK_PRICE_KEY, DIRECT_COST_KEY, CLUSTER_KEY, RANK_KEY, STEP_KEY, DECK_NAME_KEY,
+                        DECK_PRICE_KEY, SIMILARITY_KEY, SHARED_CARDS_KEY, SHARED_VALUE_KEY, OWNED_CARDS_KEY, SAVED_VALUE_KEY, STEP_COST_KEY, STEP_VALUE_KEY,
+                        EXTRA_SPEND_KEY, REMAINING_COST_KEY, TOTAL_SPEND_KEY, CARD_NAME_KEY, CARD_PRICE_KEY, COPIES_NEEDED_KEY, DECKS_USING_KEY,
+                        WEIGHTED_VALUE_KEY, PLAY_RATE_KEY, TOTAL_COPIES_KEY, TOTAL_VALUE_KEY, PRICE_UNIT_KEY, CARD_LIST_KEY]
+
+# Card name normalization. Basic Lands are never part of any analysis
+BASIC_LAND_NAMES = ["Mountain", "Swamp", "Plains", "Island", "Forest"]
+CARD_NAME_CHARACTER_REPLACEMENTS = {u'\u00c6': u'Ae', u'\u00e6': u'ae', u'\u2018': u"'", u'\u2019': u"'", u'\u201c': u'"', u'\u201d': u'"'}
+SPLIT_CARD_SEPARATOR_REGEX = re.compile(r'\s*/{1,2}\s*')
+
+# Owned card import. A line is "<qty> <card name>", optionally as "<qty>x" and optionally followed by a set code in brackets or
+# parentheses (and a collector number), such as "4x Scalding Tarn [ZEN]" or "4 Scalding Tarn (ZEN) 229"
+OWNED_CARD_LINE_REGEX = re.compile(r'^(\d+)\s*x?\s+(.+?)(?:\s*[\[(][^\])]*[\])](?:\s*[\w-]+)?)?$', re.IGNORECASE)
+OWNED_CARDS_CSV_QUANTITY_COLUMNS = ['count', 'quantity', 'qty', 'amount']
+OWNED_CARDS_CSV_NAME_COLUMNS = ['name', 'card name', 'card']
+
+# Deck similarity. Card vectors are weighted by quantity or by the total price of the copies, and decks at least this
+# similar are grouped into the same cluster of near-duplicate lists
+SIMILARITY_WEIGHT_BY_QUANTITY = 'quantity'
+SIMILARITY_WEIGHT_BY_PRICE = 'price'
+SIMILAR_DECK_CLUSTER_THRESHOLD = 0.8
+
+# Evaluation results persisted between runs, so that collection edits only re-evaluate the decks they affect
+EVALUATION_CACHE_FILE_NAME = 'evaluation_cache'
+EVALUATION_CACHE_FORMAT_NAME = 'mtggoldfish-evaluations'
+EVALUATION_CACHE_VERSION = 3
+EVALUATION_CACHE_FORMAT_KEY = 'Format'
+EVALUATION_CACHE_VERSION_KEY = 'Version'
+EVALUATION_CACHE_COLLECTION_KEY = 'Collection'
+EVALUATION_CACHE_RESULTS_KEY = 'Results'
+
+# Every MTGGoldfish.com URL the script builds or reads from desired_decks.txt is rebased onto this, so that the fetch layer
+# can be pointed at a local stand-in server
+MTGGOLDFISH_DEFAULT_BASE_URL = 'https://www.mtggoldfish.com'
+MTGGOLDFISH_BASE_URL = MTGGOLDFISH_DEFAULT_BASE_URL
+
+# Browser configuration for the Selenium backend. Resource blocking turns off images, stylesheets and web fonts, and the
+# proxy auto-config script sends every host other than MTGGoldfish.com (or the base URL's host) to a port nothing listens on
+BROWSER_HEADLESS = True
+BROWSER_BLOCK_RESOURCES = True
+BROWSER_PAGE_LOAD_STRATEGY = 'eager'
+BROWSER_WAIT_TIMEOUT_SECONDS = 30
+BROWSER_BLOCKING_PREFERENCES = {'permissions.default.image': 2, 'permissions.default.stylesheet': 2, 'browser.display.use_document_fonts': 0,
+                                'media.autoplay.default': 5, 'dom.webnotifications.enabled': False}
+BROWSER_PROXY_AUTOCONFIG_SCRIPT = ('function FindProxyForURL(url, host) {'
+                                   ' if (host == "%s" || dnsDomainIs(host, ".%s")) { return "DIRECT"; }'
+                                   ' return "PROXY 127.0.0.1:9"; }')
+
+# Scripts run in the browser to extract all of the data we need from a page in a single WebDriver round trip. The deck page
+# script takes the id of the price tab to read ('tab-paper' or 'tab-online') and returns the text of every cell of the deck
+# table. The landing page script takes the class of the price container holding each tile's deck link and returns the link
+# and Metagame share (if listed) of every tile
+DECK_PAGE_EXTRACTION_SCRIPT = """
+var deckTable = document.getElementById(arguments[0]).querySelector(
+    '.deck-view-decklist .deck-view-decklist-inner .deck-view-deck-table tbody');
+var rows = [];
+var rowElements = deckTable.querySelectorAll('tr');
+for (var i = 0; i < rowElements.length; i++) {
+    var cellElements = rowElements[i].querySelectorAll('td');
+    var cells = [];
+    for (var j = 0; j < cellElements.length; j++) {
+        cells.push(cellElements[j].textContent);
+    }
+    rows.push(cells);
+}
+return {'title': document.querySelector('.deck-view-title').textContent,
+        'description': document.querySelector('.deck-view-description').textContent,
+        'rows': rows};
+"""
+# Anything in the text of a deck table price cell that isn't part of the number, such as a currency symbol, thousands
+# separators or the surrounding whitespace
+DECK_PAGE_PRICE_IGNORED_CHARACTERS_REGEX = re.compile(r'[^0-9.]')
+LANDING_PAGE_EXTRACTION_SCRIPT = """
+var tiles = [];
+var tileElements = document.getElementsByClassName('archetype-tile');
+for (var i = 0; i < tileElements.length; i++) {
+    var link = tileElements[i].querySelector(
+        '.archetype-tile-description-wrapper .archetype-tile-description .' + arguments[0] + ' a');
+    var share = tileElements[i].querySelector('.metagame-percentage .archetype-tile-statistic-value');
+    tiles.push({'url': link ? link.href : null, 'share': share ? share.textContent : null});
+}
+return tiles;
+"""
+
+# The shared fetch queue. A claimed deck goes back into the queue if its worker hasn't completed it within the lease, and is
+# given up on after failing this many times
+FETCH_TASK_PENDING = 'pending'
+FETCH_TASK_CLAIMED = 'claimed'
+FETCH_TASK_DONE = 'done'
+FETCH_TASK_FAILED = 'failed'
+FETCH_QUEUE_LEASE_SECONDS = 300
+FETCH_QUEUE_MAX_ATTEMPTS = 3
+FETCH_QUEUE_POLL_SECONDS = 5
+FETCH_QUEUE_LOCK_TIMEOUT_SECONDS = 60
+
+# Deck cache bookkeeping. The index file inside deck_cache records when each deck was last used by a run
+DECK_CACHE_INDEX_FILE_NAME = '.index'
+CACHE_HITS_KEY = 'hits'
+CACHE_MISSES_KEY = 'misses'
+CACHE_STALE_KEY = 'stale'
+CACHE_EVICTED_KEY = 'evicted'
+DECK_CACHE_TEMPORARY_FILE_PREFIX = '.tmp-'
+DECK_CACHE_FILE_NAME_PATTERN = re.compile(r'^[^_]+_\d{2}_\d{2}_\d{4}$')
+
+# Per-format card statistics, kept in the deck cache directory next to the index. See CardStatistics
+CARD_STATISTICS_FILE_NAME = '.card_statistics'
+CARD_STATISTICS_VERSION = 1
+CARD_STATISTICS_VERSION_KEY = 'Version'
+CARD_STATISTICS_FORMATS_KEY = 'Formats'
+CARD_STATISTICS_DECKS_KEY = 'Decks'
+CARD_STATISTICS_CARDS_KEY = 'Cards'
+CARD_STATISTICS_CARD_COUNT = 25
+
+# Cached deck file format, see encode_deck_for_cache. Bump DECK_FILE_VERSION whenever the format changes
+DECK_CACHE_COMPRESSION = True
+DECK_FILE_FORMAT_NAME = 'mtggoldfish-deck'
+DECK_FILE_VERSION = 1
+DECK_FILE_ZLIB_HEADER = b'\x78'
+DECK_FILE_FORMAT_KEY = 'Format'
+DECK_FILE_VERSION_KEY = 'Version'
+DECK_FILE_NAME_KEY = 'Name'
+DECK_FILE_URL_KEY = 'URL'
+DECK_FILE_DATE_KEY = 'Date'
+DECK_FILE_PRICE_KEY = 'Price'
+DECK_FILE_DECK_HASH_KEY = 'Deck Hash'
+DECK_FILE_PAGE_HASH_KEY = 'Page Hash'
+DECK_FILE_PRICE_TYPE_KEY = 'Price Type'
+DECK_FILE_PRICES_FETCHED_KEY = 'Prices Fetched'
+
+# Plain-text decklists, which MTGGoldfish.com serves for numeric /deck/<id> URLs. They only list "<quantity> <card name>"
+# lines, so cards are priced from decks fetched within the last PRICE_BOOK_MAX_AGE_DAYS
+PRICE_TYPE_PAPER = 'paper'
+PRICE_TYPE_ONLINE = 'online'
+PRICE_BOOK_MAX_AGE_DAYS = 1
+TEXT_DECKLIST_URL_FORMAT = '%s://%s/deck/download/%s'
+TEXT_DECKLIST_LINE_REGEX = re.compile(r'^(\d+)\s+(.+)$')
+TEXT_DECKLIST_TIMEOUT_SECONDS = 30
+
+# Adaptive fetch concurrency. Decks that need fetching are fetched by up to FETCH_MAX_IN_FLIGHT threads at once, each with
+# its own browser. The number actually in flight starts at FETCH_MIN_IN_FLIGHT, grows by one for every round of fast,
+# successful fetches and is halved whenever a fetch is throttled, fails or takes longer than FETCH_TARGET_LATENCY_SECONDS
+FETCH_MIN_IN_FLIGHT = 1
+FETCH_MAX_IN_FLIGHT = 4
+FETCH_TARGET_LATENCY_SECONDS = 10.0
+FETCH_DECREASE_FACTOR = 0.5
+FETCH_MAX_ATTEMPTS = 5
+FETCH_RETRY_BACKOFF_SECONDS = 2
+FETCH_THROTTLE_BACKOFF_SECONDS = 5
+FETCH_THROTTLE_MAX_BACKOFF_SECONDS = 60
+FETCH_THROTTLE_STATUS_CODES = [429, 503]
+FETCH_THROTTLE_PAGE_TITLES = ['Too Many Requests', 'Service Unavailable']
+FETCH_OUTCOME_SUCCESS = 'success'
+FETCH_OUTCOME_THROTTLED = 'throttled'
+FETCH_OUTCOME_ERROR = 'error'
+
+# Deck fetch planning. The views each analysis retrieves its decks by, in the order their decks are fetched, and the kinds
+# of deck URLs on MTGGoldfish.com
+DECK_VIEW_DESIRED = 'desired'
+DECK_VIEW_METAGAME = 'metagame'
+DECK_VIEW_BUDGET = 'budget'
+DECK_VIEW_PRIORITIES = {DECK_VIEW_DESIRED: 0, DECK_VIEW_METAGAME: 1, DECK_VIEW_BUDGET: 2}
+DECK_URL_KINDS = ['deck', 'archetype']
+
+# Progress bars are disabled while running as a daemon, since there is no terminal watching them
+SHOW_PROGRESS_BARS = True
+
+
+"""
+Progress bar stand-in used whenever SHOW_PROGRESS_BARS is False
+"""
+class SilentProgressBar(object):
+    def next(self, n=1):
+        pass
+
+    def finish(self):
+        pass
+
+
+"""
+Create the progress bar used by every fetch and evaluation loop
+
+:param message: The label printed in front of the bar
+:param max_value: The number of steps the bar will be advanced in total
+"""
+def new_progress_bar(message, max_value):
+    if not SHOW_PROGRESS_BARS:
+        return SilentProgressBar()
+
+    # Imported here so that runs which never show a bar don't pay for the import
+    from progress.bar import IncrementalBar
+    return IncrementalBar(message, max=max_value, suffix='%(percent)d%%')
+
+
+"""
+Launch the browser used to scrape MTGGoldfish.com. Selenium is only imported once a network fetch
+is actually needed, which keeps runs served entirely from the cache fast to start.
+
+Since we only ever read a few text nodes, the browser is configured to do as little work as possible: it runs headless
+(so it also works on machines without a display), doesn't download images, stylesheets or web fonts, routes every host
+other than MTGGoldfish.com to a dead proxy so ads and trackers never load, and hands pages back as soon as the DOM is
+ready instead of waiting for every resource. See BROWSER_HEADLESS and BROWSER_BLOCK_RESOURCES to turn this off.
+"""
+def new_web_driver():
+    from selenium import webdriver
+    options = webdriver.FirefoxOptions()
+    if BROWSER_HEADLESS:
+        options.add_argument('-headless')
+    if BROWSER_BLOCK_RESOURCES:
+        for (preference_name, preference_value) in six.iteritems(BROWSER_BLOCKING_PREFERENCES):
+            options.set_preference(preference_name, preference_value)
+        options.set_preference('network.proxy.type', 2)
+        allowed_domain = get_mtggoldfish_domain()
+        options.set_preference('network.proxy.autoconfig_url',
+                               'data:application/x-ns-proxy-autoconfig,' + quote(BROWSER_PROXY_AUTOCONFIG_SCRIPT % (allowed_domain, allowed_domain)))
+    options.set_capability('pageLoadStrategy', BROWSER_PAGE_LOAD_STRATEGY)
+    return webdriver.Firefox(options=options)
+
+
+"""
+Return the domain the browser is allowed to load pages from, which is the host of MTGGOLDFISH_BASE_URL without any
+"www." prefix, such as "mtggoldfish.com"
+"""
+def get_mtggoldfish_domain():
+    host = urlparse(MTGGOLDFISH_BASE_URL).hostname
+    if host.startswith('www.'):
+        return host[len('www.'):]
+    return host
+
+
+"""
+Rebase an MTGGoldfish.com URL onto MTGGOLDFISH_BASE_URL, keeping its path and fragment. URLs are returned untouched
+unless the base URL was changed with "--base-url".
+
+:param url: The URL to rebase, such as "https://www.mtggoldfish.com/deck/784979#paper"
+"""
+def rebase_mtggoldfish_url(url):
+    if MTGGOLDFISH_BASE_URL == MTGGOLDFISH_DEFAULT_BASE_URL:
+        return url
+
+    parsed_url = urlparse(url.strip())
+    parsed_base_url = urlparse(MTGGOLDFISH_BASE_URL)
+    return urlunparse((parsed_base_url.scheme, parsed_base_url.netloc, parsed_url.path, parsed_url.params, parsed_url.query, parsed_url.fragment))
+
+
+"""
+Block until an element with the given class name is present on the current page. With the eager page load strategy
+the browser hands the page back before it has finished loading, so we wait for the element we're about to read instead.
+
+:param driver: The WebDriver that navigated to the page
+:param class_name: The class name of the element to wait for, such as "deck-view-deck-table"
+"""
+def wait_for_element_by_class_name(driver, class_name):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions
+    from selenium.webdriver.support.ui import WebDriverWait
+    WebDriverWait(driver, BROWSER_WAIT_TIMEOUT_SECONDS).until(expected_conditions.presence_of_element_located((By.CLASS_NAME, class_name)))
+
+
+"""
+Normalize a card name so that every spelling of the same card compares equal. Names are case folded, accents are stripped
+("Lim-Dûl's Vault" matches "Lim-Dul's Vault"), ligatures and typographic apostrophes are spelled out ("Æther Vial" matches
+"Aether Vial"), whitespace is collapsed and the halves of split cards are always joined by " // " ("Fire/Ice" matches "Fire // Ice").
+
+:param card_name: The card name as parsed from MTGGoldfish.com or owned_cards.txt
+"""
+def normalize_card_name(card_name):
+    if isinstance(card_name, bytes):
+        card_name = card_name.decode('utf-8', 'replace')
+    card_name = unicodedata.normalize('NFKD', card_name)
+    card_name = u''.join([character for character in card_name if not unicodedata.combining(character)])
+    for (character, replacement) in six.iteritems(CARD_NAME_CHARACTER_REPLACEMENTS):
+        card_name = card_name.replace(character, replacement)
+    card_name = SPLIT_CARD_SEPARATOR_REGEX.sub(u' // ', u' '.join(card_name.split()))
+    if six.PY2:
+        return card_name.lower()
+    return card_name.casefold()
+
+
+"""
+Hands out a canonical integer id for every distinct card, so that parsing, caching and every evaluation compare cards with
+integer equality instead of re-normalizing names over and over. Each raw spelling is only normalized the first time it is
+seen. Identical spellings are also interned to a single string object, so hundreds of decks that play the same card
+share one copy of its name.
+
+A daemon answers queries with begin_lookups_only, so the owned cards a query sends are looked up without being added,
+and the interner only grows with the resident decks rather than with every spelling any query has ever sent.
+"""
+class CardNameInterner(object):
+    def __init__(self):
+        self.card_ids_by_raw_name = {}
+        self.card_ids_by_normalized_name = {}
+        self.card_names = []
+        self.interned_raw_names = {}
+        self.lock = threading.Lock()
+        self.thread_state = threading.local()
+
+    """
+    Return the id of the given card, allocating a new one if this is the first time the card has been seen. Between
+    begin_lookups_only and end_lookups_only, a card that hasn't been seen is keyed by its normalized name instead, which
+    still compares equal for every spelling of it but is never stored, and new spellings of known cards aren't remembered.
+    """
+    def get_card_id(self, card_name):
+        card_id = self.card_ids_by_raw_name.get(card_name)
+        if card_id is not None:
+            return card_id
+
+        normalized_card_name = normalize_card_name(card_name)
+        if getattr(self.thread_state, 'lookups_only', False):
+            return self.card_ids_by_normalized_name.get(normalized_card_name, normalized_card_name)
+
+        with self.lock:
+            card_id = self.card_ids_by_normalized_name.get(normalized_card_name)
+            if card_id is None:
+                card_id = len(self.card_names)
+                self.card_ids_by_normalized_name[normalized_card_name] = card_id
+                self.card_names.append(card_name)
+            self.card_ids_by_raw_name[card_name] = card_id
+        return card_id
+
+    """
+    Stop the current thread from adding cards, see get_card_id. Only safe once every card of every deck the thread is
+    about to evaluate has been seen, such as the fully decoded resident decks of a daemon
+    """
+    def begin_lookups_only(self):
+        self.thread_state.lookups_only = True
+
+    def end_lookups_only(self):
+        self.thread_state.lookups_only = False
+
+    """
+    Return the spelling the card with the given id was first seen with
+    """
+    def get_card_name(self, card_id):
+        if not isinstance(card_id, six.integer_types):
+            return card_id
+        return self.card_names[card_id]
+
+    """
+    Return a single shared string object for this exact spelling of a card name
+    """
+    def intern_card_name(self, card_name):
+        return self.interned_raw_names.setdefault(card_name, card_name)
+
+
+CARD_NAMES = CardNameInterner()
+
+
+"""
+Return the key that two card names must share to be considered the same card, which is the card's interned id, or its
+normalized name for a card looked up without being added, see CardNameInterner.get_card_id
+"""
+def get_card_key(card_name):
+    return CARD_NAMES.get_card_id(card_name)
+
+
+"""
+Return True if the given card is a Basic Land, which we don't care about in any analysis
+"""
+def is_basic_land(card_name):
+    return get_card_key(card_name) in BASIC_LAND_CARD_KEYS
+
+
+BASIC_LAND_CARD_KEYS = frozenset([get_card_key(basic_land_name) for basic_land_name in BASIC_LAND_NAMES])
+
+
 """
 Deck class to contain all of the information pertaining to a single deck
 """
@@ -53,11 +483,25 @@ class Deck(object):
         self.deck_price = 0.0
         self.deck_list = []
 
+        # Content hashes of the parsed deck and of the page data it was parsed from, see get_deck_hash and get_page_data_hash
+        self.deck_hash = None
+        self.page_hash = None
+
+        # PRICE_TYPE_PAPER or PRICE_TYPE_ONLINE, depending on which prices the deck was fetched with
+        self.price_type = None
+
+        # When the prices were last read from the full deck page, as a timestamp. None for decks priced from the PriceBook
+        self.prices_fetched_time = None
+
+        # A deck loaded from the cache keeps its deck list encoded until the list is first needed, see decode_deck_from_cache
+        self.encoded_deck_list = None
+
     def get_deck_name(self):
-        if six.PY2:
-            return self.deck_name.encode('ascii')
-        else:
-            return self.deck_name
+
+        # Decks cached by older versions of this script stored their name as bytes
+        if isinstance(self.deck_name, bytes):
+            return self.deck_name.decode('utf-8', 'replace')
+        return self.deck_name
 
     def get_deck_url(self):
         return self.deck_url
@@ -69,18 +513,24 @@ class Deck(object):
         return self.deck_price
 
     def get_deck_list(self):
+
+        # Decks cached by older versions of this script don't have an encoded_deck_list at all
+        encoded_deck_list = getattr(self, 'encoded_deck_list', None)
+        if encoded_deck_list is not None:
+            self.deck_list = decode_deck_list(encoded_deck_list)
+            self.encoded_deck_list = None
         return self.deck_list
 
     def get_deck_size(self):
         total_cards = 0
-        for card_entry in self.deck_list:
+        for card_entry in self.get_deck_list():
             total_cards += card_entry[CARD_QTY_KEY]
         return total_cards
 
     def __str__(self):
         print_output = "Deck Name: %s\nDeck URL: %s\nDeck Date: %s\nDeck Price: %.2f\nDeck List:\n{\n" % (
-            self.deck_name, self.deck_url, self.deck_date, self.deck_price)
-        for card_entry in self.deck_list:
+            self.get_deck_name(), self.deck_url, self.deck_date, self.deck_price)
+        for card_entry in self.get_deck_list():
             print_output = print_output + \
                 "     %dx %s,\n" % (
                     card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY])
@@ -88,76 +538,688 @@ class Deck(object):
 
 
 """
-Checks all local cache dirs for the presence of this deck using the MTGGoldfish DeckID, as
-parsed from the Deck URL.
+Return a hash of a deck's contents, which only changes when the deck is re-fetched with a different name, price or list.
+The date the deck was fetched is not part of it, so evaluation results keyed on this hash stay valid when an unchanged
+deck is re-fetched. The hash is computed once and stored on the Deck.
 
-:param deck_id: The DeckID of this deck on MTGGoldfish
+:param deck: The Deck to hash
 """
-def is_deck_cached(deck_id):
-    cache_dir = os.path.join(os.path.dirname(__file__), 'deck_cache')
-    if not os.path.isdir(cache_dir):
+def get_deck_hash(deck):
+    deck_hash = getattr(deck, 'deck_hash', None)
+    if deck_hash is None:
+        deck_contents = [deck.get_deck_name(), "%.2f" % (deck.get_deck_price())]
+        for card_entry in deck.get_deck_list():
+            deck_contents.append("%d %s %.2f" % (card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
+        deck_hash = hashlib.sha1(u'\n'.join(deck_contents).encode('utf-8')).hexdigest()
+        deck.deck_hash = deck_hash
+    return deck_hash
+
+
+"""
+Return a hash of the data extracted from a deck page by DECK_PAGE_EXTRACTION_SCRIPT, so a re-fetched page that hasn't
+changed can be recognized before it is parsed
+
+:param deck_page_data: The dict returned by DECK_PAGE_EXTRACTION_SCRIPT
+"""
+def get_page_data_hash(deck_page_data):
+    return hashlib.sha1(json.dumps(deck_page_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+"""
+Serialize a Deck for the deck cache. The format is two lines of JSON: a header holding the format version and every field
+of the deck except its list, followed by the deck list as [quantity, name, price] triples. Keeping the list on its own line
+lets decode_deck_from_cache leave it encoded until it is needed. The whole thing is zlib-compressed if DECK_CACHE_COMPRESSION
+is set. For example:
+    {"Format": "mtggoldfish-deck", "Version": 1, "Name": "Burn", "URL": "https://www.mtggoldfish.com/deck/784979#paper", "Date": "2017-10-05", ...}
+    [[4, "Goblin Guide", 3.5], [4, "Lightning Bolt", 1.25], ...]
+
+:param deck: The Deck to serialize
+"""
+def encode_deck_for_cache(deck):
+    header = {DECK_FILE_FORMAT_KEY: DECK_FILE_FORMAT_NAME, DECK_FILE_VERSION_KEY: DECK_FILE_VERSION, DECK_FILE_NAME_KEY: deck.get_deck_name(),
+              DECK_FILE_URL_KEY: deck.get_deck_url(), DECK_FILE_DATE_KEY: deck.get_deck_date().strftime('%Y-%m-%d'),
+              DECK_FILE_PRICE_KEY: deck.get_deck_price(), DECK_FILE_DECK_HASH_KEY: get_deck_hash(deck),
+              DECK_FILE_PAGE_HASH_KEY: getattr(deck, 'page_hash', None), DECK_FILE_PRICE_TYPE_KEY: getattr(deck, 'price_type', None),
+              DECK_FILE_PRICES_FETCHED_KEY: getattr(deck, 'prices_fetched_time', None)}
+    deck_list = [[card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]] for card_entry in deck.get_deck_list()]
+    encoded_deck = (json.dumps(header, sort_keys=True) + '\n' + json.dumps(deck_list) + '\n').encode('utf-8')
+    if DECK_CACHE_COMPRESSION:
+        return zlib.compress(encoded_deck)
+    return encoded_deck
+
+
+"""
+Return True if the contents of a cache file were written by encode_deck_for_cache, and False if it is a Deck pickled by an
+older version of this script
+"""
+def is_encoded_deck(cached_deck_data):
+    return cached_deck_data[:1] == b'{' or cached_deck_data[:1] == DECK_FILE_ZLIB_HEADER
+
+
+"""
+Return True if a file in the deck cache directory is named like a cached deck, <deck_id>_MM_DD_YYYY with a valid date
+"""
+def is_deck_cache_file_name(file_name):
+    if DECK_CACHE_FILE_NAME_PATTERN.match(file_name) is None:
+        return False
+    try:
+        datetime.strptime(file_name[file_name.find('_') + 1:], '%m_%d_%Y')
+    except ValueError:
+        return False
+    return True
+
+
+"""
+Deserialize a Deck written by encode_deck_for_cache. Only the header is decoded right away; the deck list is decoded by
+Deck.get_deck_list the first time it is needed.
+
+:param cached_deck_data: The contents of the cache file
+"""
+def decode_deck_from_cache(cached_deck_data):
+    if cached_deck_data[:1] == DECK_FILE_ZLIB_HEADER:
+        cached_deck_data = zlib.decompress(cached_deck_data)
+
+    (encoded_header, encoded_deck_list) = cached_deck_data.decode('utf-8').split('\n', 1)
+    header = json.loads(encoded_header)
+    if header.get(DECK_FILE_FORMAT_KEY) != DECK_FILE_FORMAT_NAME:
+        raise ValueError("Not a cached deck")
+    if header.get(DECK_FILE_VERSION_KEY) != DECK_FILE_VERSION:
+        raise ValueError("Cached deck version %s is not supported by this version of the script, which reads version %s" % (
+            header.get(DECK_FILE_VERSION_KEY), DECK_FILE_VERSION))
+
+    deck = Deck()
+    deck.deck_name = header[DECK_FILE_NAME_KEY]
+    deck.deck_url = header[DECK_FILE_URL_KEY]
+    deck.deck_date = datetime.strptime(header[DECK_FILE_DATE_KEY], '%Y-%m-%d')
+    deck.deck_price = header[DECK_FILE_PRICE_KEY]
+    deck.deck_hash = header[DECK_FILE_DECK_HASH_KEY]
+    deck.page_hash = header[DECK_FILE_PAGE_HASH_KEY]
+    deck.price_type = header.get(DECK_FILE_PRICE_TYPE_KEY)
+    deck.prices_fetched_time = header.get(DECK_FILE_PRICES_FETCHED_KEY)
+    deck.encoded_deck_list = encoded_deck_list
+    return deck
+
+
+"""
+Decode the deck list line of a cached deck into the list of card records used everywhere else
+
+:param encoded_deck_list: The JSON list of [quantity, name, price] triples
+"""
+def decode_deck_list(encoded_deck_list):
+    return [{CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: CARD_NAMES.intern_card_name(card_name), CARD_PRICE_KEY: individual_card_price}
+            for (card_quantity, card_name, individual_card_price) in json.loads(encoded_deck_list)]
+
+
+"""
+Manages the deck_cache directory. The directory is only listed once, the first time a deck is looked up, after which every
+lookup is a dict access. The time each deck was last used by a run is kept in an index file inside the directory, which
+drives eviction: decks that no run has used for max_unused_days (because they dropped off the Metagame and Budget landing
+pages and aren't listed in desired_decks.txt) are removed, and if the cache still holds more than max_decks decks or
+max_size_bytes bytes, the least recently used decks are removed until it doesn't. Decks used by the current run are never
+evicted. Every bound is optional, and the cache is unbounded by default.
+
+Deck files are named <deck_id>_MM_DD_YYYY, where the date is when the deck was last fetched.
+"""
+class DeckCache(object):
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(__file__), 'deck_cache')
+        self.cache_dir = cache_dir
+        self.max_decks = None
+        self.max_size_bytes = None
+        self.max_unused_days = None
+        self.file_names = None
+        self.file_sizes = {}
+        self.last_used_times = {}
+        self.deck_ids_used_by_this_run = set()
+
+        # Cache file name -> True if the file was written by encode_deck_for_cache, see is_current_format
+        self.file_formats = {}
+        self.stats = {CACHE_HITS_KEY: 0, CACHE_MISSES_KEY: 0, CACHE_STALE_KEY: 0, CACHE_EVICTED_KEY: 0}
+        self.lock = threading.RLock()
+
+    """
+    Set the bounds enforced by evict(). Any bound left as None is not enforced
+    """
+    def configure(self, max_decks=None, max_size_bytes=None, max_unused_days=None):
+        self.max_decks = max_decks
+        self.max_size_bytes = max_size_bytes
+        self.max_unused_days = max_unused_days
+
+    """
+    List the cache directory and read the index file, unless that has already been done
+    """
+    def load_index(self):
+        with self.lock:
+            if self.file_names is not None:
+                return
+
+            self.file_names = {}
+            self.file_sizes = {}
+            if not os.path.isdir(self.cache_dir):
+                return
+
+            for cached_deck_file_name in os.listdir(self.cache_dir):
+                if cached_deck_file_name in [DECK_CACHE_INDEX_FILE_NAME, CARD_STATISTICS_FILE_NAME] or cached_deck_file_name.startswith(DECK_CACHE_TEMPORARY_FILE_PREFIX):
+                    continue
+
+                # Anything else that isn't named like a deck, such as a .DS_Store file, is left alone
+                if not is_deck_cache_file_name(cached_deck_file_name):
+                    continue
+
+                # The deck file names are of the format <deck_id>_MM_DD_YYYY
+                deck_id = cached_deck_file_name.split('_')[0]
+                self.file_names[deck_id] = cached_deck_file_name
+                self.file_sizes[deck_id] = os.path.getsize(os.path.join(self.cache_dir, cached_deck_file_name))
+
+            index_file_path = os.path.join(self.cache_dir, DECK_CACHE_INDEX_FILE_NAME)
+            if os.path.isfile(index_file_path):
+                try:
+                    with open(index_file_path, 'r') as index_file:
+                        self.last_used_times.update(json.load(index_file))
+                except ValueError:
+                    pass
+
+            # Decks cached before the index existed count as last used when they were fetched
+            for (deck_id, cached_deck_file_name) in six.iteritems(self.file_names):
+                if deck_id not in self.last_used_times:
+                    self.last_used_times[deck_id] = time.mktime(self.get_cached_date(deck_id).timetuple())
+
+    """
+    List the cache directory again, to pick up decks written by other processes such as fetch workers
+    """
+    def reindex(self):
+        with self.lock:
+            self.file_names = None
+            self.load_index()
+
+    def save_index(self):
+        with self.lock:
+            if not os.path.isdir(self.cache_dir):
+                return
+            last_used_times = dict((deck_id, self.last_used_times[deck_id]) for deck_id in self.file_names if deck_id in self.last_used_times)
+            with open(os.path.join(self.cache_dir, DECK_CACHE_INDEX_FILE_NAME), 'w') as index_file:
+                json.dump(last_used_times, index_file)
+
+    def contains(self, deck_id):
+        self.load_index()
+        return deck_id in self.file_names and self.is_current_format(deck_id)
+
+    """
+    Return True if a cached deck was written by encode_deck_for_cache. Any other file, such as a deck pickled by an older
+    version of this script, is never unpickled outside of migrate(), as the cache directory may be shared with other
+    machines. Such decks count as not cached, so they are fetched again and replaced
+    """
+    def is_current_format(self, deck_id):
+        with self.lock:
+            cached_deck_file_name = self.file_names[deck_id]
+            if cached_deck_file_name not in self.file_formats:
+                with open(os.path.join(self.cache_dir, cached_deck_file_name), 'rb') as input:
+                    self.file_formats[cached_deck_file_name] = is_encoded_deck(input.read(1))
+                if not self.file_formats[cached_deck_file_name]:
+                    print("   [WARNING]: Ignoring cached deck \"%s\", which is not in the current cache format."
+                          " Run \"python mtggoldfish.py --migrate-cache\" to convert decks cached by older versions of this script." % (
+                          cached_deck_file_name))
+            return self.file_formats[cached_deck_file_name]
+
+    """
+    Return the date a cached deck was last fetched, as parsed from its file name
+    """
+    def get_cached_date(self, deck_id):
+        cached_deck_file_name = self.file_names[deck_id]
+        return datetime.strptime(cached_deck_file_name[cached_deck_file_name.find('_') + 1:], '%m_%d_%Y')
+
+    """
+    Return True if the cached deck was fetched 30 or more days ago. Such decks are counted as stale in the stats
+    """
+    def is_old(self, deck_id):
+        self.load_index()
+        if deck_id not in self.file_names:
+            return False
+
+        if (datetime.now() - self.get_cached_date(deck_id)).days >= 30:
+            with self.lock:
+                self.stats[CACHE_STALE_KEY] += 1
+            return True
         return False
 
-    cached_decks = os.listdir(cache_dir)
-    for cached_deck_file_name in cached_decks:
+    def mark_used(self, deck_id):
+        with self.lock:
+            self.last_used_times[deck_id] = time.time()
+            self.deck_ids_used_by_this_run.add(deck_id)
+
+    def load(self, deck_id):
+        self.load_index()
+        deck = self.read_deck_file(self.file_names[deck_id])[0]
+        with self.lock:
+            self.stats[CACHE_HITS_KEY] += 1
+        self.mark_used(deck_id)
+        return deck
+
+    """
+    Load a deck without counting it as a cache hit or as used by this run, such as when it is only read for its prices
+    """
+    def peek(self, deck_id):
+        self.load_index()
+        return self.read_deck_file(self.file_names[deck_id])[0]
+
+    def get_deck_ids(self):
+        self.load_index()
+        return list(self.file_names)
+
+    """
+    Count a deck that a run needed but had to fetch, because it wasn't cached or the cache is being updated
+    """
+    def record_miss(self):
+        with self.lock:
+            self.stats[CACHE_MISSES_KEY] += 1
+
+    """
+    Store a deck in the cache, replacing any older version of it
+    """
+    def save(self, deck, deck_id):
+        self.load_index()
+        with self.lock:
+            if not os.path.isdir(self.cache_dir):
+                os.mkdir(self.cache_dir)
+
+            # If an older version of the Deck is cached, delete it first
+            self.remove(deck_id)
+
+            self.write_deck_file(get_deck_cache_file_name(deck_id), deck)
+        self.mark_used(deck_id)
+        CARD_STATISTICS.refresh_deck(deck_id, deck)
+
+    """
+    Read a cache file, returning (Deck, True if the file holds a Deck pickled by an older version of this script). Pickled
+    decks are only read when allow_pickle is set, which only migrate() does, and raise a ValueError otherwise
+    """
+    def read_deck_file(self, cached_deck_file_name, allow_pickle=False):
+        with open(os.path.join(self.cache_dir, cached_deck_file_name), 'rb') as input:
+            cached_deck_data = input.read()
+
+        if is_encoded_deck(cached_deck_data):
+            return (decode_deck_from_cache(cached_deck_data), False)
+        if not allow_pickle:
+            raise ValueError("\"%s\" is not in the current cache format" % (cached_deck_file_name))
+        return (pickle.loads(cached_deck_data), True)
+
+    """
+    Write a deck to the cache file with the given name and add it to the index. The file is written under a temporary name
+    first, so a crash halfway through never leaves a truncated deck behind
+    """
+    def write_deck_file(self, cache_file_name, deck):
+        cache_file_path = os.path.join(self.cache_dir, cache_file_name)
+        temporary_file_path = os.path.join(self.cache_dir, DECK_CACHE_TEMPORARY_FILE_PREFIX + cache_file_name)
+        with open(temporary_file_path, 'wb') as output:
+            output.write(encode_deck_for_cache(deck))
+        if os.path.exists(cache_file_path):
+            os.remove(cache_file_path)
+        os.rename(temporary_file_path, cache_file_path)
 
         # The deck file names are of the format <deck_id>_MM_DD_YYYY
-        cached_deck_id = cached_deck_file_name.split('_')[0]
-        if cached_deck_id == deck_id:
+        deck_id = cache_file_name.split('_')[0]
+        with self.lock:
+            self.file_formats[cache_file_name] = True
+            self.file_names[deck_id] = cache_file_name
+            self.file_sizes[deck_id] = os.path.getsize(cache_file_path)
+
+    """
+    Convert every deck in the cache that was pickled by an older version of this script to the current format, keeping its
+    date. Returns a tuple of (number of decks converted, number already in the current format, number that couldn't be read)
+    """
+    def migrate(self):
+        self.load_index()
+        num_converted_decks = 0
+        num_current_decks = 0
+        num_unreadable_decks = 0
+        for (deck_id, cached_deck_file_name) in sorted(self.file_names.items()):
+            try:
+                (deck, deck_was_pickled) = self.read_deck_file(cached_deck_file_name, allow_pickle=True)
+                if deck_was_pickled:
+                    self.write_deck_file(cached_deck_file_name, deck)
+                    num_converted_decks += 1
+                else:
+                    num_current_decks += 1
+            except Exception as read_error:
+                print("   [WARNING]: Could not convert cached deck \"%s\": %s" % (cached_deck_file_name, read_error))
+                num_unreadable_decks += 1
+        return (num_converted_decks, num_current_decks, num_unreadable_decks)
+
+    """
+    Mark a cached deck as fetched today without rewriting it, by renaming its cache file to today's date
+    """
+    def refresh_date(self, deck_id):
+        self.load_index()
+        with self.lock:
+            cache_file_name = get_deck_cache_file_name(deck_id)
+            os.rename(os.path.join(self.cache_dir, self.file_names[deck_id]), os.path.join(self.cache_dir, cache_file_name))
+            self.file_names[deck_id] = cache_file_name
+        self.mark_used(deck_id)
+
+    def remove(self, deck_id):
+        with self.lock:
+            cached_deck_file_name = self.file_names.pop(deck_id, None)
+            self.file_sizes.pop(deck_id, None)
+            if cached_deck_file_name is None:
+                return
+
+            # Another process sharing the cache may have replaced the file already
+            try:
+                os.remove(os.path.join(self.cache_dir, cached_deck_file_name))
+            except OSError as remove_error:
+                if remove_error.errno != errno.ENOENT:
+                    raise
+
+    """
+    Remove decks until the cache is within its configured bounds, and persist the index. Returns the number of decks evicted
+    """
+    def evict(self):
+        self.load_index()
+        with self.lock:
+            evictable_deck_ids = sorted([deck_id for deck_id in self.file_names if deck_id not in self.deck_ids_used_by_this_run],
+                                        key=lambda deck_id: self.last_used_times.get(deck_id, 0))
+            deck_ids_to_evict = []
+            if self.max_unused_days is not None:
+                unused_since = time.time() - self.max_unused_days * 24 * 60 * 60
+                deck_ids_to_evict = [deck_id for deck_id in evictable_deck_ids if self.last_used_times.get(deck_id, 0) < unused_since]
+                evictable_deck_ids = evictable_deck_ids[len(deck_ids_to_evict):]
+
+            num_decks = len(self.file_names) - len(deck_ids_to_evict)
+            total_size = self.get_total_size() - sum(self.file_sizes[deck_id] for deck_id in deck_ids_to_evict)
+            for deck_id in evictable_deck_ids:
+                over_max_decks = self.max_decks is not None and num_decks > self.max_decks
+                over_max_size = self.max_size_bytes is not None and total_size > self.max_size_bytes
+                if not over_max_decks and not over_max_size:
+                    break
+                deck_ids_to_evict.append(deck_id)
+                num_decks -= 1
+                total_size -= self.file_sizes[deck_id]
+
+            for deck_id in deck_ids_to_evict:
+                self.remove(deck_id)
+                self.last_used_times.pop(deck_id, None)
+                CARD_STATISTICS.remove_deck(deck_id)
+            self.stats[CACHE_EVICTED_KEY] += len(deck_ids_to_evict)
+            self.save_index()
+            return len(deck_ids_to_evict)
+
+    def get_deck_count(self):
+        self.load_index()
+        return len(self.file_names)
+
+    def get_total_size(self):
+        self.load_index()
+        return sum(six.itervalues(self.file_sizes))
+
+    """
+    Return a copy of the hit, miss, stale and evicted counters
+    """
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+DECK_CACHE = DeckCache()
+
+
+"""
+Per-format card statistics over the Metagame decks, materialized in a file in the deck cache directory so that aggregate
+questions such as "which cards appear in the most Modern Metagame decks" never re-walk every cached deck list. For each
+format (and price type) the table holds every card's deck count, total copies, sum of prices and total value, next to
+the contribution of every deck that was added to it. Decks are only ever added, refreshed or removed one at a time:
+sync_format adds decks newly listed on the Metagame landing page, refreshes decks whose hash changed and removes decks
+that dropped off it, saving a deck to the cache refreshes it, and evicting it from the cache removes it.
+
+:param statistics_file_path: The path of the file the statistics are persisted in
+"""
+class CardStatistics(object):
+    def __init__(self, statistics_file_path):
+        self.statistics_file_path = statistics_file_path
+        self.formats = None
+        self.is_dirty = False
+        self.lock = threading.RLock()
+
+    """
+    Read the persisted statistics, unless that has already been done
+    """
+    def load(self):
+        with self.lock:
+            if self.formats is not None:
+                return
+
+            self.formats = {}
+            if os.path.isfile(self.statistics_file_path):
+                try:
+                    with open(self.statistics_file_path, 'r') as statistics_file:
+                        persisted_statistics = json.load(statistics_file)
+                    if persisted_statistics.get(CARD_STATISTICS_VERSION_KEY) == CARD_STATISTICS_VERSION:
+                        self.formats = persisted_statistics[CARD_STATISTICS_FORMATS_KEY]
+                except ValueError:
+                    pass
+
+    """
+    Persist the statistics if they changed since they were loaded
+    """
+    def save(self):
+        with self.lock:
+            if not self.is_dirty or not os.path.isdir(os.path.dirname(self.statistics_file_path)):
+                return
+            with open(self.statistics_file_path, 'w') as statistics_file:
+                json.dump({CARD_STATISTICS_VERSION_KEY: CARD_STATISTICS_VERSION, CARD_STATISTICS_FORMATS_KEY: self.formats}, statistics_file)
+            self.is_dirty = False
+
+    """
+    Add a deck to the statistics of a format, or refresh it if the deck changed since it was added. Returns True if the
+    statistics changed. A deck priced with a different type of price than the format's is refused, as the deck cache only
+    holds one copy of each deck, priced with whichever type of price it was last fetched with. Its earlier contribution,
+    if any, is kept.
+
+    :param format_key: The key returned by get_card_statistics_format_key
+    :param deck_id: The DeckID for the deck from MTGGoldfish.com
+    :param deck: The Deck
+    """
+    def add_deck(self, format_key, deck_id, deck):
+        if getattr(deck, 'price_type', None) != get_card_statistics_price_type(format_key):
+            return False
+
+        deck_hash = get_deck_hash(deck)
+        with self.lock:
+            self.load()
+            format_statistics = self.formats.setdefault(format_key, {CARD_STATISTICS_DECKS_KEY: {}, CARD_STATISTICS_CARDS_KEY: {}})
+            deck_contribution = format_statistics[CARD_STATISTICS_DECKS_KEY].get(deck_id)
+            if deck_contribution is not None and deck_contribution[0] == deck_hash:
+                return False
+
+            if deck_contribution is not None:
+                self.remove_deck_from_format(format_key, deck_id)
+
+            # Each card is counted once per deck, with the copies in the main deck and the sideboard added together
+            card_contributions = []
+            for (card_key, (card_quantity, card_price)) in six.iteritems(build_deck_card_index(deck)):
+                card_name = make_report_json_safe(CARD_NAMES.get_card_name(card_key))
+                card_contributions.append([normalize_card_name(card_name), card_name, card_quantity, card_price])
+
+            card_statistics = format_statistics[CARD_STATISTICS_CARDS_KEY]
+            for (normalized_card_name, card_name, card_quantity, card_price) in card_contributions:
+                card_statistic = card_statistics.setdefault(normalized_card_name, [card_name, 0, 0, 0.0, 0.0])
+                card_statistic[1] += 1
+                card_statistic[2] += card_quantity
+                card_statistic[3] += card_price
+                card_statistic[4] += card_quantity * card_price
+            format_statistics[CARD_STATISTICS_DECKS_KEY][deck_id] = [deck_hash, card_contributions]
+            self.is_dirty = True
             return True
 
-    return False
+    """
+    Remove a deck from the statistics of a format, if it is part of them
+    """
+    def remove_deck_from_format(self, format_key, deck_id):
+        with self.lock:
+            self.load()
+            format_statistics = self.formats.get(format_key)
+            if format_statistics is None or deck_id not in format_statistics[CARD_STATISTICS_DECKS_KEY]:
+                return
+
+            (deck_hash, card_contributions) = format_statistics[CARD_STATISTICS_DECKS_KEY].pop(deck_id)
+            card_statistics = format_statistics[CARD_STATISTICS_CARDS_KEY]
+            for (normalized_card_name, card_name, card_quantity, card_price) in card_contributions:
+                card_statistic = card_statistics[normalized_card_name]
+                card_statistic[1] -= 1
+                if card_statistic[1] == 0:
+                    del card_statistics[normalized_card_name]
+                    continue
+                card_statistic[2] -= card_quantity
+                card_statistic[3] -= card_price
+                card_statistic[4] -= card_quantity * card_price
+            self.is_dirty = True
+
+    """
+    Make the statistics of a format cover exactly the given decks: new decks are added, changed decks are refreshed and
+    decks that are no longer listed are removed. Decks priced with the other type of price are skipped, see add_deck.
+    Returns the number of decks that were added, refreshed or removed.
+
+    :param format_key: The key returned by get_card_statistics_format_key
+    :param decks_list: The Metagame decks of the format
+    """
+    def sync_format(self, format_key, decks_list):
+        with self.lock:
+            self.load()
+            decks_by_id = dict((get_deck_id_from_url(deck.get_deck_url()), deck) for deck in decks_list)
+            num_changed_decks = 0
+            for deck_id in list(self.formats.get(format_key, {}).get(CARD_STATISTICS_DECKS_KEY, {})):
+                if deck_id not in decks_by_id:
+                    self.remove_deck_from_format(format_key, deck_id)
+                    num_changed_decks += 1
+            for (deck_id, deck) in six.iteritems(decks_by_id):
+                if self.add_deck(format_key, deck_id, deck):
+                    num_changed_decks += 1
+            return num_changed_decks
+
+    """
+    Refresh a deck that was just saved to the deck cache in the statistics of every format it is part of
+    """
+    def refresh_deck(self, deck_id, deck):
+        with self.lock:
+            self.load()
+            for (format_key, format_statistics) in six.iteritems(self.formats):
+                if deck_id in format_statistics[CARD_STATISTICS_DECKS_KEY]:
+                    self.add_deck(format_key, deck_id, deck)
+
+    """
+    Remove a deck that was evicted from the deck cache from the statistics of every format
+    """
+    def remove_deck(self, deck_id):
+        with self.lock:
+            self.load()
+            for format_key in list(self.formats):
+                self.remove_deck_from_format(format_key, deck_id)
+
+    """
+    Return the statistics of the cards of a format as a list of (card name, statistics) tuples, sorted descending by
+    sort_key, such as:
+        [('Lightning Bolt', {'Decks Using': 34, 'Play Rate': 0.57, 'Total Copies': 131, 'Individual Card Price': 1.99,
+                             'Total Value': 260.69, 'Weighted Value': 4.34}), ...]
+    The play rate is the fraction of the format's decks that play the card, the total value is what every copy across
+    those decks is worth, and the weighted value is the average value of the card per deck of the format.
+
+    :param format_key: The key returned by get_card_statistics_format_key
+    :param sort_key: DECKS_USING_KEY, TOTAL_COPIES_KEY, TOTAL_VALUE_KEY or any other key of the statistics
+    :param num_results: How many cards to return
+    """
+    def get_top_cards(self, format_key, sort_key=DECKS_USING_KEY, num_results=CARD_STATISTICS_CARD_COUNT):
+        with self.lock:
+            self.load()
+            format_statistics = self.formats.get(format_key, {CARD_STATISTICS_DECKS_KEY: {}, CARD_STATISTICS_CARDS_KEY: {}})
+            num_decks = max(1, len(format_statistics[CARD_STATISTICS_DECKS_KEY]))
+            card_rankings = []
+            for (card_name, deck_count, total_copies, price_sum, total_value) in six.itervalues(format_statistics[CARD_STATISTICS_CARDS_KEY]):
+                card_rankings.append((card_name, {DECKS_USING_KEY: deck_count, PLAY_RATE_KEY: float(deck_count) / num_decks, TOTAL_COPIES_KEY: total_copies,
+                                                  CARD_PRICE_KEY: price_sum / deck_count, TOTAL_VALUE_KEY: total_value, WEIGHTED_VALUE_KEY: total_value / num_decks}))
+
+        card_rankings.sort(key=lambda card_ranking: (-card_ranking[1][sort_key], card_ranking[0]))
+        return card_rankings[:num_results]
+
+    """
+    Return the number of decks the statistics of a format cover
+    """
+    def get_deck_count(self, format_key):
+        with self.lock:
+            self.load()
+            return len(self.formats.get(format_key, {}).get(CARD_STATISTICS_DECKS_KEY, {}))
+
+
+CARD_STATISTICS = CardStatistics(os.path.join(DECK_CACHE.cache_dir, CARD_STATISTICS_FILE_NAME))
+
+
+"""
+Return the key the card statistics of a format are kept under, such as "modern/paper", as paper and online prices
+can't be mixed
+
+:param desired_format: The format, such as "modern"
+:param use_online_price: If set to True, the statistics are for decks priced with online (tix) prices
+"""
+def get_card_statistics_format_key(desired_format, use_online_price):
+    return "%s/%s" % (desired_format, get_price_type(use_online_price))
+
+
+"""
+Return the type of price the card statistics of a format are kept in, PRICE_TYPE_PAPER or PRICE_TYPE_ONLINE
+
+:param format_key: The key returned by get_card_statistics_format_key
+"""
+def get_card_statistics_price_type(format_key):
+    return format_key.rsplit('/', 1)[-1]
+
+
+"""
+Enforce the deck cache bounds once every deck a run needs has been fetched, and print the outcome. Decks used by the run
+are never evicted, and the next run starts with none marked as used. The card statistics are persisted as well, since
+evicted decks are removed from them.
+"""
+def evict_from_deck_cache():
+    num_evicted_decks = DECK_CACHE.evict()
+    print("   Deck cache: %s decks evicted, %s decks (%.1f MB) are cached." % (
+        num_evicted_decks, DECK_CACHE.get_deck_count(), DECK_CACHE.get_total_size() / (1024.0 * 1024.0)))
+    DECK_CACHE.deck_ids_used_by_this_run = set()
+    CARD_STATISTICS.save()
 
 
 """
-Given a DeckID, parses the MM_DD_YYYY portion of a cached deck file name
-and returns true if the date is >= 30 days old
+Checks the local cache for the presence of this deck using the MTGGoldfish DeckID, as
+parsed from the Deck URL.
 
 :param deck_id: The DeckID of this deck on MTGGoldfish
 """
-def cached_deck_is_old(deck_id):
-    cache_dir = os.path.join(os.path.dirname(__file__), 'deck_cache')
-    if not os.path.isdir(cache_dir):
-        return False
+def is_deck_cached(deck_id):
+    return DECK_CACHE.contains(deck_id)
 
-    cached_decks = os.listdir(cache_dir)
-    for cached_deck_file_name in cached_decks:
 
-        # The deck file names are of the format <deck_id>_MM_DD_YYYY
-        cached_deck_id = cached_deck_file_name.split('_')[0]
-        if cached_deck_id == deck_id:
-            cached_date = datetime.strptime(
-                cached_deck_file_name[cached_deck_file_name.find('_') + 1:], '%m_%d_%Y')
-            time_delta_since_last_update = datetime.now() - cached_date
-            if time_delta_since_last_update.days >= 30:
-                return True
+"""
+Given a DeckID, returns true if the cached deck was fetched >= 30 days ago
 
-    return False
+:param deck_id: The DeckID of this deck on MTGGoldfish
+"""
+def cached_deck_is_old(deck_id):
+    return DECK_CACHE.is_old(deck_id)
 
 
 """
-Given a Deck object, utilize the cPickle library to save it to a local file
+Save a Deck object to the cache
 
 :param deck: The Deck object to store to the file
 :param deck_id: The DeckID for the deck from MTGGoldfish.com
 """
 def save_deck_to_cache(deck, deck_id):
+    DECK_CACHE.save(deck, deck_id)
 
-    # If the deck_cache subdirectory hasn't been created yet, create it
-    cache_dir = os.path.join(os.path.dirname(__file__), 'deck_cache')
-    if not os.path.isdir(cache_dir):
-        os.mkdir(cache_dir)
-
-    # If an older version of the Deck is cached, delete it first
-    cached_decks = os.listdir(cache_dir)
-    for existing_cache_file in cached_decks:
 
-        # The deck file names are of the format <deck_id>_MM_DD_YYYY
-        cached_deck_id = existing_cache_file.split('_')[0]
-        if cached_deck_id == deck_id:
-            os.remove(os.path.join(cache_dir, existing_cache_file))
+"""
+Generate the file name for a Deck cached today, of the format <deck_id>_MM_DD_YYYY
 
-    # Generate the file name for this cached Deck of the format <deck_id>_MM_DD_YYYY
+:param deck_id: The DeckID for the deck from MTGGoldfish.com
+"""
+def get_deck_cache_file_name(deck_id):
     todays_date = datetime.now()
     month = todays_date.month
     day = todays_date.day
@@ -165,70 +1227,243 @@ def save_deck_to_cache(deck, deck_id):
         month = "0%s" % (todays_date.month)
     if day <= 9:
         day = "0%s" % (todays_date.day)
-    cache_file_name = "%s_%s_%s_%s" % (deck_id, month, day, todays_date.year)
+    return "%s_%s_%s_%s" % (deck_id, month, day, todays_date.year)
+
+
+"""
+Mark a cached deck as fetched today without rewriting it. Used when a re-fetched deck turns out to be identical to the cached one.
 
-    with open(os.path.join(cache_dir, cache_file_name), 'wb') as output:
-        pickle.dump(deck, output, pickle.HIGHEST_PROTOCOL)
+:param deck_id: The DeckID for the deck from MTGGoldfish.com
+"""
+def refresh_cached_deck_date(deck_id):
+    DECK_CACHE.refresh_date(deck_id)
 
 
 """
 Given a DeckID, load the deck from the cache
 """
 def load_deck_from_cache(deck_id):
-    deck = Deck()
+    return DECK_CACHE.load(deck_id)
 
-    cache_dir = os.path.join(os.path.dirname(__file__), 'deck_cache')
-    cached_decks = os.listdir(cache_dir)
 
-    # Fetch the file name of the cached deck for reading
-    cached_deck_file_path = ""
-    for cached_file in cached_decks:
-        cached_deck_id = cached_file.split('_')[0]
-        if cached_deck_id == deck_id:
-            cached_deck_file_path = os.path.join(cache_dir, cached_file)
-            break
+"""
+Given the URL of a deck page on MTGGoldfish.com, return the DeckID used to key the cache
 
-    with open(cached_deck_file_path, 'rb') as input:
-        deck = pickle.load(input)
+:param deck_url: The deck URL, such as "https://www.mtggoldfish.com/deck/784979#paper"
+"""
+def get_deck_id_from_url(deck_url):
 
-    return deck
+    # The URL format is either "https://www.mtggoldfish.com/deck/784979#paper" for a Budget deck
+    # or "https://www.mtggoldfish.com/archetype/modern-grixis-death-s-shadow#paper" for a Modern Meta deck
+    # So we fetch the Deck ID from the last '/' to the '#'
+    deck_url = deck_url.strip()
+    return deck_url[deck_url.rfind('/') + 1:].split("#")[0]
+
+
+"""
+Given the URL for a category landing page, return the path of the file its last snapshot of deck URLs is saved to.
+The file name is derived from the URL, so "https://www.mtggoldfish.com/decks/budget/modern#paper" is saved
+as "decks_budget_modern_paper.txt"
+
+:param category_landing_page_url: The URL of the category landing page
+"""
+def get_landing_page_snapshot_path(category_landing_page_url):
+    parsed_url = urlparse(category_landing_page_url.lower())
+    snapshot_name = re.sub(r'[^a-z0-9]+', '_', parsed_url.path + '_' + parsed_url.fragment).strip('_')
+    return os.path.join(os.path.dirname(__file__), 'landing_page_cache', snapshot_name + '.txt')
+
+
+"""
+Save the deck URLs found on a category landing page, one per line, so that cache-only runs know which decks to load.
+If the Metagame share of a deck is known, it follows the URL on the same line, separated by a tab.
+
+:param category_landing_page_url: The URL of the category landing page
+:param deck_URLs_list: The deck URLs that were found on that page
+:param meta_shares: An optional dict of DeckID -> Metagame share, as filled in by parse_deck_urls_from_category_landing_page
+"""
+def save_landing_page_snapshot(category_landing_page_url, deck_URLs_list, meta_shares=None):
+    snapshot_path = get_landing_page_snapshot_path(category_landing_page_url)
+    if not os.path.isdir(os.path.dirname(snapshot_path)):
+        os.mkdir(os.path.dirname(snapshot_path))
+
+    with open(snapshot_path, 'w') as snapshot_file:
+        for deck_url in deck_URLs_list:
+            meta_share = (meta_shares or {}).get(get_deck_id_from_url(deck_url))
+            if meta_share is None:
+                snapshot_file.write(deck_url + '\n')
+            else:
+                snapshot_file.write("%s\t%s\n" % (deck_url, meta_share))
+
+
+"""
+Load the deck URLs saved by the last save_landing_page_snapshot for this landing page.
+Returns None if the landing page has never been snapshotted.
+
+:param category_landing_page_url: The URL of the category landing page
+:param meta_shares: If given, this dict is filled in with DeckID -> Metagame share for every deck whose share was saved
+"""
+def load_landing_page_snapshot(category_landing_page_url, meta_shares=None):
+    snapshot_path = get_landing_page_snapshot_path(category_landing_page_url)
+    if not os.path.isfile(snapshot_path):
+        return None
+
+    snapshot_deck_URLs = []
+    with open(snapshot_path, 'r') as snapshot_file:
+        for line in snapshot_file:
+            snapshot_columns = line.strip().split('\t')
+            if len(snapshot_columns[0]) == 0:
+                continue
+            snapshot_deck_URLs.append(snapshot_columns[0])
+            if meta_shares is not None and len(snapshot_columns) > 1:
+                meta_shares[get_deck_id_from_url(snapshot_columns[0])] = float(snapshot_columns[1])
+    return snapshot_deck_URLs
 
 
 """
 Parse the owned_cards.txt file and return the cards as a list of dictionaries of card records
 using CARD_QTY_KEY and CARD_NAME_KEY
+
+:param owned_cards_file_path: The file to import instead of owned_cards.txt, such as a collection export
+:param merge_duplicates: If set to True, the quantities of cards listed more than once are added together
+                         instead of exiting
+"""
+def parse_owned_cards(owned_cards_file_path=None, merge_duplicates=False):
+    if owned_cards_file_path is None:
+        owned_cards_file_path = os.path.join(os.path.dirname(__file__), 'owned_cards.txt')
+
+    with open(owned_cards_file_path, 'r') as owned_cards_file:
+        try:
+            owned_cards = parse_owned_cards_from_lines(owned_cards_file, merge_duplicates)
+        except ValueError as duplicate_card_error:
+            print("[ERROR]: %s Resolve it, or run with the \"--merge-duplicates\" flag to add the quantities together. Exiting." % (
+                duplicate_card_error))
+            sys.exit(0)
+
+    return owned_cards
+
+
+"""
+Return True if an owned card list holds no cards, which includes the placeholder card of the owned_cards.txt that
+ships with this script
+"""
+def is_owned_cards_list_empty(owned_cards):
+    return (len(owned_cards) == 1 and owned_cards[0][CARD_NAME_KEY] == "name of card that doesn't exist") or len(owned_cards) == 0
+
+
+"""
+Return the name of a collection evaluated with the "--collection" flag, which is its file name without the extension.
+Names are made unique by appending a number, as each collection's report file is named after it.
+
+:param collection_file_path: The path of the collection file
+:param taken_collection_names: The names of the collections before this one
+"""
+def get_collection_name(collection_file_path, taken_collection_names):
+    collection_name = os.path.splitext(os.path.basename(collection_file_path))[0]
+    unique_collection_name = collection_name
+    collection_number = 2
+    while unique_collection_name in taken_collection_names:
+        unique_collection_name = "%s_%d" % (collection_name, collection_number)
+        collection_number += 1
+    return unique_collection_name
+
+
 """
-def parse_owned_cards():
+Import owned cards from any iterable of lines in a single streaming pass, and return them as a list of dictionaries
+of card records using CARD_QTY_KEY and CARD_NAME_KEY. Two layouts are understood:
+    * One card per line, as in owned_cards.txt: "4 Scalding Tarn", "4x Scalding Tarn" or "4 Scalding Tarn [ZEN]".
+      Anything in brackets or parentheses after the name, such as a set code and collector number, is ignored
+    * A CSV collection export whose header row has a quantity column (see OWNED_CARDS_CSV_QUANTITY_COLUMNS)
+      and a name column (see OWNED_CARDS_CSV_NAME_COLUMNS)
+Duplicates are found with a card key -> record dict rather than by rescanning the list, so large collection exports
+import in linear time. Raises a ValueError if a card is listed more than once and merge_duplicates isn't set.
+
+:param lines: Any iterable of lines, such as an open file or the body of a daemon query
+:param merge_duplicates: If set to True, the quantities of cards listed more than once are added together
+"""
+def parse_owned_cards_from_lines(lines, merge_duplicates=False):
     owned_cards = []
-    script_dir = os.path.dirname(__file__)
-    owned_cards_file = open(os.path.join(script_dir, 'owned_cards.txt'), 'r')
-    for line in owned_cards_file:
+    owned_cards_by_key = {}
+    lines = iter(lines)
+
+    for (card_quantity, card_name) in iterate_owned_card_lines(lines):
+        card_key = get_card_key(card_name)
+        existing_card_entry = owned_cards_by_key.get(card_key)
+        if existing_card_entry is not None:
+
+            # If the user has entered this card in more than once, we aren't going to try to resolve this for them by
+            # making assumptions unless they asked for duplicates to be merged. Instead, we will point this out for them to resolve
+            if not merge_duplicates:
+                raise ValueError("\"%s\" occurs more than once in the owned cards list." % (card_name))
+            existing_card_entry[CARD_QTY_KEY] += card_quantity
+            continue
+
+        card_entry = {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+        owned_cards_by_key[card_key] = card_entry
+        owned_cards.append(card_entry)
+
+    return owned_cards
+
+
+"""
+Yield a (card_quantity, card_name) pair for each card listed in the given lines, detecting a CSV collection export
+from its header row. Lines which can't be understood are skipped, just like comments and empty lines.
+
+:param lines: An iterator over the lines to import
+"""
+def iterate_owned_card_lines(lines):
+    for line in lines:
 
         # Disregard comments and empty lines
-        if line[0] == "#" or len(line) <= 1:
+        line = line.strip()
+        if len(line) == 0 or line[0] == "#":
             continue
 
-        separator_index = line.find(' ')
-        if separator_index == -1:
+        csv_columns = get_owned_cards_csv_columns(line)
+        if csv_columns is not None:
+            for card_record in iterate_owned_card_csv_rows(lines, csv_columns):
+                yield card_record
+            return
+
+        card_line_match = OWNED_CARD_LINE_REGEX.match(line)
+        if card_line_match is None:
             continue
-        card_quantity = int(line[:separator_index])
-        card_name = line[separator_index + 1:].replace('\n', '')
+        yield (int(card_line_match.group(1)), card_line_match.group(2))
+
 
-        # Double-check to make sure the user hasn't entered this card in more than once. If so, we aren't going
-        # to try to resolve this for the user by making assumptions. Instead, we will point this out via a Print
-        # statement for them to resolve, and kill the script
-        for card_entry in owned_cards:
-            if card_entry[CARD_NAME_KEY].lower() == card_name.lower():
-                print("[ERROR]: \"%s\" occurs more than once in owned_cards.txt. Exiting." % (
-                    card_name))
-                sys.exit(0)
+"""
+If the given line is the header row of a CSV collection export, return the (quantity_column_index, name_column_index)
+tuple for it. Otherwise return None.
+"""
+def get_owned_cards_csv_columns(line):
+    if ',' not in line:
+        return None
 
-        owned_cards.append(
-            {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name})
+    import csv
+    header_columns = [column.strip().lower() for column in next(csv.reader([line]))]
+    quantity_column_indices = [index for (index, column) in enumerate(header_columns) if column in OWNED_CARDS_CSV_QUANTITY_COLUMNS]
+    name_column_indices = [index for (index, column) in enumerate(header_columns) if column in OWNED_CARDS_CSV_NAME_COLUMNS]
+    if len(quantity_column_indices) == 0 or len(name_column_indices) == 0:
+        return None
+    return (quantity_column_indices[0], name_column_indices[0])
 
-    owned_cards_file.close()
 
-    return owned_cards
+"""
+Yield a (card_quantity, card_name) pair for each row of a CSV collection export, streaming over the remaining lines
+
+:param lines: An iterator over the lines following the header row
+:param csv_columns: The (quantity_column_index, name_column_index) tuple returned by get_owned_cards_csv_columns
+"""
+def iterate_owned_card_csv_rows(lines, csv_columns):
+    import csv
+    (quantity_column_index, name_column_index) = csv_columns
+    for row in csv.reader(lines):
+        if len(row) <= max(quantity_column_index, name_column_index):
+            continue
+        card_quantity_string = row[quantity_column_index].strip()
+        card_name = row[name_column_index].strip()
+        if not card_quantity_string.isdigit() or len(card_name) == 0:
+            continue
+        yield (int(card_quantity_string), card_name)
 
 
 """
@@ -240,696 +1475,2779 @@ def parse_desired_deck_URLs():
     desired_cards_file = open(os.path.join(script_dir, 'desired_decks.txt'))
     for line in desired_cards_file:
 
-        # Disregard comments and empty lines
-        if line[0] == "#" or len(line) <= 1:
-            continue
+        # Disregard comments and empty lines
+        if line[0] == "#" or len(line) <= 1:
+            continue
+
+        desired_deck_URLs.append(rebase_mtggoldfish_url(line))
+
+    desired_cards_file.close()
+
+    return desired_deck_URLs
+
+
+"""
+Read everything we need from a deck page that the driver has already navigated to, and build the Deck from it.
+All of the page data is extracted with a single script execution, rather than one WebDriver round trip per table cell.
+
+If the deck is already cached and the page data hashes the same as when the cached deck was parsed, the page isn't parsed
+again, and the cached deck is only saved again with today's date and price fetch time. The same goes for a parsed deck that
+turns out to be identical to the cached one. Otherwise the new deck is saved to the cache.
+Returns a tuple of (Deck, True if the deck was unchanged).
+
+:param driver: The WebDriver that navigated to the deck page
+:param deck_url: The URL of the deck page
+:param deck_id: The DeckID for the deck from MTGGoldfish.com
+:param use_online_price: If set to True, prices are read from the online (tix) deck table instead of the paper one
+"""
+def fetch_deck_from_page(driver, deck_url, deck_id, use_online_price):
+    price_tab_element_tag = 'tab-paper'
+    if use_online_price:
+        price_tab_element_tag = 'tab-online'
+
+    wait_for_element_by_class_name(driver, "deck-view-deck-table")
+    deck_page_data = driver.execute_script(DECK_PAGE_EXTRACTION_SCRIPT, price_tab_element_tag)
+    page_hash = get_page_data_hash(deck_page_data)
+
+    cached_deck = None
+    if is_deck_cached(deck_id):
+        cached_deck = DECK_CACHE.peek(deck_id)
+        if getattr(cached_deck, 'page_hash', None) == page_hash:
+            cached_deck.prices_fetched_time = time.time()
+            save_deck_to_cache(cached_deck, deck_id)
+            return (cached_deck, True)
+
+    deck = build_deck_from_page_data(deck_url, deck_page_data)
+    deck.page_hash = page_hash
+    deck.price_type = get_price_type(use_online_price)
+    deck.prices_fetched_time = time.time()
+    return cache_fetched_deck(deck, deck_id, cached_deck)
+
+
+"""
+Save a freshly fetched deck to the cache, unless it is identical to the cached copy, in which case only the date of the
+cached copy is bumped. A deck read from its full page still records the time its prices were read on the cached copy, as
+the PriceBook relies on it. Returns a tuple of (the Deck to use, True if the deck was unchanged).
+
+:param deck: The fetched Deck
+:param deck_id: The DeckID for the deck from MTGGoldfish.com
+:param cached_deck: The cached copy of the deck, or None if it wasn't cached
+"""
+def cache_fetched_deck(deck, deck_id, cached_deck):
+    if cached_deck is not None and get_deck_hash(cached_deck) == get_deck_hash(deck):
+        if deck.prices_fetched_time is None:
+            refresh_cached_deck_date(deck_id)
+        else:
+            cached_deck.page_hash = deck.page_hash
+            cached_deck.prices_fetched_time = deck.prices_fetched_time
+            save_deck_to_cache(cached_deck, deck_id)
+        return (cached_deck, True)
+
+    save_deck_to_cache(deck, deck_id)
+    return (deck, False)
+
+
+"""
+Build a Deck from the data extracted from its deck page by DECK_PAGE_EXTRACTION_SCRIPT
+
+:param deck_url: The URL of the deck page
+:param deck_page_data: A dict of the format {'title': ..., 'description': ..., 'rows': [['4', 'Scalding Tarn', 'ZEN', '$ 1,271.96'], ...]},
+                       holding the text of the title, the description and every cell of every row of the deck table. Anything
+                       in a price cell that isn't part of the number, such as the '$ ' and ',' above, is ignored
+"""
+def build_deck_from_page_data(deck_url, deck_page_data):
+    deck = Deck()
+    deck.deck_url = deck_url
+    raw_deck_name_parse = deck_page_data['title'].replace('\n', '')
+
+    # The formatting of the name field is different on the meta page vs the budget pages. On the budget pages it is followed with
+    # "by <author>" while on the meta pages it is followed by "Suggest a Better Name"
+    if raw_deck_name_parse.find('by ') > 0:
+        deck.deck_name = raw_deck_name_parse[:raw_deck_name_parse.find(
+            'by ')]
+    else:
+        deck.deck_name = raw_deck_name_parse[:-
+                                             len("Suggest a Better Name")]
+
+    deck_date_as_string = deck_page_data['description'].replace('\n', '')[-len("MMM DD, YYYY"):]
+    deck.deck_date = datetime.strptime(deck_date_as_string, '%b %d, %Y')
+
+    # Iterate over all of the rows in the deck list and build the deck object
+    deck_list = []
+    deck_entries_by_card_key = {}
+    deck_total_cost = 0.0
+    for columns in deck_page_data['rows']:
+
+        # Disregard any of the section title rows such as "Creatures", "Planeswalkers", etc
+        if len(columns) == 4:
+            card_name = CARD_NAMES.intern_card_name(columns[NAME_INDEX].replace('\n', '').strip())
+
+            # We don't care about Basic Mana in any analysis.
+            if is_basic_land(card_name):
+                continue
+
+            card_quantity_string = columns[QTY_INDEX].replace('\n', '')
+            card_price_string = DECK_PAGE_PRICE_IGNORED_CHARACTERS_REGEX.sub('', columns[PRICE_INDEX])
+            if card_quantity_string == '':
+                card_quantity_string = '1'
+            if card_price_string == '':
+                card_price_string = '0'
+            card_quantity = int(card_quantity_string)
+            individual_card_price = float(card_price_string) / float(card_quantity)
+            deck_total_cost += float(card_price_string)
+
+            # It's possible for a card to appear in the list twice if it is present in both the main deck and the sideboard.
+            # If this happens, we need to just update the Quantity and Price of the existing record
+            card_key = get_card_key(card_name)
+            if card_key in deck_entries_by_card_key:
+                deck_entries_by_card_key[card_key][CARD_QTY_KEY] += card_quantity
+            else:
+                deck_entries_by_card_key[card_key] = {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name, CARD_PRICE_KEY: individual_card_price}
+                deck_list.append(deck_entries_by_card_key[card_key])
+
+    deck.deck_list = deck_list
+    deck.deck_price = deck_total_cost
+    return deck
+
+
+"""
+A work queue of decks to fetch, kept in a SQLite database so that a coordinator and any number of fetch workers can share it.
+Workers on other machines only need the queue file and the deck_cache directory on shared storage. Each deck is only queued
+once per type of price (paper or online) no matter how many coordinators publish it, and a worker claims a deck with a lease.
+If the worker crashes before completing the deck, the lease expires and the deck goes back to the queue for another worker
+to pick up.
+
+:param queue_file_path: The path of the SQLite database file, which is created if it doesn't exist yet
+"""
+class FetchQueue(object):
+    def __init__(self, queue_file_path):
+        self.connection = sqlite3.connect(queue_file_path, timeout=FETCH_QUEUE_LOCK_TIMEOUT_SECONDS, isolation_level=None)
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            task_columns = [column[1] for column in self.connection.execute("PRAGMA table_info(fetch_tasks)")]
+
+            # Queues written before tasks were keyed by their type of price are carried over into the current table
+            if len(task_columns) > 0 and 'finished_time' not in task_columns:
+                self.connection.execute("ALTER TABLE fetch_tasks RENAME TO old_fetch_tasks")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS fetch_tasks (deck_id TEXT NOT NULL, deck_url TEXT NOT NULL,"
+                                    " use_online_price INTEGER NOT NULL, status TEXT NOT NULL, worker_id TEXT, lease_expires REAL,"
+                                    " attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, finished_time REAL,"
+                                    " PRIMARY KEY (deck_id, use_online_price))")
+            if len(task_columns) > 0 and 'finished_time' not in task_columns:
+                self.connection.execute("INSERT INTO fetch_tasks (deck_id, deck_url, use_online_price, status, worker_id, lease_expires, attempts,"
+                                        " last_error) SELECT deck_id, deck_url, use_online_price, status, worker_id, lease_expires, attempts,"
+                                        " last_error FROM old_fetch_tasks")
+                self.connection.execute("DROP TABLE old_fetch_tasks")
+            self.connection.execute("COMMIT")
+        except:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    """
+    Queue the given decks to be fetched with the given type of price. Decks that are already queued or being fetched are
+    left alone, and so are decks some worker finished fetching after cache_checked_time, since the cache already holds them.
+    Decks that were fetched before then, or given up on, are queued again.
+
+    :param cache_checked_time: When the publisher last checked the deck cache for these decks, as a time.time() timestamp
+    """
+    def publish(self, deck_URLs_list, use_online_price, cache_checked_time):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            for deck_url in deck_URLs_list:
+                deck_id = get_deck_id_from_url(deck_url)
+                self.connection.execute("INSERT OR IGNORE INTO fetch_tasks (deck_id, deck_url, use_online_price, status) VALUES (?, ?, ?, ?)",
+                                        (deck_id, deck_url.strip(), int(bool(use_online_price)), FETCH_TASK_PENDING))
+                self.connection.execute("UPDATE fetch_tasks SET status = ?, deck_url = ?, worker_id = NULL, attempts = 0, last_error = NULL,"
+                                        " finished_time = NULL WHERE deck_id = ? AND use_online_price = ? AND (status = ? OR (status = ?"
+                                        " AND (finished_time IS NULL OR finished_time < ?)))",
+                                        (FETCH_TASK_PENDING, deck_url.strip(), deck_id, int(bool(use_online_price)), FETCH_TASK_FAILED,
+                                         FETCH_TASK_DONE, cache_checked_time))
+            self.connection.execute("COMMIT")
+        except:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    """
+    Claim the next pending deck for the given worker, returning (deck_id, deck_url, use_online_price), or None if there is
+    nothing left to fetch. Decks whose lease has expired are put back into the queue first
+    """
+    def claim(self, worker_id, lease_seconds=FETCH_QUEUE_LEASE_SECONDS):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            self.connection.execute("UPDATE fetch_tasks SET status = ?, worker_id = NULL WHERE status = ? AND lease_expires < ?",
+                                    (FETCH_TASK_PENDING, FETCH_TASK_CLAIMED, now))
+            task = self.connection.execute("SELECT rowid, deck_id, deck_url, use_online_price FROM fetch_tasks WHERE status = ? ORDER BY rowid LIMIT 1",
+                                           (FETCH_TASK_PENDING,)).fetchone()
+            if task is not None:
+                self.connection.execute("UPDATE fetch_tasks SET status = ?, worker_id = ?, lease_expires = ? WHERE rowid = ?",
+                                        (FETCH_TASK_CLAIMED, worker_id, now + lease_seconds, task[0]))
+            self.connection.execute("COMMIT")
+        except:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        if task is None:
+            return None
+        return (task[1], task[2], bool(task[3]))
+
+    """
+    Mark a claimed deck as fetched. Nothing happens if the worker's lease expired and the deck was handed to another worker
+    """
+    def complete(self, deck_id, use_online_price, worker_id):
+        self.connection.execute("UPDATE fetch_tasks SET status = ?, lease_expires = NULL, finished_time = ? WHERE deck_id = ? AND use_online_price = ?"
+                                " AND status = ? AND worker_id = ?",
+                                (FETCH_TASK_DONE, time.time(), deck_id, int(bool(use_online_price)), FETCH_TASK_CLAIMED, worker_id))
+
+    """
+    Record that fetching a claimed deck failed. The deck goes back into the queue, unless it has already failed
+    FETCH_QUEUE_MAX_ATTEMPTS times, in which case it is given up on
+    """
+    def fail(self, deck_id, use_online_price, worker_id, error_message):
+        self.connection.execute("UPDATE fetch_tasks SET attempts = attempts + 1, last_error = ?, lease_expires = NULL, finished_time = ?,"
+                                " status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END WHERE deck_id = ? AND use_online_price = ?"
+                                " AND status = ? AND worker_id = ?",
+                                (error_message, time.time(), FETCH_QUEUE_MAX_ATTEMPTS, FETCH_TASK_FAILED, FETCH_TASK_PENDING, deck_id,
+                                 int(bool(use_online_price)), FETCH_TASK_CLAIMED, worker_id))
+
+    """
+    Return a dict of DeckID -> (status, last error) for the given DeckIDs, fetched with the given type of price
+    """
+    def get_task_statuses(self, deck_ids, use_online_price):
+        task_statuses = {}
+        deck_ids = list(deck_ids)
+        for chunk_start in range(0, len(deck_ids), 500):
+            deck_ids_chunk = deck_ids[chunk_start:chunk_start + 500]
+            for (deck_id, status, last_error) in self.connection.execute(
+                    "SELECT deck_id, status, last_error FROM fetch_tasks WHERE use_online_price = ? AND deck_id IN (%s)" % (
+                        ", ".join(["?"] * len(deck_ids_chunk))),
+                    [int(bool(use_online_price))] + deck_ids_chunk):
+                task_statuses[deck_id] = (status, last_error)
+        return task_statuses
+
+    def close(self):
+        self.connection.close()
+
+
+"""
+Return an id for this fetch worker that is unique across every machine sharing the queue
+"""
+def get_fetch_worker_id():
+    return "%s-%d" % (socket.gethostname(), os.getpid())
+
+
+"""
+Claim a single deck from the queue, fetch it and store it in the deck cache. Returns the (possibly newly launched) driver to
+re-use for the next deck, or False as the second value of the tuple if there was nothing left to claim
+
+:param fetch_queue: The FetchQueue to claim the deck from
+:param worker_id: The id of this worker, from get_fetch_worker_id()
+:param driver: The browser to fetch with, or None to launch one if a deck is claimed
+"""
+def fetch_next_queued_deck(fetch_queue, worker_id, driver):
+    task = fetch_queue.claim(worker_id)
+    if task is None:
+        return (driver, False)
+
+    (deck_id, deck_url, use_online_price) = task
+    try:
+        if driver is None:
+            driver = new_web_driver()
+        driver.get(deck_url)
+        fetch_deck_from_page(driver, deck_url, deck_id, use_online_price)
+    except Exception as fetch_error:
+        fetch_queue.fail(deck_id, use_online_price, worker_id, "%s" % (fetch_error))
+
+        # The browser may be what broke, so start a fresh one for the next deck
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        return (None, True)
+
+    fetch_queue.complete(deck_id, use_online_price, worker_id)
+    return (driver, True)
+
+
+"""
+Coordinate fetching the given decks through the queue: publish them, help fetch them, and wait until every one of them has
+been fetched by some worker. Raises a DeckFetchError if any deck could not be fetched after FETCH_QUEUE_MAX_ATTEMPTS attempts.
+
+:param fetch_queue: The FetchQueue shared with the workers
+:param deck_URLs_list: The URLs of the decks that need to be fetched
+:param use_online_price: If set to True, the decks are fetched with online (tix) prices
+:param cache_checked_time: When the deck cache was checked for these decks, see FetchQueue.publish
+"""
+def fetch_decks_through_queue(fetch_queue, deck_URLs_list, use_online_price, cache_checked_time):
+    deck_ids = set([get_deck_id_from_url(deck_url) for deck_url in deck_URLs_list])
+    fetch_queue.publish(deck_URLs_list, use_online_price, cache_checked_time)
+    print("   Queued %s decks to be fetched by this run and any running fetch workers." % (len(deck_ids)))
+
+    progress_bar = new_progress_bar("   Fetching Queued Decks", len(deck_ids))
+    worker_id = get_fetch_worker_id()
+    driver = None
+    num_finished_decks = 0
+    try:
+        while True:
+            (driver, claimed_deck) = fetch_next_queued_deck(fetch_queue, worker_id, driver)
+
+            task_statuses = fetch_queue.get_task_statuses(deck_ids, use_online_price)
+            finished_deck_ids = [deck_id for (deck_id, (status, last_error)) in six.iteritems(task_statuses)
+                                 if status in (FETCH_TASK_DONE, FETCH_TASK_FAILED)]
+            for _ in range(len(finished_deck_ids) - num_finished_decks):
+                progress_bar.next()
+            num_finished_decks = max(num_finished_decks, len(finished_deck_ids))
+            if num_finished_decks == len(deck_ids):
+                break
+
+            # Nothing left for us to claim, but other workers are still fetching
+            if not claimed_deck:
+                time.sleep(FETCH_QUEUE_POLL_SECONDS)
+    finally:
+        if driver is not None:
+            driver.quit()
+    progress_bar.finish()
+
+    failed_tasks = [(deck_id, last_error) for (deck_id, (status, last_error)) in six.iteritems(task_statuses) if status == FETCH_TASK_FAILED]
+    if len(failed_tasks) > 0:
+        print("   [ERROR]: %s of %s queued decks could not be fetched:" % (len(failed_tasks), len(deck_ids)))
+        for (deck_id, last_error) in failed_tasks:
+            print("      %s: %s" % (deck_id, last_error))
+        raise DeckFetchError("%s queued decks could not be fetched. Check your internet connection and try running the script again." % (
+            len(failed_tasks)))
+
+
+"""
+Run a fetch worker: claim decks from the queue, fetch them and store them in the deck cache until interrupted with Ctrl+C
+
+:param fetch_queue: The FetchQueue shared with the coordinators
+"""
+def run_fetch_worker(fetch_queue):
+    worker_id = get_fetch_worker_id()
+    print("\nFetch worker %s waiting for decks. Press Ctrl+C to stop." % (worker_id))
+    driver = None
+    num_fetched_decks = 0
+    try:
+        while True:
+            (driver, claimed_deck) = fetch_next_queued_deck(fetch_queue, worker_id, driver)
+            if claimed_deck:
+                num_fetched_decks += 1
+            else:
+                time.sleep(FETCH_QUEUE_POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if driver is not None:
+            driver.quit()
+    print("\nFetch worker %s stopped after processing %s decks." % (worker_id, num_fetched_decks))
+
+
+"""
+A shared source of card prices, keyed by card, built from decks that were fetched recently with the same type of price
+(paper or online). Every card keeps the price from the most recently fetched deck that plays it.
+
+:param price_type: PRICE_TYPE_PAPER or PRICE_TYPE_ONLINE
+"""
+class PriceBook(object):
+    def __init__(self, price_type):
+        self.price_type = price_type
+        self.prices = {}
+
+    """
+    Add the prices of a deck's cards, unless the deck was priced with a different type of price. Only decks whose prices
+    were read from their full deck page are used, never decks that were themselves priced from a PriceBook.
+
+    :param deck: The Deck to take prices from
+    """
+    def add_deck(self, deck):
+        fetched_time = getattr(deck, 'prices_fetched_time', None)
+        if getattr(deck, 'price_type', None) != self.price_type or getattr(deck, 'page_hash', None) is None or fetched_time is None:
+            return
+
+        for card_entry in deck.get_deck_list():
+            card_key = get_card_key(card_entry[CARD_NAME_KEY])
+            known_price = self.prices.get(card_key)
+            if known_price is None or known_price[0] < fetched_time:
+                self.prices[card_key] = (fetched_time, card_entry[CARD_PRICE_KEY])
+
+    """
+    Return the price of a single copy of a card, or None if no deck fetched within the last max_age_days plays it
+    """
+    def get_price(self, card_key, max_age_days=PRICE_BOOK_MAX_AGE_DAYS):
+        known_price = self.prices.get(card_key)
+        if known_price is None or known_price[0] < time.time() - max_age_days * 24 * 60 * 60:
+            return None
+        return known_price[1]
+
+
+"""
+Build a PriceBook from every deck in the deck cache whose prices were read from its full deck page within the last
+PRICE_BOOK_MAX_AGE_DAYS. Decks whose cache file is dated before that can't qualify, so they aren't read at all.
+
+:param price_type: PRICE_TYPE_PAPER or PRICE_TYPE_ONLINE
+"""
+def build_price_book_from_cache(price_type):
+    price_book = PriceBook(price_type)
+    oldest_fetched_time = time.time() - PRICE_BOOK_MAX_AGE_DAYS * 24 * 60 * 60
+    for deck_id in DECK_CACHE.get_deck_ids():
+        if not DECK_CACHE.contains(deck_id):
+            continue
+
+        # The file is dated with the day it was last written, so the prices were read by the end of that day at the latest
+        end_of_cached_day = time.mktime(DECK_CACHE.get_cached_date(deck_id).timetuple()) + 24 * 60 * 60
+        if end_of_cached_day >= oldest_fetched_time:
+            price_book.add_deck(DECK_CACHE.peek(deck_id))
+    return price_book
+
+
+"""
+Return PRICE_TYPE_ONLINE if decks are priced with online (tix) prices, and PRICE_TYPE_PAPER otherwise
+"""
+def get_price_type(use_online_price):
+    if use_online_price:
+        return PRICE_TYPE_ONLINE
+    return PRICE_TYPE_PAPER
+
+
+"""
+Try to fetch a deck without a browser, from the plain-text decklist MTGGoldfish.com serves for numeric /deck/<id> URLs.
+The text decklist only holds quantities and card names, so the prices come from the price book, and the name and date of
+the deck come from its cached copy. Returns a tuple of (Deck, cached Deck), or None if the full deck page has to be
+parsed instead: for archetype pages, decks that were never cached, cards missing from the price book, or any download or
+parsing problem. Raises FetchThrottledError if the server responds with one of FETCH_THROTTLE_STATUS_CODES.
+
+:param deck_url: The URL of the deck page
+:param deck_id: The DeckID for the deck from MTGGoldfish.com
+:param price_type: PRICE_TYPE_PAPER or PRICE_TYPE_ONLINE
+:param price_book: The PriceBook to price the cards with
+"""
+def fetch_deck_from_text_decklist(deck_url, deck_id, price_type, price_book):
+    if not get_canonical_deck_key(deck_url).startswith('deck/') or not deck_id.isdigit() or not is_deck_cached(deck_id):
+        return None
+
+    parsed_deck_url = urlparse(deck_url.strip())
+    try:
+        response = urlopen(TEXT_DECKLIST_URL_FORMAT % (parsed_deck_url.scheme, parsed_deck_url.netloc, deck_id), timeout=TEXT_DECKLIST_TIMEOUT_SECONDS)
+        try:
+            decklist_text = response.read().decode('utf-8', 'replace')
+        finally:
+            response.close()
+    except HTTPError as http_error:
+        if http_error.code in FETCH_THROTTLE_STATUS_CODES:
+            raise FetchThrottledError(get_retry_after_seconds(http_error))
+        return None
+    except Exception:
+        return None
+
+    # The main deck and the sideboard are separated by a blank line, and a card can be part of both
+    deck_list = []
+    deck_entries_by_card_key = {}
+    deck_total_cost = 0.0
+    for line in decklist_text.splitlines():
+        line = line.strip()
+        if len(line) == 0:
+            continue
+
+        decklist_line_match = TEXT_DECKLIST_LINE_REGEX.match(line)
+        if decklist_line_match is None:
+            return None
+
+        card_name = CARD_NAMES.intern_card_name(decklist_line_match.group(2).strip())
+
+        # We don't care about Basic Mana in any analysis.
+        if is_basic_land(card_name):
+            continue
+
+        card_key = get_card_key(card_name)
+        individual_card_price = price_book.get_price(card_key)
+        if individual_card_price is None:
+            return None
+
+        card_quantity = int(decklist_line_match.group(1))
+        deck_total_cost += card_quantity * individual_card_price
+        if card_key in deck_entries_by_card_key:
+            deck_entries_by_card_key[card_key][CARD_QTY_KEY] += card_quantity
+        else:
+            deck_entries_by_card_key[card_key] = {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name, CARD_PRICE_KEY: individual_card_price}
+            deck_list.append(deck_entries_by_card_key[card_key])
+
+    if len(deck_list) == 0:
+        return None
+
+    cached_deck = DECK_CACHE.peek(deck_id)
+    deck = Deck()
+    deck.deck_name = cached_deck.get_deck_name()
+    deck.deck_url = deck_url
+    deck.deck_date = cached_deck.get_deck_date()
+    deck.deck_list = deck_list
+    deck.deck_price = deck_total_cost
+    deck.price_type = price_type
+    return (deck, cached_deck)
+
+
+"""
+Raised when the decks a run needs can't be loaded, such as when a deck could not be fetched after every retry or when a
+cache-only run is missing decks. The details have already been printed; the message says what to do about it.
+"""
+class DeckFetchError(Exception):
+    pass
+
+
+"""
+Call a function that fetches decks and return its result. If it raises a DeckFetchError, the error is printed and
+the script exits, as there is nothing to report without the decks.
+
+:param fetch_function: The function to call, such as parse_deck_urls_from_category_landing_page
+"""
+def run_fetch_or_exit(fetch_function, *args):
+    try:
+        return fetch_function(*args)
+    except DeckFetchError as fetch_error:
+        print("   [ERROR]: %s Exiting." % (fetch_error))
+        sys.exit(1)
+
+
+"""
+Raised when MTGGoldfish.com asks us to slow down, either with an HTTP status in FETCH_THROTTLE_STATUS_CODES or with an error
+page titled with one of FETCH_THROTTLE_PAGE_TITLES
+
+:param retry_after_seconds: How long the server asked us to wait before the next request, or None if it didn't say
+"""
+class FetchThrottledError(Exception):
+    def __init__(self, retry_after_seconds=None):
+        Exception.__init__(self, "Throttled by the server")
+        self.retry_after_seconds = retry_after_seconds
+
+
+"""
+Return the number of seconds in the Retry-After header of an HTTP error response, or None if it has none. Retry-After
+headers holding an HTTP date instead of a number of seconds are ignored.
+
+:param http_error: The HTTPError raised by urlopen
+"""
+def get_retry_after_seconds(http_error):
+    retry_after = http_error.headers.get('Retry-After') if http_error.headers is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+
+"""
+Return True if the page the driver navigated to is a throttling error page rather than the requested page
+
+:param driver: The WebDriver that navigated to the page
+"""
+def is_throttled_page(driver):
+    try:
+        page_title = driver.title or ''
+    except Exception:
+        return False
+    return any(throttle_title in page_title for throttle_title in FETCH_THROTTLE_PAGE_TITLES)
+
+
+"""
+Decides how many deck fetches may be in flight at once, AIMD style: the limit grows additively by one for every round of
+fetches (one per fetch currently allowed in flight) that succeed within the target latency, and shrinks multiplicatively
+whenever a fetch is throttled, fails or is slower than the target latency. Only one decrease happens per round, as fetches
+that were already in flight when the limit was last decreased say nothing about the new limit. A throttled fetch also
+pauses every fetch for as long as the server's Retry-After header asks, or FETCH_THROTTLE_BACKOFF_SECONDS.
+
+:param min_in_flight: The lowest the limit ever goes, and where it starts
+:param max_in_flight: The highest the limit ever goes
+:param target_latency_seconds: Fetches slower than this are treated as a sign of an overloaded server
+"""
+class AdaptiveConcurrencyController(object):
+    def __init__(self, min_in_flight, max_in_flight, target_latency_seconds):
+        self.min_in_flight = min_in_flight
+        self.max_in_flight = max_in_flight
+        self.target_latency_seconds = target_latency_seconds
+        self.limit = float(min_in_flight)
+        self.num_in_flight = 0
+        self.peak_in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease_time = 0.0
+        self.outcome_counts = {FETCH_OUTCOME_SUCCESS: 0, FETCH_OUTCOME_THROTTLED: 0, FETCH_OUTCOME_ERROR: 0}
+        self.total_latency_seconds = 0.0
+        self.condition = threading.Condition()
+
+    """
+    Return the number of fetches currently allowed in flight
+    """
+    def get_limit(self):
+        return int(self.limit)
+
+    """
+    Block until another fetch is allowed in flight, and return the time it started at, to be handed back to release()
+    """
+    def acquire(self):
+        with self.condition:
+            while True:
+                pause_seconds = self.paused_until - time.time()
+                if pause_seconds > 0:
+                    self.condition.wait(pause_seconds)
+                elif self.num_in_flight >= self.get_limit():
+                    self.condition.wait()
+                else:
+                    break
+            self.num_in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.num_in_flight)
+            return time.time()
+
+    """
+    Record the outcome of a fetch started by acquire(), and adjust the limit accordingly
+
+    :param fetch_start_time: The time returned by acquire()
+    :param outcome: FETCH_OUTCOME_SUCCESS, FETCH_OUTCOME_THROTTLED or FETCH_OUTCOME_ERROR
+    :param retry_after_seconds: For throttled fetches, how long the server asked us to wait, if it said
+    """
+    def release(self, fetch_start_time, outcome, retry_after_seconds=None):
+        now = time.time()
+        latency_seconds = now - fetch_start_time
+        with self.condition:
+            self.num_in_flight -= 1
+            self.outcome_counts[outcome] += 1
+            self.total_latency_seconds += latency_seconds
+
+            if outcome == FETCH_OUTCOME_THROTTLED:
+                if retry_after_seconds is None:
+                    retry_after_seconds = FETCH_THROTTLE_BACKOFF_SECONDS
+                self.paused_until = max(self.paused_until, now + min(retry_after_seconds, FETCH_THROTTLE_MAX_BACKOFF_SECONDS))
+
+            if outcome == FETCH_OUTCOME_SUCCESS and latency_seconds <= self.target_latency_seconds:
+                self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+            elif fetch_start_time >= self.last_decrease_time:
+                self.limit = max(float(self.min_in_flight), self.limit * FETCH_DECREASE_FACTOR)
+                self.last_decrease_time = now
+
+            self.condition.notify_all()
+
+    """
+    Return a dict of the number of fetches per outcome, plus 'average latency', 'peak in flight' and 'limit'
+    """
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.outcome_counts)
+            num_fetches = sum(self.outcome_counts.values())
+            stats['average latency'] = self.total_latency_seconds / num_fetches if num_fetches > 0 else 0.0
+            stats['peak in flight'] = self.peak_in_flight
+            stats['limit'] = self.get_limit()
+            return stats
+
+
+"""
+Fetches decks over the network on behalf of one fetch thread, with every attempt gated by the shared
+AdaptiveConcurrencyController. A browser is only launched once a deck can't be read from its plain-text decklist, and is
+re-used for every deck after it.
+
+:param controller: The AdaptiveConcurrencyController shared by every fetch thread
+:param use_online_price: If set to True, prices are read from the online (tix) deck table instead of the paper one
+:param price_book: The PriceBook shared by every fetch thread, to price plain-text decklists with
+"""
+class DeckFetchWorker(object):
+    def __init__(self, controller, use_online_price, price_book):
+        self.controller = controller
+        self.use_online_price = use_online_price
+        self.price_book = price_book
+        self.driver = None
+
+    """
+    Fetch a deck, retrying throttled and failed attempts up to FETCH_MAX_ATTEMPTS times in total. Returns a tuple of
+    (Deck, True if the deck was unchanged, True if it was read from its plain-text decklist), or None if every attempt failed.
+    """
+    def fetch_deck(self, deck_url, deck_id):
+        for attempt in range(1, FETCH_MAX_ATTEMPTS + 1):
+            fetch_start_time = self.controller.acquire()
+            try:
+                fetched_deck = self.fetch_deck_once(deck_url, deck_id)
+            except FetchThrottledError as throttled_error:
+                self.controller.release(fetch_start_time, FETCH_OUTCOME_THROTTLED, throttled_error.retry_after_seconds)
+                continue
+            except Exception:
+                self.controller.release(fetch_start_time, FETCH_OUTCOME_ERROR)
+
+                # The browser itself may be what failed, so the next attempt starts with a fresh one
+                self.quit()
+                if attempt < FETCH_MAX_ATTEMPTS:
+                    time.sleep(FETCH_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                continue
+
+            self.controller.release(fetch_start_time, FETCH_OUTCOME_SUCCESS)
+            return fetched_deck
+        return None
+
+    """
+    Make a single attempt at fetching a deck, from its plain-text decklist if possible and otherwise from the full deck page.
+    Fetching the deck also caches it, or only bumps the date of the cached deck if nothing changed.
+    """
+    def fetch_deck_once(self, deck_url, deck_id):
+        text_decklist_deck = fetch_deck_from_text_decklist(deck_url, deck_id, self.price_book.price_type, self.price_book)
+        if text_decklist_deck is not None:
+            (deck, deck_was_unchanged) = cache_fetched_deck(text_decklist_deck[0], deck_id, text_decklist_deck[1])
+            return (deck, deck_was_unchanged, True)
+
+        if self.driver is None:
+            self.driver = new_web_driver()
+        self.driver.get(deck_url)
+        if is_throttled_page(self.driver):
+            raise FetchThrottledError()
+
+        (deck, deck_was_unchanged) = fetch_deck_from_page(self.driver, deck_url, deck_id, self.use_online_price)
+        self.price_book.add_deck(deck)
+        return (deck, deck_was_unchanged, False)
+
+    """
+    Close the browser, if one was launched
+    """
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+
+"""
+Fetch the given decks over the network, as many at a time as the AdaptiveConcurrencyController allows. Returns a tuple of
+(dict of DeckID -> the tuple returned by DeckFetchWorker.fetch_deck, list of the URLs of the decks that could not be
+fetched, dict of the controller's stats).
+
+:param deck_fetches: A list of (deck URL, DeckID) tuples of the decks to fetch
+:param use_online_price: If set to True, prices are read from the online (tix) deck table instead of the paper one
+:param price_book: The PriceBook to price plain-text decklists with
+:param progress_bar: The progress bar to advance once per deck
+"""
+def fetch_decks_concurrently(deck_fetches, use_online_price, price_book, progress_bar):
+    controller = AdaptiveConcurrencyController(FETCH_MIN_IN_FLIGHT, FETCH_MAX_IN_FLIGHT, FETCH_TARGET_LATENCY_SECONDS)
+    pending_deck_fetches = list(deck_fetches)
+    fetched_decks = {}
+    lock = threading.Lock()
+
+    def run_fetch_thread():
+        worker = DeckFetchWorker(controller, use_online_price, price_book)
+        try:
+            while True:
+                with lock:
+                    if len(pending_deck_fetches) == 0:
+                        return
+                    (deck_url, deck_id) = pending_deck_fetches.pop(0)
+
+                fetched_deck = worker.fetch_deck(deck_url, deck_id)
+                with lock:
+                    if fetched_deck is not None:
+                        fetched_decks[deck_id] = fetched_deck
+                    progress_bar.next()
+        finally:
+            worker.quit()
+
+    fetch_threads = [threading.Thread(target=run_fetch_thread) for thread_index in range(min(FETCH_MAX_IN_FLIGHT, len(deck_fetches)))]
+    for fetch_thread in fetch_threads:
+        fetch_thread.daemon = True
+        fetch_thread.start()
+    for fetch_thread in fetch_threads:
+        fetch_thread.join()
+
+    failed_deck_URLs = [deck_url for (deck_url, deck_id) in deck_fetches if deck_id not in fetched_decks]
+    return (fetched_decks, failed_deck_URLs, controller.get_stats())
+
+
+"""
+Given the desired deck URLs, parse all of the decks into Deck objects. Decks that aren't cached are fetched concurrently,
+see AdaptiveConcurrencyController, and failed fetches are retried before a DeckFetchError gives up on the run
+
+:param update_cache: If set to True, we will ignore any cached versions of these decks
+:param deck_URLs_list: The list of deck URLs
+:param cache_only: If set to True, every deck must come from the cache. A DeckFetchError is raised before loading
+                   anything if any of them are missing, rather than opening a browser
+:param fetch_queue: If given, the decks that need fetching are published to this FetchQueue and fetched by this run
+                    together with any running fetch workers, instead of one after another by this run alone
+"""
+def parse_decks_from_list_of_urls(update_cache, deck_URLs_list, use_online_price, cache_only=False, fetch_queue=None):
+    if cache_only:
+        missing_deck_URLs = [deck_url for deck_url in deck_URLs_list if not is_deck_cached(get_deck_id_from_url(deck_url))]
+        if len(missing_deck_URLs) > 0:
+            print("   [ERROR]: Decks missing from the cache:")
+            for deck_url in missing_deck_URLs:
+                print("      %s" % (deck_url.strip()))
+            raise DeckFetchError("Cache-only run, but %s of %s decks are not cached. Run once without the \"-c\" flag to fetch them." % (
+                len(missing_deck_URLs), len(deck_URLs_list)))
+
+    if update_cache:
+        print("   Manual cache update requested, updating all local deck caches.")
+
+    cache_stats_before_fetch = DECK_CACHE.get_stats()
+
+    # Every deck that needs fetching is fetched through the queue first, after which it is loaded from the cache like any other
+    queued_deck_ids = set()
+    if fetch_queue is not None:
+        # Workers may have written decks since the cache directory was listed, so it is listed again before deciding what to queue
+        cache_checked_time = time.time()
+        DECK_CACHE.reindex()
+        queued_deck_URLs = [deck_url for deck_url in deck_URLs_list if update_cache or not is_deck_cached(get_deck_id_from_url(deck_url))]
+        if len(queued_deck_URLs) > 0:
+            fetch_decks_through_queue(fetch_queue, queued_deck_URLs, use_online_price, cache_checked_time)
+            queued_deck_ids = set([get_deck_id_from_url(deck_url) for deck_url in queued_deck_URLs])
+            for deck_id in queued_deck_ids:
+                DECK_CACHE.record_miss()
+
+            # The decks were written by whichever workers fetched them, so the cache directory has to be listed again
+            DECK_CACHE.reindex()
+
+    progress_bar = new_progress_bar("   Fetching Deck Data", len(deck_URLs_list))
+    deck_objs_list = []
+    num_cached_decks = 0
+    num_old_cached_decks = 0
+
+    # Cached decks are loaded right away, while every deck that has to be fetched is left as a placeholder in the list and
+    # fetched concurrently afterwards
+    deck_fetches = []
+    deck_fetch_positions = []
+    for deck_url in deck_URLs_list:
+        deck_id = get_deck_id_from_url(deck_url)
+        if deck_id in queued_deck_ids:
+            deck_objs_list.append(load_deck_from_cache(deck_id))
+            progress_bar.next()
+            continue
+
+        # Check whether or not a cached version of this deck exists locally, and use that instead
+        if not update_cache and is_deck_cached(deck_id):
+            num_cached_decks += 1
+            if cached_deck_is_old(deck_id):
+                num_old_cached_decks += 1
+
+            # Load the deck from the cache
+            deck_objs_list.append(load_deck_from_cache(deck_id))
+
+            progress_bar.next()
+            continue
+
+        DECK_CACHE.record_miss()
+        deck_fetches.append((deck_url, deck_id))
+        deck_fetch_positions.append(len(deck_objs_list))
+        deck_objs_list.append(None)
+
+    # The price book for the plain-text decklists is only built once the first deck has to be fetched
+    num_text_decklists = 0
+    num_unchanged_decks = 0
+    fetch_stats = None
+    if len(deck_fetches) > 0:
+        price_book = build_price_book_from_cache(get_price_type(use_online_price))
+        (fetched_decks, failed_deck_URLs, fetch_stats) = fetch_decks_concurrently(deck_fetches, use_online_price, price_book, progress_bar)
+        if len(failed_deck_URLs) > 0:
+            progress_bar.finish()
+            for deck_url in failed_deck_URLs:
+                print("   [ERROR]: Failed to navigate to \"%s\" after %s attempts" % (deck_url.strip(), FETCH_MAX_ATTEMPTS))
+            raise DeckFetchError("%s decks could not be fetched. Check your internet connection. Also note that sometimes MTGGoldfish.com experiences issues, try navigating to this URL yourself and see if it works. Try running the script again." % (
+                len(failed_deck_URLs)))
+
+        for ((deck_url, deck_id), deck_position) in zip(deck_fetches, deck_fetch_positions):
+            (deck, deck_was_unchanged, deck_was_text_decklist) = fetched_decks[deck_id]
+            deck_objs_list[deck_position] = deck
+            if deck_was_text_decklist:
+                num_text_decklists += 1
+            if deck_was_unchanged:
+                num_unchanged_decks += 1
+
+    progress_bar.finish()
+
+    # Print number of cached decks used
+    print("   Finished fetching deck data. %s of %s decks were fetched from the cache." % (
+        num_cached_decks, len(deck_URLs_list)))
+    cache_stats = DECK_CACHE.get_stats()
+    print("   Cache stats: %s hits, %s misses, %s stale." % tuple(
+        [cache_stats[stat_key] - cache_stats_before_fetch[stat_key] for stat_key in [CACHE_HITS_KEY, CACHE_MISSES_KEY, CACHE_STALE_KEY]]))
+    if fetch_stats is not None:
+        print("   Fetched %s decks with up to %s in flight: %s throttled and %s failed attempts were retried, %.1fs average latency." % (
+            len(deck_fetches), fetch_stats['peak in flight'], fetch_stats[FETCH_OUTCOME_THROTTLED], fetch_stats[FETCH_OUTCOME_ERROR],
+            fetch_stats['average latency']))
+    if num_text_decklists > 0:
+        print("   %s of the fetched decks were read from their plain-text decklist instead of the full deck page." % (num_text_decklists))
+    if num_unchanged_decks > 0:
+        print("   %s of the fetched decks were unchanged, so their cached copy was kept." % (num_unchanged_decks))
+
+    # Print number of stale decks and recommend updating
+    if num_old_cached_decks > 0:
+        print("   [WARNING]: %s  of %s cached decks in this fetch were created more than 30 days ago."
+              " Prices may have changed significantly since then."
+              " You should run \"python mtggoldfish.py -u\" to update your cached decks." % (num_old_cached_decks, len(deck_URLs_list)))
+    return deck_objs_list
+
+
+"""
+Given the URL for a category landing page on MTGGoldfish.com (such as "https://www.mtggoldfish.com/decks/budget/modern#paper"),
+parse all of the URLs for the various decks on that page. It uses the #paper or #online queryparam to determine which URL to load
+for each deck
+
+:param category_landing_page_url: The URL of the category landing page that contains a list of various decks
+:param cache_only: If set to True, the deck URLs saved from the last time this page was parsed are returned instead,
+                   and a DeckFetchError is raised if the page has never been parsed
+:param meta_shares: If given, this dict is filled in with DeckID -> Metagame share (as a fraction, so 12.3% is 0.123)
+                    for every deck tile that lists one. Only the Metagame landing pages list shares
+
+A DeckFetchError is raised if the deck tiles can't all be read, rather than returning only the decks read before the problem
+"""
+def parse_deck_urls_from_category_landing_page(category_landing_page_url, cache_only=False, meta_shares=None):
+    if meta_shares is None:
+        meta_shares = {}
+
+    if cache_only:
+        snapshot_deck_URLs = load_landing_page_snapshot(category_landing_page_url, meta_shares)
+        if snapshot_deck_URLs is None:
+            raise DeckFetchError("Cache-only run, but \"%s\" has never been snapshotted. Run once without the \"-c\" flag." % (
+                category_landing_page_url))
+        return snapshot_deck_URLs
+
+    print("   Opening a browser real quick to snapshot deck URLs from MTGGoldfish.com, as there might be new decks that we need to fetch data for.")
+    driver = new_web_driver()
+    driver.get(category_landing_page_url)
+
+    deck_URL_container_element_tag = "deck-price-paper"
+    if "#online" in category_landing_page_url.lower():
+        deck_URL_container_element_tag = "deck-price-online"
+
+    budget_deck_url_list = []
+    try:
+        wait_for_element_by_class_name(driver, "archetype-tile")
+        for deck_tile in driver.execute_script(LANDING_PAGE_EXTRACTION_SCRIPT, deck_URL_container_element_tag):
+            deck_url = deck_tile['url']
+            if deck_url is None:
+                raise DeckFetchError("A deck tile on \"%s\" has no deck URL, the page layout may have changed." % (category_landing_page_url))
+
+            # For some reason, the #paper landing page contains URLS for the #online
+            budget_deck_url_list.append(deck_url)
+
+            # Metagame tiles list the share of the Metagame the deck makes up, such as "12.3%". Budget tiles don't
+            if deck_tile['share'] is not None:
+                try:
+                    meta_shares[get_deck_id_from_url(deck_url)] = float(deck_tile['share'].strip().split('%')[0]) / 100.0
+                except ValueError:
+                    pass
+    except DeckFetchError:
+        raise
+    except Exception as parse_error:
+        raise DeckFetchError("Could not read the deck tiles on \"%s\": %s" % (category_landing_page_url, parse_error))
+    finally:
+        driver.quit()
+
+    if len(budget_deck_url_list) > 0:
+        save_landing_page_snapshot(category_landing_page_url, budget_deck_url_list, meta_shares)
+    return budget_deck_url_list
+
+
+"""
+Return the canonical key of a deck URL, which is the same for every URL of the same deck no matter its scheme, host,
+trailing slash, query string or #paper/#online fragment. Both kinds of deck URL are understood:
+    "https://www.mtggoldfish.com/deck/784979#paper"                     -> "deck/784979"
+    "https://www.mtggoldfish.com/archetype/modern-grixis-death-s-shadow" -> "archetype/modern-grixis-death-s-shadow"
+
+:param deck_url: The deck URL
+"""
+def get_canonical_deck_key(deck_url):
+    deck_url_path = [path_part for path_part in urlparse(deck_url.strip()).path.lower().split('/') if len(path_part) > 0]
+    if len(deck_url_path) >= 2 and deck_url_path[-2] in DECK_URL_KINDS:
+        return "%s/%s" % (deck_url_path[-2], deck_url_path[-1])
+
+    # Not a URL we know the layout of, so fall back to the DeckID the cache uses
+    return get_deck_id_from_url(deck_url).lower()
+
+
+"""
+Return the URL a deck is fetched, cached and queued under, rebuilt from its canonical key (see get_canonical_deck_key) so
+that every spelling of the same deck URL ends up with the same DeckID. The scheme, host and #paper/#online fragment are kept:
+    "https://www.mtggoldfish.com/deck/784979/?x=1#paper" -> "https://www.mtggoldfish.com/deck/784979#paper"
+URLs whose layout isn't known are returned untouched.
+
+:param deck_url: The deck URL
+"""
+def get_canonical_deck_url(deck_url):
+    deck_key = get_canonical_deck_key(deck_url)
+    if '/' not in deck_key:
+        return deck_url
+
+    parsed_url = urlparse(deck_url.strip())
+    return urlunparse((parsed_url.scheme, parsed_url.netloc, '/' + deck_key, '', '', parsed_url.fragment))
+
+
+"""
+Plans every deck fetch of a run. Each analysis adds the deck URLs it needs as a named view, and the plan fetches every
+unique deck once, in a single pass, with the decks of the most important views first (the decks in desired_decks.txt, then
+the Metagame decks, then the Budget decks). Each analysis then gets its decks back as a view over the shared deck set, so a
+deck listed in several places is fetched and loaded only once and shared by every analysis that uses it.
+"""
+class DeckFetchPlan(object):
+    def __init__(self):
+        self.deck_URLs_by_key = {}
+        self.deck_priorities_by_key = {}
+        self.deck_keys_by_view = {}
+        self.decks_by_key = {}
+
+    """
+    Add the decks of a view to the plan. Duplicate URLs within a view are only listed once, and each deck is fetched
+    under its canonical URL, see get_canonical_deck_url.
+
+    :param view_name: The name the view's decks are later retrieved by, such as DECK_VIEW_METAGAME
+    :param deck_URLs_list: The deck URLs of the view, in order
+    :param priority: Views with a lower priority are fetched first
+    """
+    def add_view(self, view_name, deck_URLs_list, priority):
+        view_deck_keys = []
+        for deck_url in deck_URLs_list:
+            deck_key = get_canonical_deck_key(deck_url)
+            if deck_key in view_deck_keys:
+                continue
+            view_deck_keys.append(deck_key)
+            self.deck_URLs_by_key.setdefault(deck_key, get_canonical_deck_url(deck_url))
+            self.deck_priorities_by_key[deck_key] = min(priority, self.deck_priorities_by_key.get(deck_key, priority))
+        self.deck_keys_by_view[view_name] = view_deck_keys
+
+    def get_view_size(self, view_name):
+        return len(self.deck_keys_by_view.get(view_name, []))
+
+    def get_unique_deck_count(self):
+        return len(self.deck_URLs_by_key)
+
+    """
+    Fetch every unique deck of the plan once, in priority order, with a single progress bar and cache pass.
+    The arguments are passed on to parse_decks_from_list_of_urls.
+    """
+    def fetch(self, update_cache, use_online_price, cache_only=False, fetch_queue=None):
+        deck_keys = sorted(self.deck_URLs_by_key, key=lambda deck_key: self.deck_priorities_by_key[deck_key])
+        decks = parse_decks_from_list_of_urls(update_cache, [self.deck_URLs_by_key[deck_key] for deck_key in deck_keys],
+                                              use_online_price, cache_only, fetch_queue)
+        self.decks_by_key = dict(zip(deck_keys, decks))
+
+    """
+    Return the fetched Deck objects of a view, in the order its URLs were added
+    """
+    def get_decks(self, view_name):
+        return [self.decks_by_key[deck_key] for deck_key in self.deck_keys_by_view.get(view_name, [])]
+
+
+"""
+Persists the per-deck results of the Owned Cards, Metagame Recommendation and Budget evaluations between runs, together
+with the collection they were computed for. When owned_cards.txt changes, the old and new collections are diffed and only the
+decks that contain one of the changed cards (found through a card -> decks inverted index) are evaluated again. Every other
+result is re-used as long as the deck's hash (see get_deck_hash) is unchanged, so small edits to a large collection are reflected almost
+instantly. Like the deck cache, the file is zlib-compressed JSON of the format:
+    {"Format": "mtggoldfish-evaluations", "Version": 3, "Collection": [["Scalding Tarn", 4], ...],
+     "Results": {"Owned Cards": [[<result key>, <deck hash(es)>, <result>], ...], ...}}
+Result keys and deck hashes that are tuples, such as those of the Budget evaluation, are stored as lists and turned back into
+tuples when the file is read. A file in any other format or version, such as one pickled by an older version of this script,
+is never unpickled and every deck is simply evaluated again.
+
+:param owned_cards: The list of Owned Cards this run is evaluating
+"""
+class EvaluationCache(object):
+    def __init__(self, owned_cards, cache_file_path=None):
+        if cache_file_path is None:
+            cache_file_path = os.path.join(os.path.dirname(__file__), EVALUATION_CACHE_FILE_NAME)
+        self.cache_file_path = cache_file_path
+        self.collection = [(owned_card_entry[CARD_NAME_KEY], owned_card_entry[CARD_QTY_KEY]) for owned_card_entry in owned_cards]
+        self.previous_results = {}
+        self.results = {}
+        self.reused_result_count = 0
+        self.evaluated_result_count = 0
+
+        previous_collection = None
+        if os.path.isfile(self.cache_file_path):
+            try:
+                with open(self.cache_file_path, 'rb') as input:
+                    (previous_collection, self.previous_results) = decode_evaluation_cache(input.read())
+            except Exception as load_error:
+                print("   [WARNING]: Could not load the evaluation cache, every deck will be evaluated again: %s" % (load_error))
+
+        self.changed_card_keys = self.diff_collections(previous_collection)
+
+    """
+    Return the set of card keys whose quantity or spelling differs between the previous collection and this one, or None if
+    every result has to be evaluated again, because there is no previous collection or the order of the owned cards changed
+    (the Metagame Recommendation lists cards in the order they appear in owned_cards.txt)
+    """
+    def diff_collections(self, previous_collection):
+        if previous_collection is None:
+            return None
+
+        previous_cards_by_key = dict((get_card_key(card_name), (card_name, card_quantity)) for (card_name, card_quantity) in previous_collection)
+        current_cards_by_key = dict((get_card_key(card_name), (card_name, card_quantity)) for (card_name, card_quantity) in self.collection)
+        changed_card_keys = set()
+        for card_key in set(previous_cards_by_key) | set(current_cards_by_key):
+            if previous_cards_by_key.get(card_key) != current_cards_by_key.get(card_key):
+                changed_card_keys.add(card_key)
+
+        previous_card_order = [get_card_key(card_name) for (card_name, card_quantity) in previous_collection
+                               if get_card_key(card_name) not in changed_card_keys]
+        current_card_order = [get_card_key(card_name) for (card_name, card_quantity) in self.collection
+                              if get_card_key(card_name) not in changed_card_keys]
+        if previous_card_order != current_card_order:
+            return None
+        return changed_card_keys
+
+    """
+    Return the set of DeckIDs of the given decks that contain at least one changed card, or None if every deck is affected
+    """
+    def find_affected_deck_ids(self, decks_list):
+        if self.changed_card_keys is None:
+            return None
+
+        card_to_decks_index = build_card_to_decks_index(decks_list)
+        affected_deck_ids = set()
+        for card_key in self.changed_card_keys:
+            for (deck, card_entry) in card_to_decks_index.get(card_key, []):
+                affected_deck_ids.add(get_deck_id_from_url(deck.get_deck_url()))
+        return affected_deck_ids
+
+    """
+    Return the result of an evaluation, re-using the previous run's result when its deck hash matches and it isn't affected
+    by the collection changes, or calling evaluate() to compute it otherwise
+
+    :param analysis_name: The report section the result belongs to, such as REPORT_SECTION_OWNED_CARDS
+    :param result_key: What the result is keyed by within the analysis, such as the DeckID of the evaluated deck
+    :param result_deck_hash: The hash(es) of the deck(s) the result was computed from
+    :param result_is_affected: Whether any of the changed cards are part of those deck(s)
+    :param evaluate: A function computing the result from scratch
+    """
+    def get_result(self, analysis_name, result_key, result_deck_hash, result_is_affected, evaluate):
+        cached_result = self.previous_results.get(analysis_name, {}).get(result_key)
+        if cached_result is not None and not result_is_affected and cached_result[0] == result_deck_hash:
+            result = cached_result[1]
+            self.reused_result_count += 1
+        else:
+            result = evaluate()
+            self.evaluated_result_count += 1
+        self.results.setdefault(analysis_name, {})[result_key] = (result_deck_hash, result)
+        return result
+
+    """
+    Persist this run's collection and results. Results of analyses that weren't run this time are kept for later runs, but
+    only if the collection is unchanged, as the file only records the collection of this run and they were computed for the
+    previous one.
+    """
+    def save(self):
+        results = {}
+        if self.changed_card_keys is not None and len(self.changed_card_keys) == 0:
+            results.update(self.previous_results)
+        results.update(self.results)
+        with open(self.cache_file_path, 'wb') as output:
+            output.write(encode_evaluation_cache(self.collection, results))
+
+
+"""
+Serialize the collection and results of an EvaluationCache, see the class description for the format
+"""
+def encode_evaluation_cache(collection, results):
+    encoded_results = {}
+    for (analysis_name, analysis_results) in six.iteritems(results):
+        encoded_results[analysis_name] = [[result_key, result_deck_hash, result]
+                                          for (result_key, (result_deck_hash, result)) in six.iteritems(analysis_results)]
+    cached_evaluations = {EVALUATION_CACHE_FORMAT_KEY: EVALUATION_CACHE_FORMAT_NAME, EVALUATION_CACHE_VERSION_KEY: EVALUATION_CACHE_VERSION,
+                          EVALUATION_CACHE_COLLECTION_KEY: collection, EVALUATION_CACHE_RESULTS_KEY: encoded_results}
+    return zlib.compress(json.dumps(cached_evaluations, sort_keys=True).encode('utf-8'))
+
+
+"""
+Deserialize the contents of an evaluation cache file written by encode_evaluation_cache, returning a tuple of
+(collection, results). Raises a ValueError if the file is in any other format or version.
+"""
+def decode_evaluation_cache(cached_evaluations_data):
+    if cached_evaluations_data[:1] != DECK_FILE_ZLIB_HEADER:
+        raise ValueError("Not in the current evaluation cache format, it was probably written by an older version of this script")
+    cached_evaluations = json.loads(zlib.decompress(cached_evaluations_data).decode('utf-8'))
+    if cached_evaluations.get(EVALUATION_CACHE_FORMAT_KEY) != EVALUATION_CACHE_FORMAT_NAME:
+        raise ValueError("Not an evaluation cache")
+    if cached_evaluations.get(EVALUATION_CACHE_VERSION_KEY) != EVALUATION_CACHE_VERSION:
+        raise ValueError("Evaluation cache version %s is not supported by this version of the script, which reads version %s" % (
+            cached_evaluations.get(EVALUATION_CACHE_VERSION_KEY), EVALUATION_CACHE_VERSION))
+
+    results = {}
+    for (analysis_name, encoded_results) in six.iteritems(cached_evaluations[EVALUATION_CACHE_RESULTS_KEY]):
+        analysis_results = results.setdefault(analysis_name, {})
+        for (result_key, result_deck_hash, result) in encoded_results:
+            if isinstance(result_key, list):
+                result_key = tuple(result_key)
+            if isinstance(result_deck_hash, list):
+                result_deck_hash = tuple(result_deck_hash)
+            analysis_results[result_key] = (result_deck_hash, result)
+    return (cached_evaluations[EVALUATION_CACHE_COLLECTION_KEY], results)
+
+
+"""
+Return the evaluation of a single deck, through the EvaluationCache if one is given
+
+:param evaluation_cache: An EvaluationCache, or None to always evaluate
+:param analysis_name: The report section the result belongs to
+:param deck: The Deck being evaluated
+:param affected_deck_ids: The result of EvaluationCache.find_affected_deck_ids for the decks being evaluated
+:param evaluate: A function computing the result from scratch
+"""
+def get_cached_deck_evaluation(evaluation_cache, analysis_name, deck, affected_deck_ids, evaluate):
+    if evaluation_cache is None:
+        return evaluate()
+
+    deck_id = get_deck_id_from_url(deck.get_deck_url())
+    deck_is_affected = affected_deck_ids is None or deck_id in affected_deck_ids
+    return evaluation_cache.get_result(analysis_name, deck_id, get_deck_hash(deck), deck_is_affected, evaluate)
+
+
+"""
+Index a list of card records by card key, returning a dict of card key -> the first card record for that card
+
+:param card_list: A list of card records using CARD_NAME_KEY, such as the owned cards or a deck list
+"""
+def build_card_entry_index(card_list):
+    card_entries = {}
+    for card_entry in card_list:
+        card_entries.setdefault(get_card_key(card_entry[CARD_NAME_KEY]), card_entry)
+    return card_entries
+
+
+"""
+For each desired deck, we determine how many of the user's Owned Cards overlap with the deck
+and aggregate all such cards into a multi-level dictionary for eventual reporting/price analysis.
+The final report is of the format:
+    [{'Eldrazi Tron', {'Shared Value': 2.87, 'Shared Cards': '1/72', 'Card List': [{'Card Name': 'Scalding Tarn', 'Card Quantity': '1'}, ...]}}, ...]
+
+:param desired_decks_list: A list of Deck objects representing the decks in desired_decks.txt
+:param owned_cards_list: The list of Owned Cards as parsed from owned_cards.txt
+:param evaluation_cache: An optional EvaluationCache to re-use the results of decks that aren't affected by collection changes
+"""
+def evaluate_owned_cards(desired_decks_list, owned_cards_list, evaluation_cache=None):
+    progress_bar = new_progress_bar("   Evaluating", len(desired_decks_list))
+    owned_cards_by_key = build_card_entry_index(owned_cards_list)
+    affected_deck_ids = evaluation_cache.find_affected_deck_ids(desired_decks_list) if evaluation_cache is not None else None
+    owned_overlap_report = {}
+
+    for desired_deck in desired_decks_list:
+        owned_overlap_report[desired_deck.get_deck_name()] = get_cached_deck_evaluation(
+            evaluation_cache, REPORT_SECTION_OWNED_CARDS, desired_deck, affected_deck_ids,
+            lambda: evaluate_owned_cards_for_deck(desired_deck, owned_cards_by_key))
+        progress_bar.next()
+
+    progress_bar.finish()
+
+    return owned_overlap_report
+
+
+"""
+Build the Owned Cards report entry for a single desired deck
+
+:param desired_deck: The Deck to evaluate
+:param owned_cards_by_key: The owned cards, indexed with build_card_entry_index
+"""
+def evaluate_owned_cards_for_deck(desired_deck, owned_cards_by_key):
+    owned_cards_that_overlap = []
+    number_of_owned_cards_that_are_in_desired_deck = 0
+    value_reduced_by_owned_cards = 0.0
+
+    for desired_card_entry in desired_deck.get_deck_list():
+        owned_card_entry = owned_cards_by_key.get(get_card_key(desired_card_entry[CARD_NAME_KEY]))
+        if owned_card_entry is None:
+            continue
+
+        owned_quantity = min(desired_card_entry[CARD_QTY_KEY], owned_card_entry[CARD_QTY_KEY])
+        number_of_owned_cards_that_are_in_desired_deck += owned_quantity
+        value_reduced_by_owned_cards += float(owned_quantity) * desired_card_entry[CARD_PRICE_KEY]
+        owned_cards_that_overlap.append({CARD_NAME_KEY: desired_card_entry[CARD_NAME_KEY], CARD_QTY_KEY: owned_quantity, CARD_PRICE_KEY: float(
+            owned_quantity) * desired_card_entry[CARD_PRICE_KEY]})
+
+    # If we actually own some cards in this desired_deck, return the report. If not, we set the NO_OWNED_OVERLAP_FLAG so that our final report printing can know
+    if value_reduced_by_owned_cards > 0:
+        return {OWNED_CARDS_KEY: "%d/%d" % (number_of_owned_cards_that_are_in_desired_deck, desired_deck.get_deck_size(
+        )), SAVED_VALUE_KEY: value_reduced_by_owned_cards, CARD_LIST_KEY: owned_cards_that_overlap}
+    return {SAVED_VALUE_KEY: NO_OWNED_OVERLAP_FLAG}
+
+
+"""
+For each metagame deck in the desired format, we determine how much monetary overlap we currently possess for it,
+and return back a sorted list of the Meta decks, together with which cards and what value we overlap
+
+:param metagame_decks: A list of Deck objects representing all of the Metagame decks on MTGGoldfish.com
+:param owned_cards: A list of dicts containing card info of the format: {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+:param evaluation_cache: An optional EvaluationCache to re-use the results of decks that aren't affected by collection changes
+"""
+def evaluate_metagame_decks(metagame_decks, owned_cards, evaluation_cache=None):
+    progress_bar = new_progress_bar("   Evaluating", len(metagame_decks))
+    affected_deck_ids = evaluation_cache.find_affected_deck_ids(metagame_decks) if evaluation_cache is not None else None
+    metagame_deck_recommendation_report = {}
+
+    for meta_deck in metagame_decks:
+
+        # Only save the report if we actually own some cards in this Metagame deck
+        meta_deck_report = get_cached_deck_evaluation(
+            evaluation_cache, REPORT_SECTION_METAGAME, meta_deck, affected_deck_ids,
+            lambda: evaluate_metagame_deck(meta_deck, owned_cards))
+        if meta_deck_report is not None:
+            metagame_deck_recommendation_report[meta_deck.get_deck_name()] = meta_deck_report
+        progress_bar.next()
+
+    progress_bar.finish()
+
+    return sort_metagame_deck_recommendation_report(metagame_deck_recommendation_report)
+
+
+"""
+Build the Metagame Recommendation report entry for a single Metagame deck, or return None if we don't own any of its cards.
+The specific cards are listed in the order they appear in the owned cards.
+
+:param meta_deck: The Deck to evaluate
+:param owned_cards: A list of dicts containing card info of the format: {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+:param meta_cards_by_key: The Metagame deck's list indexed with build_card_entry_index, if it was already built
+"""
+def evaluate_metagame_deck(meta_deck, owned_cards, meta_cards_by_key=None):
+    if meta_cards_by_key is None:
+        meta_cards_by_key = build_card_entry_index(meta_deck.get_deck_list())
+    specific_cards_owned_in_meta_deck = []
+    number_of_owned_cards_that_are_in_meta_deck = 0
+    value_of_meta_deck_owned = 0.0
+
+    for owned_card_entry in owned_cards:
+        meta_card_entry = meta_cards_by_key.get(get_card_key(owned_card_entry[CARD_NAME_KEY]))
+        if meta_card_entry is None:
+            continue
+
+        owned_quantity = min(owned_card_entry[CARD_QTY_KEY], meta_card_entry[CARD_QTY_KEY])
+        number_of_owned_cards_that_are_in_meta_deck += owned_quantity
+        value_of_meta_deck_owned += float(owned_quantity) * meta_card_entry[CARD_PRICE_KEY]
+        specific_cards_owned_in_meta_deck.append({CARD_NAME_KEY: owned_card_entry[CARD_NAME_KEY], CARD_QTY_KEY: owned_quantity, CARD_PRICE_KEY: float(
+            owned_quantity) * meta_card_entry[CARD_PRICE_KEY]})
+
+    if value_of_meta_deck_owned <= 0:
+        return None
+    return {OWNED_CARDS_KEY: "%d/%d" % (number_of_owned_cards_that_are_in_meta_deck, meta_deck.get_deck_size(
+    )), SAVED_VALUE_KEY: value_of_meta_deck_owned, CARD_LIST_KEY: specific_cards_owned_in_meta_deck, DECK_PRICE_KEY: meta_deck.get_deck_price()}
+
+
+"""
+Sort the Metagame Recommendation entries by value descending, and keep only the top 15
+
+:param metagame_deck_recommendation_report: A dict of Metagame deck name -> report entry from evaluate_metagame_deck
+"""
+def sort_metagame_deck_recommendation_report(metagame_deck_recommendation_report):
+    metagame_decks_sorted_by_desc_value_saved_as_list = sorted(six.iteritems(
+        metagame_deck_recommendation_report), key=lambda kv: kv[1][SAVED_VALUE_KEY], reverse=True)
+    return metagame_decks_sorted_by_desc_value_saved_as_list[:15]
+
+
+"""
+For each desired deck, we process each budget deck to determine how many cards from each budget deck
+are present in the given desired deck. We then store them into a large multi-level dictionary for
+eventual reporting
+
+:param evaluation_cache: An optional EvaluationCache to re-use the results of deck pairs that aren't affected by collection changes
+"""
+def evaluate_budget_decks(owned_cards, desired_decks_list, budget_decks_list, evaluation_cache=None):
+    progress_bar = new_progress_bar("   Evaluating", len(desired_decks_list) * len(budget_decks_list))
+    owned_cards_by_key = build_card_entry_index(owned_cards)
+    budget_report = {}
+
+    # The Budget report of a pair of decks only depends on the owned cards through the cards of the Budget deck
+    if evaluation_cache is not None:
+        affected_budget_deck_ids = evaluation_cache.find_affected_deck_ids(budget_decks_list)
+        budget_deck_hashes = [get_deck_hash(budget_deck) for budget_deck in budget_decks_list]
+
+    for desired_deck in desired_decks_list:
+        desired_deck_card_keys = [get_card_key(desired_card_entry[CARD_NAME_KEY]) for desired_card_entry in desired_deck.get_deck_list()]
+        budget_report[desired_deck.get_deck_name()] = {}
+        if evaluation_cache is not None:
+            desired_deck_id = get_deck_id_from_url(desired_deck.get_deck_url())
+            desired_deck_hash = get_deck_hash(desired_deck)
+
+        for (budget_deck_position, budget_deck) in enumerate(budget_decks_list):
+
+            # Only bother reporting budget decks that actually overlap
+            evaluate = lambda: evaluate_budget_deck(desired_deck, desired_deck_card_keys, budget_deck, owned_cards_by_key)
+            if evaluation_cache is None:
+                budget_deck_report = evaluate()
+            else:
+                budget_deck_id = get_deck_id_from_url(budget_deck.get_deck_url())
+                budget_deck_report = evaluation_cache.get_result(
+                    REPORT_SECTION_BUDGET, (desired_deck_id, budget_deck_id), (desired_deck_hash, budget_deck_hashes[budget_deck_position]),
+                    affected_budget_deck_ids is None or budget_deck_id in affected_budget_deck_ids, evaluate)
+            if budget_deck_report is not None:
+                budget_report[desired_deck.get_deck_name()][budget_deck.get_deck_name()] = budget_deck_report
+
+            progress_bar.next()
+
+        # Sort entries by value for this particular desired_deck now that all of the budget decks have been processed
+        budget_report[desired_deck.get_deck_name()] = sort_budget_deck_report(budget_report[desired_deck.get_deck_name()])
+
+    progress_bar.finish()
+
+    return budget_report
+
+
+"""
+Sort the Budget report entries of a single desired deck by shared value descending, and keep only the top 5
+
+:param budget_deck_report: A dict of Budget deck name -> report entry from evaluate_budget_deck
+"""
+def sort_budget_deck_report(budget_deck_report):
+    budget_decks_sorted_by_desc_value_as_list = sorted(six.iteritems(
+        budget_deck_report), key=lambda kv: kv[1][SHARED_VALUE_KEY], reverse=True)
+    return budget_decks_sorted_by_desc_value_as_list[:5]
+
+
+"""
+Build the Budget report entry comparing a single Budget deck against a single desired deck, or return None if they share no value
+
+:param desired_deck: The desired Deck
+:param desired_deck_card_keys: The card keys of the desired deck's list, in order
+:param budget_deck: The Budget Deck to compare against it
+:param owned_cards_by_key: The owned cards, indexed with build_card_entry_index
+"""
+def evaluate_budget_deck(desired_deck, desired_deck_card_keys, budget_deck, owned_cards_by_key):
+    budget_deck_overlap = find_budget_deck_overlap(desired_deck, desired_deck_card_keys, budget_deck, build_card_position_index(budget_deck.get_deck_list()))
+    if budget_deck_overlap is None:
+        return None
+    return evaluate_budget_deck_owned_cards(budget_deck, budget_deck_overlap, owned_cards_by_key)
+
+
+"""
+Index a deck list by card key, returning a dict of card key -> the position of the first card record for that card
+
+:param deck_list: The deck list of a Deck
+"""
+def build_card_position_index(deck_list):
+    card_positions = {}
+    for (card_position, card_entry) in enumerate(deck_list):
+        card_positions.setdefault(get_card_key(card_entry[CARD_NAME_KEY]), card_position)
+    return card_positions
+
+
+"""
+Compare a Budget deck against a desired deck, which doesn't depend on the owned cards at all. Returns a tuple of
+(number of shared cards, value shared between the decks), or None if the decks share no value.
+
+:param desired_deck: The desired Deck
+:param desired_deck_card_keys: The card keys of the desired deck's list, in order
+:param budget_deck: The Budget Deck to compare against it
+:param budget_card_positions: The Budget deck's list, indexed with build_card_position_index
+"""
+def find_budget_deck_overlap(desired_deck, desired_deck_card_keys, budget_deck, budget_card_positions):
+    budget_deck_list = budget_deck.get_deck_list()
+    number_of_cards_from_budget_deck_that_are_in_desired_deck = 0
+    value_shared_between_decks = 0.0
+    for desired_card_entry, desired_card_key in zip(desired_deck.get_deck_list(), desired_deck_card_keys):
+        budget_card_position = budget_card_positions.get(desired_card_key)
+        if budget_card_position is None:
+            continue
+
+        budget_card_entry = budget_deck_list[budget_card_position]
+        shared_quantity = min(desired_card_entry[CARD_QTY_KEY], budget_card_entry[CARD_QTY_KEY])
+        number_of_cards_from_budget_deck_that_are_in_desired_deck += shared_quantity
+        value_shared_between_decks += float(shared_quantity) * budget_card_entry[CARD_PRICE_KEY]
+
+    if value_shared_between_decks <= 0:
+        return None
+    return (number_of_cards_from_budget_deck_that_are_in_desired_deck, value_shared_between_decks)
+
+
+"""
+Build the Budget report entry for a pair of decks that share value, by checking which cards of the Budget deck we own
+
+:param budget_deck: The Budget Deck
+:param budget_deck_overlap: The tuple returned by find_budget_deck_overlap for the pair
+:param owned_cards_by_key: The owned cards, indexed with build_card_entry_index
+"""
+def evaluate_budget_deck_owned_cards(budget_deck, budget_deck_overlap, owned_cards_by_key):
+    (number_of_cards_from_budget_deck_that_are_in_desired_deck, value_shared_between_decks) = budget_deck_overlap
+
+    # Check to see which cards of the Budget deck we own for our Owned Cards mini-report
+    number_of_owned_cards_that_are_in_budget_deck = 0
+    value_of_budget_deck_owned = 0.0
+    specific_owned_cards_in_budget_deck = []
+    owned_card_keys_already_listed = set()
+    for budget_card_entry in budget_deck.get_deck_list():
+        budget_card_key = get_card_key(budget_card_entry[CARD_NAME_KEY])
+        owned_card_entry = owned_cards_by_key.get(budget_card_key)
+        if owned_card_entry is None or budget_card_key in owned_card_keys_already_listed:
+            continue
+
+        owned_card_keys_already_listed.add(budget_card_key)
+        owned_quantity = min(owned_card_entry[CARD_QTY_KEY], budget_card_entry[CARD_QTY_KEY])
+        number_of_owned_cards_that_are_in_budget_deck += owned_quantity
+        value_of_budget_deck_owned += float(owned_quantity) * budget_card_entry[CARD_PRICE_KEY]
+        specific_owned_cards_in_budget_deck.append({CARD_NAME_KEY: owned_card_entry[CARD_NAME_KEY], CARD_QTY_KEY: owned_quantity, CARD_PRICE_KEY: float(
+            owned_quantity) * budget_card_entry[CARD_PRICE_KEY]})
+
+    return {DECK_PRICE_KEY: budget_deck.get_deck_price(), SHARED_CARDS_KEY: "%d/%d" % (number_of_cards_from_budget_deck_that_are_in_desired_deck, budget_deck.get_deck_size(
+    )), SHARED_VALUE_KEY: value_shared_between_decks, OWNED_CARDS_KEY: "%d/%d" % (number_of_owned_cards_that_are_in_budget_deck, budget_deck.get_deck_size()), SAVED_VALUE_KEY: value_of_budget_deck_owned, CARD_LIST_KEY: specific_owned_cards_in_budget_deck}
+
+
+"""
+Scores any number of collections against the same desired, Metagame and Budget decks in a single pass over the decks.
+Everything that only depends on the decks is indexed once up front: the card keys of every desired deck, the card
+index of every Metagame deck, and which Budget decks share value with which desired decks (the most expensive part of
+the Budget analysis). The indexes only the Cheapest Completion Path and What To Buy Next analyses use are built the
+first time one of them runs. Each deck is then visited once and scored against every collection, and each evaluate_* and
+rank_* method returns one report per collection, in the same format as the matching function.
+
+:param desired_decks_list: A list of Deck objects representing the decks in desired_decks.txt
+:param metagame_decks: A list of Deck objects representing all of the Metagame decks on MTGGoldfish.com
+:param budget_decks_list: A list of Deck objects representing all of the Budget decks on MTGGoldfish.com
+"""
+class CollectionBatchEvaluator(object):
+    def __init__(self, desired_decks_list, metagame_decks, budget_decks_list):
+        self.desired_decks_list = desired_decks_list
+        self.metagame_decks = metagame_decks
+        self.budget_decks_list = budget_decks_list
+        self.metagame_cards_by_key = [build_card_entry_index(meta_deck.get_deck_list()) for meta_deck in metagame_decks]
+
+        # Only the pairs of decks that share any value are kept, as a list of (Budget deck, overlap) per desired deck
+        self.budget_deck_overlaps = []
+        budget_card_positions = [build_card_position_index(budget_deck.get_deck_list()) for budget_deck in budget_decks_list]
+        for desired_deck in desired_decks_list:
+            desired_deck_card_keys = [get_card_key(desired_card_entry[CARD_NAME_KEY]) for desired_card_entry in desired_deck.get_deck_list()]
+            desired_deck_overlaps = []
+            for (budget_deck, budget_deck_card_positions) in zip(budget_decks_list, budget_card_positions):
+                budget_deck_overlap = find_budget_deck_overlap(desired_deck, desired_deck_card_keys, budget_deck, budget_deck_card_positions)
+                if budget_deck_overlap is not None:
+                    desired_deck_overlaps.append((budget_deck, budget_deck_overlap))
+            self.budget_deck_overlaps.append(desired_deck_overlaps)
+
+        self.desired_deck_card_indexes = None
+        self.buy_path_budget_deck_index = None
+        self.metagame_card_to_decks_index = None
+
+    """
+    Return one Owned Cards report per collection, see evaluate_owned_cards
+
+    :param owned_cards_lists: A list of owned card lists, one per collection
+    """
+    def evaluate_owned_cards(self, owned_cards_lists):
+        progress_bar = new_progress_bar("   Evaluating", len(self.desired_decks_list))
+        owned_cards_indexes = [build_card_entry_index(owned_cards) for owned_cards in owned_cards_lists]
+        owned_overlap_reports = [{} for owned_cards in owned_cards_lists]
+
+        for desired_deck in self.desired_decks_list:
+            for (owned_cards_by_key, owned_overlap_report) in zip(owned_cards_indexes, owned_overlap_reports):
+                owned_overlap_report[desired_deck.get_deck_name()] = evaluate_owned_cards_for_deck(desired_deck, owned_cards_by_key)
+            progress_bar.next()
+
+        progress_bar.finish()
+
+        return owned_overlap_reports
+
+    """
+    Return one Metagame Recommendation report per collection, see evaluate_metagame_decks
+
+    :param owned_cards_lists: A list of owned card lists, one per collection
+    """
+    def evaluate_metagame_decks(self, owned_cards_lists):
+        progress_bar = new_progress_bar("   Evaluating", len(self.metagame_decks))
+        metagame_deck_recommendation_reports = [{} for owned_cards in owned_cards_lists]
+
+        for (meta_deck, meta_cards_by_key) in zip(self.metagame_decks, self.metagame_cards_by_key):
+            for (owned_cards, metagame_deck_recommendation_report) in zip(owned_cards_lists, metagame_deck_recommendation_reports):
+
+                # Only save the report if we actually own some cards in this Metagame deck
+                meta_deck_report = evaluate_metagame_deck(meta_deck, owned_cards, meta_cards_by_key)
+                if meta_deck_report is not None:
+                    metagame_deck_recommendation_report[meta_deck.get_deck_name()] = meta_deck_report
+            progress_bar.next()
+
+        progress_bar.finish()
+
+        return [sort_metagame_deck_recommendation_report(metagame_deck_recommendation_report)
+                for metagame_deck_recommendation_report in metagame_deck_recommendation_reports]
+
+    """
+    Return one Budget report per collection, see evaluate_budget_decks. Pairs of decks that share no value were already
+    ruled out when the evaluator was built, so only the owned cards of the remaining Budget decks are checked.
+
+    :param owned_cards_lists: A list of owned card lists, one per collection
+    """
+    def evaluate_budget_decks(self, owned_cards_lists):
+        progress_bar = new_progress_bar("   Evaluating", len(self.desired_decks_list))
+        owned_cards_indexes = [build_card_entry_index(owned_cards) for owned_cards in owned_cards_lists]
+        budget_reports = [{} for owned_cards in owned_cards_lists]
+
+        for (desired_deck, desired_deck_overlaps) in zip(self.desired_decks_list, self.budget_deck_overlaps):
+            for (owned_cards_by_key, budget_report) in zip(owned_cards_indexes, budget_reports):
+                budget_deck_report = {}
+                for (budget_deck, budget_deck_overlap) in desired_deck_overlaps:
+                    budget_deck_report[budget_deck.get_deck_name()] = evaluate_budget_deck_owned_cards(budget_deck, budget_deck_overlap, owned_cards_by_key)
+                budget_report[desired_deck.get_deck_name()] = sort_budget_deck_report(budget_deck_report)
+            progress_bar.next()
+
+        progress_bar.finish()
+
+        return budget_reports
+
+    """
+    Return one Cheapest Completion Path report per collection, see evaluate_cheapest_completion_paths
+
+    :param owned_cards_lists: A list of owned card lists, one per collection
+    :param max_steps: The maximum number of Budget decks to buy on the way to each desired deck
+    """
+    def evaluate_cheapest_completion_paths(self, owned_cards_lists, max_steps=BUY_PATH_MAX_STEPS):
+        if self.buy_path_budget_deck_index is None:
+            self.desired_deck_card_indexes = [build_deck_card_index(desired_deck) for desired_deck in self.desired_decks_list]
+            self.buy_path_budget_deck_index = build_buy_path_budget_deck_index(self.budget_decks_list)
+
+        progress_bar = new_progress_bar("   Evaluating", len(self.desired_decks_list))
+        owned_card_quantity_indexes = [build_card_quantity_index(owned_cards) for owned_cards in owned_cards_lists]
+        buy_path_reports = [{} for owned_cards in owned_cards_lists]
+
+        for (desired_deck, desired_deck_cards) in zip(self.desired_decks_list, self.desired_deck_card_indexes):
+            for (owned_card_quantities, buy_path_report) in zip(owned_card_quantity_indexes, buy_path_reports):
+                buy_path_report[desired_deck.get_deck_name()] = plan_buy_path(desired_deck_cards, owned_card_quantities, self.budget_decks_list,
+                                                                              self.buy_path_budget_deck_index, max_steps)
+            progress_bar.next()
+
+        progress_bar.finish()
+
+        return buy_path_reports
+
+    """
+    Return one What To Buy Next ranking per collection, see rank_cards_to_buy_next
+
+    :param owned_cards_lists: A list of owned card lists, one per collection
+    :param meta_shares: A dict of DeckID -> Metagame share, as filled in by parse_deck_urls_from_category_landing_page
+    :param num_results: How many cards to return per collection
+    """
+    def rank_cards_to_buy_next(self, owned_cards_lists, meta_shares, num_results=BUY_NEXT_CARD_COUNT):
+        if self.metagame_card_to_decks_index is None:
+            self.metagame_card_to_decks_index = build_card_to_decks_index(self.metagame_decks)
+        deck_weights = get_metagame_deck_weights(self.metagame_decks, meta_shares)
+        return [rank_cards_by_weighted_value(self.metagame_card_to_decks_index, deck_weights, owned_cards, num_results)
+                for owned_cards in owned_cards_lists]
+
+
+"""
+Index a list of card records by card key, returning a dict of card key -> total quantity.
+Cards listed more than once (e.g. in both the main deck and the sideboard) have their quantities added together.
+
+:param card_list: A list of card records using CARD_QTY_KEY and CARD_NAME_KEY, such as the owned cards
+"""
+def build_card_quantity_index(card_list):
+    card_quantities = {}
+    for card_entry in card_list:
+        card_key = get_card_key(card_entry[CARD_NAME_KEY])
+        card_quantities[card_key] = card_quantities.get(card_key, 0) + card_entry[CARD_QTY_KEY]
+    return card_quantities
+
+
+"""
+Index the deck list of a Deck by card key, returning a dict of card key -> (quantity, individual card price)
+"""
+def build_deck_card_index(deck):
+    deck_cards = {}
+    for card_entry in deck.get_deck_list():
+        card_key = get_card_key(card_entry[CARD_NAME_KEY])
+        (card_quantity, card_price) = deck_cards.get(card_key, (0, card_entry[CARD_PRICE_KEY]))
+        deck_cards[card_key] = (card_quantity + card_entry[CARD_QTY_KEY], card_price)
+    return deck_cards
+
+
+"""
+Return a tuple of (Step Cost, Step Value) for buying a Budget deck, given the cards currently in hand.
+See evaluate_cheapest_completion_paths.
+"""
+def get_buy_path_step(budget_deck_cards, desired_deck_cards, card_quantities_in_hand):
+    step_cost = 0.0
+    step_value = 0.0
+    for (card_key, (budget_quantity, budget_price)) in six.iteritems(budget_deck_cards):
+        quantity_in_hand = card_quantities_in_hand.get(card_key, 0)
+        if budget_quantity <= quantity_in_hand:
+            continue
+        step_cost += float(budget_quantity - quantity_in_hand) * budget_price
+        if card_key in desired_deck_cards:
+            (desired_quantity, desired_price) = desired_deck_cards[card_key]
+            step_value += float(min(desired_quantity, budget_quantity) - min(desired_quantity, quantity_in_hand)) * desired_price
+    return (step_cost, step_value)
+
+
+"""
+Index the Budget decks for planning buy paths, returning a tuple of (the card index of each Budget deck, see
+build_deck_card_index, and a dict of card key -> positions of the Budget decks that play it)
+
+:param budget_decks_list: A list of Deck objects representing all of the Budget decks on MTGGoldfish.com
+"""
+def build_buy_path_budget_deck_index(budget_decks_list):
+    budget_deck_card_indexes = [build_deck_card_index(budget_deck) for budget_deck in budget_decks_list]
+    card_to_budget_decks = {}
+    for (budget_position, budget_deck_cards) in enumerate(budget_deck_card_indexes):
+        for card_key in budget_deck_cards:
+            card_to_budget_decks.setdefault(card_key, []).append(budget_position)
+    return (budget_deck_card_indexes, card_to_budget_decks)
+
+
+"""
+For each desired deck, plan the order in which to buy Budget decks on the way to building it so that the least money is
+spent on cards the desired deck doesn't use. At each step, every remaining Budget deck is scored by:
+    Step Cost:   what it costs to complete that Budget deck now, given the owned cards and the Budget decks already bought
+    Step Value:  how much that purchase reduces the remaining cost of the desired deck
+    Extra Spend: Step Cost - Step Value, i.e. the money that doesn't go towards the desired deck
+The Budget deck with the lowest Extra Spend (ties broken by the highest Step Value) is bought next. The path ends after
+max_steps purchases, or once no Budget deck reduces the remaining cost of the desired deck. The total spend along a path
+is the Direct Cost plus the Extra Spend of every step, so a path only costs less in total than buying the desired deck
+directly when a Budget deck lists the cards they share for less. Minimizing Extra Spend at each step is minimizing that
+total, one purchase at a time.
+
+Only the Budget decks sharing a card with the desired deck are scored at all, and after each purchase only the ones
+sharing a card whose quantity in hand went up are scored again, using a card -> Budget decks inverted index.
+The report is of the format:
+    {'Grixis Death's Shadow': {'Direct Cost': 812.50, 'Buy Path': [{'Step': 1, 'Deck Name': 'Mono-Black Aggro', 'Step Cost': 45.2, ...}, ...]}, ...}
+
+:param owned_cards: A list of dicts containing card info of the format: {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+:param desired_decks_list: A list of Deck objects representing the decks in desired_decks.txt
+:param budget_decks_list: A list of Deck objects representing all of the Budget decks on MTGGoldfish.com
+:param max_steps: The maximum number of Budget decks to buy on the way to each desired deck
+"""
+def evaluate_cheapest_completion_paths(owned_cards, desired_decks_list, budget_decks_list, max_steps=BUY_PATH_MAX_STEPS):
+    progress_bar = new_progress_bar("   Evaluating", len(desired_decks_list))
+    owned_card_quantities = build_card_quantity_index(owned_cards)
+    budget_deck_index = build_buy_path_budget_deck_index(budget_decks_list)
+    buy_path_report = {}
+
+    for desired_deck in desired_decks_list:
+        buy_path_report[desired_deck.get_deck_name()] = plan_buy_path(build_deck_card_index(desired_deck), owned_card_quantities,
+                                                                      budget_decks_list, budget_deck_index, max_steps)
+        progress_bar.next()
+
+    progress_bar.finish()
+
+    return buy_path_report
+
+
+"""
+Plan the buy path to a single desired deck, returning its entry of the report described in evaluate_cheapest_completion_paths
+
+:param desired_deck_cards: The desired deck, indexed with build_deck_card_index
+:param owned_card_quantities: The owned cards, indexed with build_card_quantity_index
+:param budget_decks_list: A list of Deck objects representing all of the Budget decks on MTGGoldfish.com
+:param budget_deck_index: The Budget decks, indexed with build_buy_path_budget_deck_index
+:param max_steps: The maximum number of Budget decks to buy on the way to the desired deck
+"""
+def plan_buy_path(desired_deck_cards, owned_card_quantities, budget_decks_list, budget_deck_index, max_steps):
+    (budget_deck_card_indexes, card_to_budget_decks) = budget_deck_index
+    card_quantities_in_hand = dict(owned_card_quantities)
+
+    remaining_cost = sum(float(max(0, desired_quantity - card_quantities_in_hand.get(card_key, 0))) * desired_price
+                         for (card_key, (desired_quantity, desired_price)) in six.iteritems(desired_deck_cards))
+    direct_cost = remaining_cost
+    total_spend = 0.0
+    buy_path = []
+
+    # Buying cards only ever lowers the Step Value of the other Budget decks, so a deck that can't reduce the remaining
+    # cost of the desired deck now never will, and the candidates are the decks sharing a card it still needs
+    candidate_positions = set()
+    for (card_key, (desired_quantity, desired_price)) in six.iteritems(desired_deck_cards):
+        if desired_quantity > card_quantities_in_hand.get(card_key, 0):
+            candidate_positions.update(card_to_budget_decks.get(card_key, []))
+    candidate_steps = {}
+    affected_positions = candidate_positions
+
+    while len(buy_path) < max_steps and remaining_cost > 0:
+        for budget_position in affected_positions:
+            (step_cost, step_value) = get_buy_path_step(budget_deck_card_indexes[budget_position], desired_deck_cards, card_quantities_in_hand)
+            if step_value <= 0:
+                candidate_steps.pop(budget_position, None)
+            else:
+                candidate_steps[budget_position] = (step_cost, step_value)
+
+        best_candidate = None
+        for (budget_position, (step_cost, step_value)) in six.iteritems(candidate_steps):
+            candidate_score = (step_cost - step_value, -step_value, budget_position)
+            if best_candidate is None or candidate_score < best_candidate:
+                best_candidate = candidate_score
+        if best_candidate is None:
+            break
+
+        budget_position = best_candidate[2]
+        (step_cost, step_value) = candidate_steps.pop(budget_position)
+        budget_deck = budget_decks_list[budget_position]
+
+        # Only the Budget decks sharing a card whose quantity in hand went up need to be scored again
+        affected_positions = set()
+        for (card_key, (budget_quantity, budget_price)) in six.iteritems(budget_deck_card_indexes[budget_position]):
+            if budget_quantity > card_quantities_in_hand.get(card_key, 0):
+                card_quantities_in_hand[card_key] = budget_quantity
+                affected_positions.update(card_to_budget_decks[card_key])
+        affected_positions.intersection_update(candidate_steps)
+
+        remaining_cost -= step_value
+        total_spend += step_cost
+        buy_path.append({STEP_KEY: len(buy_path) + 1, DECK_NAME_KEY: budget_deck.get_deck_name(), DECK_PRICE_KEY: budget_deck.get_deck_price(),
+                         STEP_COST_KEY: step_cost, STEP_VALUE_KEY: step_value, EXTRA_SPEND_KEY: step_cost - step_value,
+                         REMAINING_COST_KEY: remaining_cost, TOTAL_SPEND_KEY: total_spend + remaining_cost})
+
+    return {DIRECT_COST_KEY: direct_cost, BUY_PATH_KEY: buy_path}
+
+
+"""
+Build an inverted index of card key -> [(Deck, card record), ...] over every deck that plays the card
+
+:param decks_list: A list of Deck objects
+"""
+def build_card_to_decks_index(decks_list):
+    card_to_decks = {}
+    for deck in decks_list:
+        for card_entry in deck.get_deck_list():
+            card_to_decks.setdefault(get_card_key(card_entry[CARD_NAME_KEY]), []).append((deck, card_entry))
+    return card_to_decks
+
+
+"""
+Return a dict of DeckID -> weight for each Metagame deck, using its share of the Metagame. Decks whose share is unknown
+are given the average of the known shares, and if no shares are known at all every deck is weighted equally.
+
+:param metagame_decks: A list of Deck objects representing all of the Metagame decks on MTGGoldfish.com
+:param meta_shares: A dict of DeckID -> Metagame share, as filled in by parse_deck_urls_from_category_landing_page
+"""
+def get_metagame_deck_weights(metagame_decks, meta_shares):
+    deck_ids = [get_deck_id_from_url(meta_deck.get_deck_url()) for meta_deck in metagame_decks]
+    known_shares = [meta_shares[deck_id] for deck_id in deck_ids if deck_id in meta_shares]
+    default_weight = 1.0 / max(1, len(deck_ids))
+    if len(known_shares) > 0:
+        default_weight = sum(known_shares) / len(known_shares)
+    return dict((deck_id, meta_shares.get(deck_id, default_weight)) for deck_id in deck_ids)
+
+
+"""
+Rank individual cards by how much buying them would reduce the remaining cost of the whole Metagame at once. For every card,
+the cost of the copies still missing from each Metagame deck is weighted by that deck's share of the Metagame and summed up,
+so the "Weighted Value" of a card is how much it would take off the remaining cost of an average Metagame deck. All cards are
+ranked in a single pass over a card -> decks inverted index. The report is a list of tuples sorted descending by weighted value:
+    [('Thoughtseize', {'Weighted Value': 9.21, 'Copies Needed': 2, 'Decks Using': 11, 'Individual Card Price': 15.99}), ...]
+
+:param metagame_decks: A list of Deck objects representing all of the Metagame decks on MTGGoldfish.com
+:param owned_cards: A list of dicts containing card info of the format: {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+:param meta_shares: A dict of DeckID -> Metagame share, as filled in by parse_deck_urls_from_category_landing_page
+:param num_results: How many cards to return
+"""
+def rank_cards_to_buy_next(metagame_decks, owned_cards, meta_shares, num_results=BUY_NEXT_CARD_COUNT):
+    return rank_cards_by_weighted_value(build_card_to_decks_index(metagame_decks), get_metagame_deck_weights(metagame_decks, meta_shares),
+                                        owned_cards, num_results)
+
+
+"""
+Rank cards for rank_cards_to_buy_next, given the Metagame decks indexed with build_card_to_decks_index and weighted with
+get_metagame_deck_weights
+"""
+def rank_cards_by_weighted_value(card_to_decks_index, deck_weights, owned_cards, num_results):
+    owned_card_quantities = build_card_quantity_index(owned_cards)
+    card_rankings = []
+
+    for (card_key, card_postings) in six.iteritems(card_to_decks_index):
+        owned_quantity = owned_card_quantities.get(card_key, 0)
+        weighted_value = 0.0
+        copies_needed = 0
+        decks_using = 0
+        card_price_total = 0.0
+        for (meta_deck, card_entry) in card_postings:
+            missing_quantity = card_entry[CARD_QTY_KEY] - owned_quantity
+            if missing_quantity <= 0:
+                continue
+            weighted_value += deck_weights[get_deck_id_from_url(meta_deck.get_deck_url())] * missing_quantity * card_entry[CARD_PRICE_KEY]
+            copies_needed = max(copies_needed, missing_quantity)
+            decks_using += 1
+            card_price_total += card_entry[CARD_PRICE_KEY]
+
+        if weighted_value > 0:
+            card_rankings.append((card_postings[0][1][CARD_NAME_KEY], {WEIGHTED_VALUE_KEY: weighted_value, COPIES_NEEDED_KEY: copies_needed,
+                                                                      DECKS_USING_KEY: decks_using, CARD_PRICE_KEY: card_price_total / decks_using}))
+
+    card_rankings.sort(key=lambda card_ranking: card_ranking[1][WEIGHTED_VALUE_KEY], reverse=True)
+    return card_rankings[:num_results]
+
+
+"""
+Searches for the largest set of decks that can all be completed within a spend limit, counting every card bought once
+for every deck that plays it. Completing a set of decks means holding, for each card, as many copies as the deck of the
+set that plays the most of them, so the cost of a set is the price of the copies of each card that are missing from the
+owned cards up to that quantity. Each card is priced at the cheapest price any of the candidate decks lists it for.
+
+A greedy pass first buys whichever deck is cheapest to complete next, given the cards already bought, until nothing else
+fits. Only the decks sharing a card with the deck just bought have their cost recomputed, found through an inverted
+card -> decks index. A branch-and-bound search then looks for a plan completing more decks, or the same number for less.
+Its bound is each deck's exclusive cost: the price of the copies it needs beyond what any other candidate deck plays,
+which it has to pay for no matter which other decks are bought alongside it. The search stops after max_search_nodes
+nodes, in which case the best plan found so far is returned.
+
+:param candidate_decks: A list of Deck objects to choose from, such as the desired and Metagame decks
+"""
+class DeckCompletionPlanner(object):
+    def __init__(self, candidate_decks):
+        self.candidate_decks = []
+        self.candidate_deck_cards = []
+        self.card_prices = {}
+        candidate_deck_ids = set()
+        for deck in candidate_decks:
+            deck_id = get_deck_id_from_url(deck.get_deck_url())
+            if deck_id in candidate_deck_ids:
+                continue
+            candidate_deck_ids.add(deck_id)
+
+            deck_cards = build_deck_card_index(deck)
+            self.candidate_decks.append(deck)
+            self.candidate_deck_cards.append(deck_cards)
+            for (card_key, (card_quantity, card_price)) in six.iteritems(deck_cards):
+                self.card_prices[card_key] = min(self.card_prices.get(card_key, card_price), card_price)
+
+    """
+    Return the plan for the given owned cards, as a dict of the format:
+        {'Spend Limit': 200.0, 'Total Spend': 187.2, 'Candidate Decks': 45, 'Optimal': True,
+         'Completed Decks': [{'Step': 1, 'Deck Name': 'Burn', 'Deck Price': 250.0, 'Step Cost': 50.0, 'Total Spend': 50.0, 'Card List': [...]}, ...]}
+    'Optimal' is False if the search was cut short, in which case a plan completing more decks may exist.
+
+    :param owned_cards: A list of dicts containing card info of the format: {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+    :param spend_limit: The most that may be spent on cards, in the price unit of the decks
+    :param max_search_nodes: How many nodes the branch-and-bound search may visit
+    """
+    def plan(self, owned_cards, spend_limit, max_search_nodes=SPEND_PLAN_MAX_SEARCH_NODES):
+        owned_card_quantities = build_card_quantity_index(owned_cards)
+
+        # Only the cards a deck is missing matter, and decks that can't be completed on their own are never candidates
+        self.missing_cards = []
+        self.card_to_decks = {}
+        self.card_quantities_in_hand = {}
+        deck_costs = []
+        for deck_cards in self.candidate_deck_cards:
+            missing_cards = {}
+            for (card_key, (card_quantity, card_price)) in six.iteritems(deck_cards):
+                if card_quantity > owned_card_quantities.get(card_key, 0):
+                    missing_cards[card_key] = card_quantity
+                    self.card_quantities_in_hand[card_key] = owned_card_quantities.get(card_key, 0)
+            self.missing_cards.append(missing_cards)
+            deck_costs.append(self.get_completion_cost(len(deck_costs)))
+
+        candidate_positions = [deck_position for (deck_position, deck_cost) in enumerate(deck_costs) if deck_cost <= spend_limit]
+        for deck_position in candidate_positions:
+            for (card_key, card_quantity) in six.iteritems(self.missing_cards[deck_position]):
+                self.card_to_decks.setdefault(card_key, []).append((deck_position, card_quantity))
+
+        (best_positions, best_spend) = self.plan_greedily(candidate_positions, deck_costs, spend_limit)
+        (best_positions, best_spend, plan_is_optimal) = self.search(candidate_positions, deck_costs, spend_limit, best_positions, best_spend, max_search_nodes)
+
+        return {SPEND_LIMIT_KEY: spend_limit, TOTAL_SPEND_KEY: best_spend, CANDIDATE_DECK_COUNT_KEY: len(self.candidate_decks),
+                PLAN_IS_OPTIMAL_KEY: plan_is_optimal, COMPLETED_DECKS_KEY: self.build_plan_steps(best_positions)}
+
+    """
+    Return what it costs to complete a deck, given the cards currently in hand
+    """
+    def get_completion_cost(self, deck_position):
+        completion_cost = 0.0
+        for (card_key, card_quantity) in six.iteritems(self.missing_cards[deck_position]):
+            quantity_in_hand = self.card_quantities_in_hand[card_key]
+            if card_quantity > quantity_in_hand:
+                completion_cost += float(card_quantity - quantity_in_hand) * self.card_prices[card_key]
+        return completion_cost
+
+    """
+    Buy every card a deck is still missing. Returns the list of (card key, quantity in hand before) needed to undo it
+    """
+    def buy_deck(self, deck_position):
+        purchases = []
+        for (card_key, card_quantity) in six.iteritems(self.missing_cards[deck_position]):
+            quantity_in_hand = self.card_quantities_in_hand[card_key]
+            if card_quantity > quantity_in_hand:
+                purchases.append((card_key, quantity_in_hand))
+                self.card_quantities_in_hand[card_key] = card_quantity
+        return purchases
+
+    """
+    Undo the purchases returned by buy_deck
+    """
+    def return_purchases(self, purchases):
+        for (card_key, quantity_in_hand) in purchases:
+            self.card_quantities_in_hand[card_key] = quantity_in_hand
+
+    """
+    Repeatedly buy the deck that is cheapest to complete next, until no deck fits in what is left of the spend limit.
+    Returns a tuple of (positions of the decks bought, total spend), with every purchase undone again.
+    """
+    def plan_greedily(self, candidate_positions, deck_costs, spend_limit):
+        current_costs = dict((deck_position, deck_costs[deck_position]) for deck_position in candidate_positions)
+        cost_heap = [(deck_cost, deck_position) for (deck_position, deck_cost) in six.iteritems(current_costs)]
+        heapq.heapify(cost_heap)
+        bought_positions = []
+        all_purchases = []
+        total_spend = 0.0
+        while len(cost_heap) > 0:
+            (deck_cost, deck_position) = heapq.heappop(cost_heap)
+
+            # Entries are left in the heap when a deck gets cheaper, so only the one matching its current cost counts
+            if deck_position not in current_costs or current_costs[deck_position] != deck_cost:
+                continue
+            if total_spend + deck_cost > spend_limit:
+                break
+
+            del current_costs[deck_position]
+            purchases = self.buy_deck(deck_position)
+            all_purchases.extend(reversed(purchases))
+            bought_positions.append(deck_position)
+            total_spend += deck_cost
+
+            # Only decks sharing one of the cards just bought got any cheaper
+            affected_positions = set()
+            for (card_key, quantity_in_hand) in purchases:
+                for (affected_position, card_quantity) in self.card_to_decks[card_key]:
+                    if affected_position in current_costs:
+                        affected_positions.add(affected_position)
+            for affected_position in affected_positions:
+                current_costs[affected_position] = self.get_completion_cost(affected_position)
+                heapq.heappush(cost_heap, (current_costs[affected_position], affected_position))
+
+        self.return_purchases(reversed(all_purchases))
+        return (bought_positions, total_spend)
+
+    """
+    Return the exclusive cost of each candidate deck, as a dict of deck position -> cost. See the class description.
+    """
+    def get_exclusive_costs(self, candidate_positions):
+        exclusive_costs = dict((deck_position, 0.0) for deck_position in candidate_positions)
+        for (card_key, card_postings) in six.iteritems(self.card_to_decks):
+            card_quantities = sorted([card_quantity for (deck_position, card_quantity) in card_postings], reverse=True)
+            runner_up_quantity = self.card_quantities_in_hand[card_key]
+            if len(card_quantities) > 1:
+                runner_up_quantity = max(runner_up_quantity, card_quantities[1])
+            for (deck_position, card_quantity) in card_postings:
+                if card_quantity == card_quantities[0] and card_quantity > runner_up_quantity:
+                    exclusive_costs[deck_position] += float(card_quantity - runner_up_quantity) * self.card_prices[card_key]
+        return exclusive_costs
+
+    """
+    Branch-and-bound over the candidate decks, cheapest first, trying to buy each deck before trying to skip it. Returns
+    a tuple of (positions of the decks bought, total spend, True if the search finished within max_search_nodes).
+    The search is depth-first over an explicit stack rather than recursive, as it is one level deep per candidate deck.
+    """
+    def search(self, candidate_positions, deck_costs, spend_limit, best_positions, best_spend, max_search_nodes):
+        search_order = sorted(candidate_positions, key=lambda deck_position: deck_costs[deck_position])
+        exclusive_costs = self.get_exclusive_costs(candidate_positions)
+        bound_order = sorted(range(len(search_order)), key=lambda search_index: exclusive_costs[search_order[search_index]])
+        best_positions = list(best_positions)
+        num_nodes = 0
+        bought_positions = []
+
+        # Each entry is either a node to visit, as (search index, total spend, None), or the purchases of the deck bought on
+        # the way to the nodes above it, as (None, None, purchases), which are returned once those nodes are done
+        search_stack = [(0, 0.0, None)]
+        while len(search_stack) > 0:
+            (search_index, total_spend, purchases) = search_stack.pop()
+            if purchases is not None:
+                bought_positions.pop()
+                self.return_purchases(purchases)
+                continue
+
+            # Past the node budget, the purchases on the stack are still returned but no more nodes are visited
+            num_nodes += 1
+            if num_nodes > max_search_nodes:
+                continue
+
+            if len(bought_positions) > len(best_positions) or (len(bought_positions) == len(best_positions) and total_spend < best_spend):
+                best_positions = list(bought_positions)
+                best_spend = total_spend
+
+            # At most this many more decks fit, as each one costs at least its exclusive cost
+            num_decks_that_fit = 0
+            spend_bound = total_spend
+            for bound_index in bound_order:
+                if bound_index < search_index:
+                    continue
+                exclusive_cost = exclusive_costs[search_order[bound_index]]
+                if spend_bound + exclusive_cost > spend_limit:
+                    break
+                spend_bound += exclusive_cost
+                num_decks_that_fit += 1
+            num_decks_bound = len(bought_positions) + num_decks_that_fit
+            if num_decks_bound < len(best_positions) or (num_decks_bound == len(best_positions) and spend_bound >= best_spend):
+                continue
+            if search_index == len(search_order):
+                continue
+
+            # Skipping the deck is searched after everything below buying it, so it goes onto the stack first
+            search_stack.append((search_index + 1, total_spend, None))
+            deck_position = search_order[search_index]
+            deck_cost = self.get_completion_cost(deck_position)
+            if total_spend + deck_cost <= spend_limit:
+                bought_positions.append(deck_position)
+                search_stack.append((None, None, self.buy_deck(deck_position)))
+                search_stack.append((search_index + 1, total_spend + deck_cost, None))
+
+        return (best_positions, best_spend, num_nodes <= max_search_nodes)
+
+    """
+    Order the decks of a plan the way they would be bought, cheapest to complete next first, and list what each one costs
+    and which cards it needs at that point
+    """
+    def build_plan_steps(self, plan_positions):
+        plan_steps = []
+        all_purchases = []
+        total_spend = 0.0
+        remaining_positions = list(plan_positions)
+        while len(remaining_positions) > 0:
+            deck_position = min(remaining_positions, key=lambda remaining_position: self.get_completion_cost(remaining_position))
+            remaining_positions.remove(deck_position)
+            step_cost = self.get_completion_cost(deck_position)
+            total_spend += step_cost
+
+            deck = self.candidate_decks[deck_position]
+            card_names = dict((get_card_key(card_entry[CARD_NAME_KEY]), card_entry[CARD_NAME_KEY]) for card_entry in deck.get_deck_list())
+            purchases = self.buy_deck(deck_position)
+            all_purchases.extend(reversed(purchases))
+            card_list = [{CARD_NAME_KEY: card_names[card_key], CARD_QTY_KEY: self.card_quantities_in_hand[card_key] - quantity_in_hand,
+                          CARD_PRICE_KEY: float(self.card_quantities_in_hand[card_key] - quantity_in_hand) * self.card_prices[card_key]}
+                         for (card_key, quantity_in_hand) in purchases]
+            card_list.sort(key=lambda card_entry: card_entry[CARD_PRICE_KEY], reverse=True)
+            plan_steps.append({STEP_KEY: len(plan_steps) + 1, DECK_NAME_KEY: deck.get_deck_name(), DECK_PRICE_KEY: deck.get_deck_price(),
+                               STEP_COST_KEY: step_cost, TOTAL_SPEND_KEY: total_spend, CARD_LIST_KEY: card_list})
+
+        self.return_purchases(reversed(all_purchases))
+        return plan_steps
+
+
+"""
+An index over the card vectors of a set of decks that answers "which decks are closest to this one" queries using
+sparse cosine similarity. Each deck is a vector of card key -> weight, where the weight is either the quantity of the
+card or the total price of those copies. An inverted card key -> {deck key: weight} index means a query only touches
+the decks that share at least one card with it, instead of comparing every pair of decks. Decks can be added,
+replaced and removed one at a time as they are fetched.
+
+:param weighting: SIMILARITY_WEIGHT_BY_QUANTITY or SIMILARITY_WEIGHT_BY_PRICE
+"""
+class DeckSimilarityIndex(object):
+    def __init__(self, weighting=SIMILARITY_WEIGHT_BY_QUANTITY):
+        self.weighting = weighting
+        self.decks = {}
+        self.deck_vectors = {}
+        self.deck_norms = {}
+        self.card_postings = {}
+
+    """
+    Return the key a deck is stored under. Decks are keyed by their MTGGoldfish DeckID, so a re-fetched deck replaces its old entry
+    """
+    def get_deck_key(self, deck):
+        return get_deck_id_from_url(deck.get_deck_url())
+
+    """
+    Build the sparse card key -> weight vector for a deck
+    """
+    def build_deck_vector(self, deck):
+        deck_vector = {}
+        for card_entry in deck.get_deck_list():
+            card_weight = float(card_entry[CARD_QTY_KEY])
+            if self.weighting == SIMILARITY_WEIGHT_BY_PRICE:
+                card_weight *= card_entry[CARD_PRICE_KEY]
+            card_key = get_card_key(card_entry[CARD_NAME_KEY])
+            deck_vector[card_key] = deck_vector.get(card_key, 0.0) + card_weight
+        return deck_vector
+
+    """
+    Add a deck to the index, replacing any deck with the same DeckID
+    """
+    def add_deck(self, deck):
+        deck_key = self.get_deck_key(deck)
+        self.remove_deck(deck_key)
+
+        deck_vector = self.build_deck_vector(deck)
+        self.decks[deck_key] = deck
+        self.deck_vectors[deck_key] = deck_vector
+        self.deck_norms[deck_key] = sum(card_weight * card_weight for card_weight in six.itervalues(deck_vector)) ** 0.5
+        for (card_key, card_weight) in six.iteritems(deck_vector):
+            self.card_postings.setdefault(card_key, {})[deck_key] = card_weight
+
+    """
+    Remove a deck from the index, if it is present
+    """
+    def remove_deck(self, deck_key):
+        deck_vector = self.deck_vectors.pop(deck_key, None)
+        if deck_vector is None:
+            return
+
+        for card_key in deck_vector:
+            card_posting = self.card_postings[card_key]
+            del card_posting[deck_key]
+            if len(card_posting) == 0:
+                del self.card_postings[card_key]
+        del self.decks[deck_key]
+        del self.deck_norms[deck_key]
+
+    """
+    Bring the index in line with a new list of decks, only touching the decks that were added, re-fetched or dropped
+    """
+    def sync_decks(self, decks_list):
+        deck_keys_to_keep = set()
+        for deck in decks_list:
+            deck_key = self.get_deck_key(deck)
+            deck_keys_to_keep.add(deck_key)
+            indexed_deck = self.decks.get(deck_key)
+            if indexed_deck is None or get_deck_hash(indexed_deck) != get_deck_hash(deck):
+                self.add_deck(deck)
+
+        for deck_key in [deck_key for deck_key in self.decks if deck_key not in deck_keys_to_keep]:
+            self.remove_deck(deck_key)
+
+    def get_deck_count(self):
+        return len(self.decks)
+
+    """
+    Return the num_results decks in the index that are closest to the given deck, as a list of (Deck, similarity) tuples
+    sorted by descending similarity. The deck itself is never returned, even if it is part of the index.
+
+    :param deck: Any Deck, whether or not it is part of the index
+    :param num_results: The maximum number of decks to return
+    :param min_similarity: Decks with a cosine similarity below this are not returned
+    """
+    def find_similar_decks(self, deck, num_results=5, min_similarity=0.0):
+        query_vector = self.build_deck_vector(deck)
+        query_norm = sum(card_weight * card_weight for card_weight in six.itervalues(query_vector)) ** 0.5
+        if query_norm == 0:
+            return []
+
+        dot_products = {}
+        for (card_key, query_weight) in six.iteritems(query_vector):
+            for (deck_key, card_weight) in six.iteritems(self.card_postings.get(card_key, {})):
+                dot_products[deck_key] = dot_products.get(deck_key, 0.0) + query_weight * card_weight
+
+        query_deck_key = self.get_deck_key(deck)
+        similar_decks = []
+        for (deck_key, dot_product) in six.iteritems(dot_products):
+            if deck_key == query_deck_key or self.deck_norms[deck_key] == 0:
+                continue
+            similarity = dot_product / (query_norm * self.deck_norms[deck_key])
+            if similarity >= min_similarity:
+                similar_decks.append((self.decks[deck_key], similarity))
+
+        similar_decks.sort(key=lambda deck_and_similarity: deck_and_similarity[1], reverse=True)
+        return similar_decks[:num_results]
+
+    """
+    Group the decks in the index into clusters of near-duplicate lists, where every deck in a cluster is connected to another
+    through a similarity of at least min_similarity. Only clusters of two or more decks are returned, largest first.
+    """
+    def find_deck_clusters(self, min_similarity=SIMILAR_DECK_CLUSTER_THRESHOLD):
+        cluster_parents = dict((deck_key, deck_key) for deck_key in self.decks)
+
+        def find_cluster_root(deck_key):
+            while cluster_parents[deck_key] != deck_key:
+                cluster_parents[deck_key] = cluster_parents[cluster_parents[deck_key]]
+                deck_key = cluster_parents[deck_key]
+            return deck_key
+
+        for (deck_key, deck) in six.iteritems(self.decks):
+            for (similar_deck, similarity) in self.find_similar_decks(deck, len(self.decks), min_similarity):
+                cluster_parents[find_cluster_root(self.get_deck_key(similar_deck))] = find_cluster_root(deck_key)
+
+        clusters = {}
+        for deck_key in self.decks:
+            clusters.setdefault(find_cluster_root(deck_key), []).append(self.decks[deck_key])
+
+        return sorted([cluster for cluster in six.itervalues(clusters) if len(cluster) > 1], key=len, reverse=True)
+
+
+"""
+For each desired deck, find the Metagame decks whose lists are closest to it. The report is of the format:
+    {'Grixis Death's Shadow': [('Grixis Shadow', 0.93), ('Jund', 0.41), ...], ...}
+
+:param desired_decks_list: A list of Deck objects representing the decks in desired_decks.txt
+:param similarity_index: A DeckSimilarityIndex over the Metagame decks
+:param num_results: How many Metagame decks to list for each desired deck
+"""
+def evaluate_similar_decks(desired_decks_list, similarity_index, num_results=5):
+    similar_decks_report = {}
+    for desired_deck in desired_decks_list:
+        similar_decks_report[desired_deck.get_deck_name()] = [(similar_deck.get_deck_name(), similarity) for (similar_deck, similarity)
+                                                               in similarity_index.find_similar_decks(desired_deck, num_results)]
+    return similar_decks_report
+
+
+"""
+A structured report that every renderer works from. Each section holds one list of entries per evaluation:
+    REPORT_SECTION_OWNED_CARDS: [{'Deck Name': ..., 'Deck Price': ..., 'Owned Cards': '4/73', 'Saved Value': ..., 'Remaining Cost': ..., 'Card List': [...]}, ...]
+    REPORT_SECTION_METAGAME:    [{'Rank': 1, 'Deck Name': ..., 'Deck Price': ..., 'Owned Cards': ..., 'Saved Value': ..., 'Remaining Cost': ..., 'Card List': [...]}, ...]
+    REPORT_SECTION_BUDGET:      [{'Deck Name': ..., 'Deck Price': ..., 'Budget Decks': [{'Rank': 1, 'Deck Name': ..., 'Shared Cards': ..., ...}]}, ...]
+An Owned Cards entry without any overlap has no 'Owned Cards' key, and its 'Saved Value' is NO_OWNED_OVERLAP_FLAG
+"""
+class Report(object):
+    def __init__(self, use_online_price):
+        self.use_online_price = use_online_price
+        self.sections = []
 
-        desired_deck_URLs.append(line)
+    def add_section(self, section_type, entries):
+        self.sections.append((section_type, entries))
 
-    desired_cards_file.close()
+    def get_sections(self):
+        return self.sections
 
-    return desired_deck_URLs
+    """
+    Format a price the way every report does, either as "$12.34" or as "12.34 tix"
+    """
+    def format_price(self, price, price_format="%.2f"):
+        if self.use_online_price:
+            return (price_format + " tix") % (price)
+        return ("$" + price_format) % (price)
 
 
 """
-Given the desired deck URLs, parse all of the decks into Deck objects
+Convert the card records of an evaluation report into the card records of the Report model
+"""
+def build_report_card_list(card_list):
+    return [{CARD_QTY_KEY: card_entry[CARD_QTY_KEY], CARD_NAME_KEY: make_report_json_safe(card_entry[CARD_NAME_KEY]), CARD_PRICE_KEY: card_entry[CARD_PRICE_KEY]}
+            for card_entry in card_list]
+
 
-:param update_cache: If set to True, we will ignore any cached versions of these decks
-:param deck_URLs_list: The list of deck URLs
 """
-def parse_decks_from_list_of_urls(update_cache, deck_URLs_list, use_online_price):
-    progress_bar = IncrementalBar("   Fetching Deck Data", max=len(deck_URLs_list), suffix='%(percent)d%%')
-    deck_objs_list = []
-    num_cached_decks = 0
-    num_old_cached_decks = 0
+Add the Owned Cards section to the report, showing how the cards that you own line up with the Metagame
+decks you specified desired_decks.txt
 
-    if update_cache:
-        print("   Manual cache update requested, updating all local deck caches.")
+:param report: The Report to add the section to
+:param desired_decks_by_name: A dict of lowercased deck name -> Deck for the decks in desired_decks.txt
+:param owned_cards_overlap_report: The report returned by evaluate_owned_cards
+"""
+def add_owned_cards_report_section(report, desired_decks_by_name, owned_cards_overlap_report):
+    entries = []
+    for desired_deck_name_key in owned_cards_overlap_report:
+        desired_deck_total_cost = 0.0
+        desired_deck_obj = desired_decks_by_name.get(desired_deck_name_key.lower())
+        if desired_deck_obj is not None:
+            desired_deck_total_cost = desired_deck_obj.get_deck_price()
+
+        # The owned_cards_overlap_report is of the format:
+        # {'Saved Value': 265.96, 'Card List': [{'Card Name': u'Scalding Tarn', 'Card Quantity': 4}], 'Owned Cards': '4/73'}
+        specific_owned_cards_report = owned_cards_overlap_report[desired_deck_name_key]
+        entry = {DECK_NAME_KEY: make_report_json_safe(desired_deck_name_key), DECK_PRICE_KEY: desired_deck_total_cost,
+                 SAVED_VALUE_KEY: specific_owned_cards_report[SAVED_VALUE_KEY]}
+        if specific_owned_cards_report[SAVED_VALUE_KEY] != NO_OWNED_OVERLAP_FLAG:
+            entry[OWNED_CARDS_KEY] = specific_owned_cards_report[OWNED_CARDS_KEY]
+            entry[REMAINING_COST_KEY] = desired_deck_total_cost - specific_owned_cards_report[SAVED_VALUE_KEY]
+            entry[CARD_LIST_KEY] = build_report_card_list(specific_owned_cards_report[CARD_LIST_KEY])
+        entries.append(entry)
+
+    report.add_section(REPORT_SECTION_OWNED_CARDS, entries)
 
-    for deck_url in deck_URLs_list:
-        deck = Deck()
 
-        # The URL format is either "https://www.mtggoldfish.com/deck/784979#paper" for a Budget deck
-        # or "https://www.mtggoldfish.com/archetype/modern-grixis-death-s-shadow#paper" for a Modern Meta deck
-        # So we fetch the Deck ID from the last '/' to the '#'
-        deck_id = deck_url[deck_url.rfind('/') + 1:].split("#")[0]
+"""
+Add the section for the Metagame decks that you share the most value with to the report
 
-        # Check whether or not a cached version of this deck exists locally, and use that instead
-        if not update_cache and is_deck_cached(deck_id):
-            num_cached_decks += 1
-            if cached_deck_is_old(deck_id):
-                num_old_cached_decks += 1
+:param report: The Report to add the section to
+:param metagame_deck_recommendation_report: A list of tuples containing (<deck_name>, <report_summary_for_this_deck>) pairs,
+                                            sorted descending based on the 'Saved Value' key in the <Report_summary_for_this_deck>
+"""
+def add_metagame_deck_recommendation_report_section(report, metagame_deck_recommendation_report):
+    entries = []
 
-            # Load the deck from the cache
-            deck_objs_list.append(load_deck_from_cache(deck_id))
+    # The sort method turns the dictionary into a list of a tuple like this: [('Affinity', {'Saved Value': 62.87, 'Owned Cards': '3/72', 'Deck Price': 1032.95, 'Specific Cards': [{}]}), ...]
+    for (rank, deck_summary_entry) in enumerate(metagame_deck_recommendation_report):
+        entries.append({RANK_KEY: rank + 1, DECK_NAME_KEY: make_report_json_safe(deck_summary_entry[0]), DECK_PRICE_KEY: deck_summary_entry[1][DECK_PRICE_KEY],
+                        OWNED_CARDS_KEY: deck_summary_entry[1][OWNED_CARDS_KEY], SAVED_VALUE_KEY: deck_summary_entry[1][SAVED_VALUE_KEY],
+                        REMAINING_COST_KEY: deck_summary_entry[1][DECK_PRICE_KEY] - deck_summary_entry[1][SAVED_VALUE_KEY],
+                        CARD_LIST_KEY: build_report_card_list(deck_summary_entry[1][CARD_LIST_KEY])})
 
-            progress_bar.next()
-            continue
+    report.add_section(REPORT_SECTION_METAGAME, entries)
 
-        driver = webdriver.Firefox()
-        try:
-            driver.get(deck_url)
-        except:
-            print("   [ERROR]: Failed to navigate to \"%s\"" % (deck_url))
-            print("   Check your internet connection. Also note that sometimes MTGGoldfish.com experiences issues, try navigating to this URL yourself and see if it works. Try running the script again.")
-            driver.close()
-            sys.exit(0)
 
-        deck.deck_url = deck_url
-        raw_deck_name_parse = driver.find_element_by_class_name(
-            "deck-view-title").get_attribute('textContent').replace('\n', '')
+"""
+Add the Budget deck section to the report, listing the closest Budget decks for each desired deck
 
-        # The formatting of the name field is different on the meta page vs the budget pages. On the budget pages it is followed with
-        # "by <author>" while on the meta pages it is followed by "Suggest a Better Name"
-        if raw_deck_name_parse.find('by ') > 0:
-            deck.deck_name = raw_deck_name_parse[:raw_deck_name_parse.find(
-                'by ')].encode('ascii')
-        else:
-            deck.deck_name = raw_deck_name_parse[:-
-                                                 len("Suggest a Better Name")].encode('ascii')
-
-        deck_date_as_string = driver.find_element_by_class_name(
-            "deck-view-description").get_attribute('textContent').replace('\n', '')[-len("MMM DD, YYYY"):]
-        deck.deck_date = datetime.strptime(deck_date_as_string, '%b %d, %Y')
-
-        # Iterate over all of the rows in the deck list and build the deck object
-        deck_list = []
-        deck_total_cost = 0.0
-        price_tab_element_tag = 'tab-paper'
-        if use_online_price:
-            price_tab_element_tag = 'tab-online'
-        rows_element = driver.find_element_by_id(price_tab_element_tag).find_element_by_class_name(
-            'deck-view-decklist').find_element_by_class_name('deck-view-decklist-inner')
-        rows_element = rows_element.find_element_by_class_name(
-            "deck-view-deck-table").find_element_by_tag_name("tbody").find_elements_by_tag_name("tr")
-        for row in rows_element:
-            columns = row.find_elements_by_tag_name("td")
-
-            # Disregard any of the section title rows such as "Creatures", "Planeswalkers", etc
-            if len(columns) == 4:
-                card_name = columns[NAME_INDEX].get_attribute(
-                    'textContent').replace('\n', '')
-
-                # We don't care about Basic Mana in any analysis.
-                if card_name.lower() in ["mountain", "swamp", "plains", "island", "forest"]:
-                    continue
+:param report: The Report to add the section to
+:param desired_decks_by_name: A dict of lowercased deck name -> Deck for the decks in desired_decks.txt
+:param budget_deck_report: The report returned by evaluate_budget_decks
+"""
+def add_budget_evaluation_report_section(report, desired_decks_by_name, budget_deck_report):
+    entries = []
+    for desired_deck_name_key in budget_deck_report:
+        desired_deck_total_cost = 0.0
+        desired_deck_obj = desired_decks_by_name.get(desired_deck_name_key.lower())
+        if desired_deck_obj is not None:
+            desired_deck_total_cost = desired_deck_obj.get_deck_price()
+
+        # The sort method turns the dictionary into a list of a tuple like this: [('Rogues', {'Shared Value': 2.87, 'Shared Cards': '1/72', 'Deck Price': 32.95}), ...]
+        budget_deck_entries = []
+        for (rank, budget_deck_list_record) in enumerate(budget_deck_report[desired_deck_name_key]):
+            budget_deck_entry = {RANK_KEY: rank + 1, DECK_NAME_KEY: make_report_json_safe(budget_deck_list_record[0]),
+                                 DECK_PRICE_KEY: budget_deck_list_record[1][DECK_PRICE_KEY], SHARED_CARDS_KEY: budget_deck_list_record[1][SHARED_CARDS_KEY],
+                                 SHARED_VALUE_KEY: budget_deck_list_record[1][SHARED_VALUE_KEY], SAVED_VALUE_KEY: budget_deck_list_record[1][SAVED_VALUE_KEY]}
+            if budget_deck_list_record[1][SAVED_VALUE_KEY] != 0:
+                budget_deck_entry[OWNED_CARDS_KEY] = budget_deck_list_record[1][OWNED_CARDS_KEY]
+                budget_deck_entry[REMAINING_COST_KEY] = budget_deck_list_record[1][DECK_PRICE_KEY] - budget_deck_list_record[1][SAVED_VALUE_KEY]
+                budget_deck_entry[CARD_LIST_KEY] = build_report_card_list(budget_deck_list_record[1][CARD_LIST_KEY])
+            budget_deck_entries.append(budget_deck_entry)
+
+        entries.append({DECK_NAME_KEY: make_report_json_safe(desired_deck_name_key), DECK_PRICE_KEY: desired_deck_total_cost,
+                        BUDGET_DECKS_KEY: budget_deck_entries})
+
+    report.add_section(REPORT_SECTION_BUDGET, entries)
 
-                card_quantity_string = columns[QTY_INDEX].get_attribute(
-                    'textContent').replace('\n', '')
-                card_price_string = columns[PRICE_INDEX].get_attribute(
-                    'textContent').replace('\n', '')
-                if card_quantity_string == '':
-                    card_quantity_string = '1'
-                if card_price_string == '':
-                    card_price_string = '0'
-                card_quantity = int(card_quantity_string)
-                individual_card_price = float(
-                    card_price_string.replace(',', '')) / float(card_quantity)
-                deck_total_cost += float(card_price_string.replace(',', ''))
-
-                # It's possible for a card to appear in the list twice if it is present in both the main deck and the sideboard.
-                # If this happens, we need to just update the Quantity and Price of the existing record
-                record_already_exist = False
-                for entry in deck_list:
-                    if entry[CARD_NAME_KEY] == card_name:
-                        record_already_exist = True
-                        entry[CARD_QTY_KEY] += card_quantity
-                if not record_already_exist:
-                    deck_list.append(
-                        {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name, CARD_PRICE_KEY: individual_card_price})
-
-        deck.deck_list = deck_list
-        deck.deck_price = deck_total_cost
-        deck_objs_list.append(deck)
-
-        # Cache the deck
-        save_deck_to_cache(deck, deck_id)
-
-        driver.close()
 
-        progress_bar.next()
+"""
+Add the section listing the Metagame decks closest to each desired deck to the report
 
-    progress_bar.finish()
+:param report: The Report to add the section to
+:param similar_decks_report: The report returned by evaluate_similar_decks
+"""
+def add_similar_decks_report_section(report, similar_decks_report):
+    entries = []
+    for desired_deck_name_key in similar_decks_report:
+        similar_deck_entries = [{RANK_KEY: rank + 1, DECK_NAME_KEY: make_report_json_safe(similar_deck_name), SIMILARITY_KEY: similarity}
+                                for (rank, (similar_deck_name, similarity)) in enumerate(similar_decks_report[desired_deck_name_key])]
+        entries.append({DECK_NAME_KEY: make_report_json_safe(desired_deck_name_key), SIMILAR_DECKS_KEY: similar_deck_entries})
 
-    # Print number of cached decks used
-    print("   Finished fetching deck data. %s of %s decks were fetched from the cache." % (
-        num_cached_decks, len(deck_URLs_list)))
+    report.add_section(REPORT_SECTION_SIMILAR_DECKS, entries)
 
-    # Print number of stale decks and recommend updating
-    if num_old_cached_decks > 0:
-        print("   [WARNING]: %s  of %s cached decks in this fetch were created more than 30 days ago."
-              " Prices may have changed significantly since then."
-              " You should run \"python mtggoldfish.py -u\" to update your cached decks." % (num_old_cached_decks, len(deck_URLs_list)))
-    return deck_objs_list
 
+"""
+Add the section listing the clusters of near-duplicate Metagame decks to the report
 
+:param report: The Report to add the section to
+:param deck_clusters: The list of Deck clusters returned by DeckSimilarityIndex.find_deck_clusters
 """
-Given the URL for a category landing page on MTGGoldfish.com (such as "https://www.mtggoldfish.com/decks/budget/modern#paper"),
-parse all of the URLs for the various decks on that page. It uses the #paper or #online queryparam to determine which URL to load
-for each deck
+def add_deck_clusters_report_section(report, deck_clusters):
+    entries = []
+    for (cluster_index, deck_cluster) in enumerate(deck_clusters):
+        entries.append({CLUSTER_KEY: cluster_index + 1, CLUSTER_DECKS_KEY: [{DECK_NAME_KEY: make_report_json_safe(deck.get_deck_name()), DECK_PRICE_KEY: deck.get_deck_price()}
+                                                                           for deck in deck_cluster]})
+
+    report.add_section(REPORT_SECTION_DECK_CLUSTERS, entries)
+
 
-:param category_landing_page_url: The URL of the category landing page that contains a list of various decks
 """
-def parse_deck_urls_from_category_landing_page(category_landing_page_url):
-    print("   Opening a browser real quick to snapshot deck URLs from MTGGoldfish.com, as there might be new decks that we need to fetch data for.")
-    driver = webdriver.Firefox()
-    driver.get(category_landing_page_url)
+Add the section listing the cheapest order to buy Budget decks in on the way to each desired deck to the report
 
-    deck_URL_container_element_tag = "deck-price-paper"
-    if "#online" in category_landing_page_url.lower():
-        deck_URL_container_element_tag = "deck-price-online"
+:param report: The Report to add the section to
+:param desired_decks_by_name: A dict of lowercased deck name -> Deck for the decks in desired_decks.txt
+:param buy_path_report: The report returned by evaluate_cheapest_completion_paths
+"""
+def add_cheapest_completion_path_report_section(report, desired_decks_by_name, buy_path_report):
+    entries = []
+    for desired_deck_name_key in buy_path_report:
+        desired_deck_total_cost = 0.0
+        desired_deck_obj = desired_decks_by_name.get(desired_deck_name_key.lower())
+        if desired_deck_obj is not None:
+            desired_deck_total_cost = desired_deck_obj.get_deck_price()
 
-    budget_deck_url_list = []
-    try:
-        deck_tiles = driver.find_elements_by_class_name("archetype-tile")
-        for tile in deck_tiles:
-            deck_description_container = tile.find_element_by_class_name("archetype-tile-description-wrapper").find_element_by_class_name(
-                "archetype-tile-description").find_element_by_class_name(deck_URL_container_element_tag)
-            deck_url = deck_description_container.find_element_by_tag_name(
-                'a').get_attribute("href")
+        buy_path_entries = []
+        for buy_path_step in buy_path_report[desired_deck_name_key][BUY_PATH_KEY]:
+            buy_path_entry = dict(buy_path_step)
+            buy_path_entry[DECK_NAME_KEY] = make_report_json_safe(buy_path_step[DECK_NAME_KEY])
+            buy_path_entries.append(buy_path_entry)
 
-            # For some reason, the #paper landing page contains URLS for the #online
-            budget_deck_url_list.append(deck_url)
-    except:
-        driver.close()
-        return budget_deck_url_list
+        entries.append({DECK_NAME_KEY: make_report_json_safe(desired_deck_name_key), DECK_PRICE_KEY: desired_deck_total_cost,
+                        DIRECT_COST_KEY: buy_path_report[desired_deck_name_key][DIRECT_COST_KEY], BUY_PATH_KEY: buy_path_entries})
 
-    driver.close()
-    return budget_deck_url_list
+    report.add_section(REPORT_SECTION_BUY_PATH, entries)
 
 
 """
-For each desired deck, we determine how many of the user's Owned Cards overlap with the deck
-and aggregate all such cards into a multi-level dictionary for eventual reporting/price analysis.
-The final report is of the format:
-    [{'Eldrazi Tron', {'Shared Value': 2.87, 'Shared Cards': '1/72', 'Card List': [{'Card Name': 'Scalding Tarn', 'Card Quantity': '1'}, ...]}}, ...]
+Add the section ranking the cards that would reduce the remaining cost of the Metagame the most to the report
 
-:param desired_decks_list: A list of Deck objects representing the decks in desired_decks.txt
-:param owned_cards_list: The list of Owned Cards as parsed from owned_cards.txt
+:param report: The Report to add the section to
+:param card_rankings: The list of (card name, ranking) tuples returned by rank_cards_to_buy_next
 """
-def evaluate_owned_cards(desired_decks_list, owned_cards_list):
-    progress_bar = IncrementalBar("   Evaluating", max=len(desired_decks_list) * len(owned_cards_list), suffix='%(percent)d%%')
-    owned_overlap_report = {}
+def add_buy_next_report_section(report, card_rankings):
+    entries = []
+    for (rank, (card_name, card_ranking)) in enumerate(card_rankings):
+        entry = dict(card_ranking)
+        entry[RANK_KEY] = rank + 1
+        entry[CARD_NAME_KEY] = make_report_json_safe(card_name)
+        entries.append(entry)
 
-    for desired_deck in desired_decks_list:
-        owned_cards_that_overlap = []
+    report.add_section(REPORT_SECTION_BUY_NEXT, entries)
 
-        number_of_owned_cards_that_are_in_desired_deck = 0
-        value_reduced_by_owned_cards = 0.0
-        for desired_card_entry in desired_deck.get_deck_list():
-            desired_card_name = desired_card_entry[CARD_NAME_KEY]
 
-            for owned_card_entry in owned_cards_list:
-                progress_bar.next()
-                if owned_card_entry[CARD_NAME_KEY].lower() == desired_card_name.lower():
-                    if desired_card_entry[CARD_QTY_KEY] >= owned_card_entry[CARD_QTY_KEY]:
-                        number_of_owned_cards_that_are_in_desired_deck += owned_card_entry[CARD_QTY_KEY]
-                        value_reduced_by_owned_cards += float(
-                            owned_card_entry[CARD_QTY_KEY] * desired_card_entry[CARD_PRICE_KEY])
-                        owned_cards_that_overlap.append({CARD_NAME_KEY: desired_card_name, CARD_QTY_KEY: owned_card_entry[CARD_QTY_KEY], CARD_PRICE_KEY: float(
-                            owned_card_entry[CARD_QTY_KEY] * desired_card_entry[CARD_PRICE_KEY])})
-                    else:
-                        number_of_owned_cards_that_are_in_desired_deck += desired_card_entry[CARD_QTY_KEY]
-                        value_reduced_by_owned_cards += float(
-                            desired_card_entry[CARD_QTY_KEY]) * desired_card_entry[CARD_PRICE_KEY]
-                        owned_cards_that_overlap.append({CARD_NAME_KEY: desired_card_name, CARD_QTY_KEY: desired_card_entry[CARD_QTY_KEY], CARD_PRICE_KEY: float(
-                            desired_card_entry[CARD_QTY_KEY]) * desired_card_entry[CARD_PRICE_KEY]})
-                    break
+"""
+Add the section listing the decks that can be completed within the spend limit to the report
 
-        # If we actually own some cards in this desired_deck, save the report. If not, we set the NO_OWNED_OVERLAP_FLAG so that our final report printing can know
-        owned_overlap_report[desired_deck.get_deck_name()] = {}
-        if value_reduced_by_owned_cards > 0:
-            owned_overlap_report[desired_deck.get_deck_name()] = {OWNED_CARDS_KEY: "%d/%d" % (number_of_owned_cards_that_are_in_desired_deck, desired_deck.get_deck_size(
-            )), SAVED_VALUE_KEY: value_reduced_by_owned_cards, CARD_LIST_KEY: owned_cards_that_overlap}
-        else:
-            owned_overlap_report[desired_deck.get_deck_name()] = {
-                SAVED_VALUE_KEY: NO_OWNED_OVERLAP_FLAG}
-    
-    progress_bar.finish()
+:param report: The Report to add the section to
+:param spend_plan: The plan returned by DeckCompletionPlanner.plan
+"""
+def add_spend_plan_report_section(report, spend_plan):
+    completed_deck_entries = []
+    for completed_deck_step in spend_plan[COMPLETED_DECKS_KEY]:
+        completed_deck_entry = dict(completed_deck_step)
+        completed_deck_entry[DECK_NAME_KEY] = make_report_json_safe(completed_deck_step[DECK_NAME_KEY])
+        completed_deck_entry[CARD_LIST_KEY] = build_report_card_list(completed_deck_step[CARD_LIST_KEY])
+        completed_deck_entries.append(completed_deck_entry)
 
-    return owned_overlap_report
+    entry = dict(spend_plan)
+    entry[COMPLETED_DECKS_KEY] = completed_deck_entries
+    report.add_section(REPORT_SECTION_SPEND_PLAN, [entry])
 
 
 """
-For each metagame deck in the desired format, we determine how much monetary overlap we currently possess for it,
-and return back a sorted list of the Meta decks, together with which cards and what value we overlap
+Add the section listing the card statistics of the Metagame decks to the report
 
-:param metagame_decks: A list of Deck objects representing all of the Metagame decks on MTGGoldfish.com
-:param owned_cards: A list of dicts containing card info of the format: {CARD_QTY_KEY: card_quantity, CARD_NAME_KEY: card_name}
+:param report: The Report to add the section to
+:param card_rankings: The list of (card name, statistics) tuples returned by CardStatistics.get_top_cards
 """
-def evaluate_metagame_decks(metagame_decks, owned_cards):
-    progress_bar = IncrementalBar("   Evaluating", max=len(metagame_decks) * len(owned_cards), suffix='%(percent)d%%')
-    metagame_deck_recommendation_report = {}
-
-    for meta_deck in metagame_decks:
-        specific_cards_owned_in_meta_deck = []
-        number_of_owned_cards_that_are_in_meta_deck = 0
-        value_of_meta_deck_owned = 0.0
-
-        for owned_card_entry in owned_cards:
-            owned_card_name = owned_card_entry[CARD_NAME_KEY]
-
-            # Check for this card's presence in the meta_deck
-            for meta_card_entry in meta_deck.get_deck_list():
-                if meta_card_entry[CARD_NAME_KEY].lower() == owned_card_name.lower():
-                    if owned_card_entry[CARD_QTY_KEY] >= meta_card_entry[CARD_QTY_KEY]:
-                        number_of_owned_cards_that_are_in_meta_deck += meta_card_entry[CARD_QTY_KEY]
-                        value_of_meta_deck_owned += float(
-                            meta_card_entry[CARD_QTY_KEY]) * meta_card_entry[CARD_PRICE_KEY]
-                        specific_cards_owned_in_meta_deck.append({CARD_NAME_KEY: owned_card_name, CARD_QTY_KEY: meta_card_entry[CARD_QTY_KEY], CARD_PRICE_KEY: float(
-                            meta_card_entry[CARD_QTY_KEY]) * meta_card_entry[CARD_PRICE_KEY]})
-                    else:
-                        number_of_owned_cards_that_are_in_meta_deck += owned_card_entry[CARD_QTY_KEY]
-                        value_of_meta_deck_owned += float(
-                            owned_card_entry[CARD_QTY_KEY]) * meta_card_entry[CARD_PRICE_KEY]
-                        specific_cards_owned_in_meta_deck.append({CARD_NAME_KEY: owned_card_name, CARD_QTY_KEY: owned_card_entry[CARD_QTY_KEY], CARD_PRICE_KEY: float(
-                            owned_card_entry[CARD_QTY_KEY]) * meta_card_entry[CARD_PRICE_KEY]})
-                    break
+def add_card_statistics_report_section(report, card_rankings):
+    entries = []
+    for (rank, (card_name, card_statistics)) in enumerate(card_rankings):
+        entry = dict(card_statistics)
+        entry[RANK_KEY] = rank + 1
+        entry[CARD_NAME_KEY] = make_report_json_safe(card_name)
+        entries.append(entry)
 
-            progress_bar.next()
+    report.add_section(REPORT_SECTION_CARD_STATISTICS, entries)
 
-        # Only save the report if we actually own some cards in this Metagame deck
-        if value_of_meta_deck_owned > 0:
-            metagame_deck_recommendation_report[meta_deck.get_deck_name()] = {
-            }
-            metagame_deck_recommendation_report[meta_deck.get_deck_name()] = {OWNED_CARDS_KEY: "%d/%d" % (number_of_owned_cards_that_are_in_meta_deck, meta_deck.get_deck_size(
-            )), SAVED_VALUE_KEY: value_of_meta_deck_owned, CARD_LIST_KEY: specific_cards_owned_in_meta_deck, DECK_PRICE_KEY: meta_deck.get_deck_price()}
 
-    # Sort entries by value descending
-    metagame_decks_sorted_by_desc_value_saved_as_list = sorted(six.iteritems(
-        metagame_deck_recommendation_report), key=lambda kv: kv[1][SAVED_VALUE_KEY], reverse=True)
-    
-    progress_bar.finish()
+"""
+Render the report as the human-readable text report
 
-    # Return only the top 15
-    if len(metagame_decks_sorted_by_desc_value_saved_as_list) > 15:
-        return metagame_decks_sorted_by_desc_value_saved_as_list[:15]
-    else:
-        return metagame_decks_sorted_by_desc_value_saved_as_list
+:param report: The Report to render
+:param writer: The file-like object to write the report to
+"""
+def render_report_as_text(report, writer):
+    for (section_type, entries) in report.get_sections():
+        if section_type == REPORT_SECTION_OWNED_CARDS:
+            writer.write("\n=== Owned Card report for Desired Decks listed in desired_decks.txt ===\n")
+            for entry in entries:
+                writer.write("\n   Owned cards that are used in \"%s\" (%s):\n" % (entry[DECK_NAME_KEY], report.format_price(entry[DECK_PRICE_KEY])))
+                if entry[SAVED_VALUE_KEY] == NO_OWNED_OVERLAP_FLAG:
+                    writer.write("      None of the cards you own overlap with this deck :(\n")
+                    continue
+                writer.write("      Number of cards owned: %s\n" % (entry[OWNED_CARDS_KEY]))
+                writer.write("      Value saved: %s\n" % (report.format_price(entry[SAVED_VALUE_KEY])))
+                writer.write("      Remaining cost: %s\n" % (report.format_price(entry[REMAINING_COST_KEY])))
+                render_card_list_as_text(report, writer, entry[CARD_LIST_KEY], "      ")
+
+        elif section_type == REPORT_SECTION_METAGAME:
+            writer.write("\n=== Metagame deck recommendation report based on Cards listed in owned_cards.txt ===\n")
+            for entry in entries:
+                writer.write("\n   #%s Closest Match:\n" % (entry[RANK_KEY]))
+                writer.write("      Meta Deck: \"%s\" (%s)\n" % (entry[DECK_NAME_KEY], report.format_price(entry[DECK_PRICE_KEY])))
+                writer.write("      Number of cards owned: %s\n" % (entry[OWNED_CARDS_KEY]))
+                writer.write("      Value of cards owned: %s\n" % (report.format_price(entry[SAVED_VALUE_KEY])))
+                writer.write("      Remaining cost: %s\n" % (report.format_price(entry[REMAINING_COST_KEY])))
+                render_card_list_as_text(report, writer, entry[CARD_LIST_KEY], "      ")
+
+        elif section_type == REPORT_SECTION_BUDGET:
+            writer.write("\n=== Budget Deck report comparing against Desired Decks listed in desired_decks.txt ===\n")
+            for entry in entries:
+                writer.write("   Budget Decks that compare to Desired Deck: \"%s\" (%s):\n" % (entry[DECK_NAME_KEY], report.format_price(entry[DECK_PRICE_KEY])))
+                for budget_deck_entry in entry[BUDGET_DECKS_KEY]:
+                    writer.write("\n      #%s Closest Match:\n" % (budget_deck_entry[RANK_KEY]))
+                    writer.write("         Budget Deck Name: %s\n" % (budget_deck_entry[DECK_NAME_KEY]))
+                    writer.write("         Budget Deck cost: %s\n" % (report.format_price(budget_deck_entry[DECK_PRICE_KEY], "%s")))
+                    writer.write("         Number of cards shared: %s\n" % (budget_deck_entry[SHARED_CARDS_KEY]))
+                    writer.write("         Value shared: %s\n" % (report.format_price(budget_deck_entry[SHARED_VALUE_KEY])))
+                    writer.write("         Owned Cards Report:\n")
+                    if budget_deck_entry[SAVED_VALUE_KEY] == 0:
+                        writer.write("               None of the cards listed in owned_cards.txt are used in this deck :(\n")
+                        continue
+                    writer.write("            Number of cards owned: %s\n" % (budget_deck_entry[OWNED_CARDS_KEY]))
+                    writer.write("            Value of cards owned: %s\n" % (report.format_price(budget_deck_entry[SAVED_VALUE_KEY])))
+                    writer.write("            Remaining cost: %s\n" % (report.format_price(budget_deck_entry[REMAINING_COST_KEY])))
+                    render_card_list_as_text(report, writer, budget_deck_entry[CARD_LIST_KEY], "            ")
+
+        elif section_type == REPORT_SECTION_SIMILAR_DECKS:
+            writer.write("\n=== Metagame decks most similar to Desired Decks listed in desired_decks.txt ===\n")
+            for entry in entries:
+                writer.write("\n   Metagame decks similar to \"%s\":\n" % (entry[DECK_NAME_KEY]))
+                if len(entry[SIMILAR_DECKS_KEY]) == 0:
+                    writer.write("      None of the Metagame decks share any cards with this deck\n")
+                for similar_deck_entry in entry[SIMILAR_DECKS_KEY]:
+                    writer.write("      #%s \"%s\" (%.0f%% similar)\n" % (
+                        similar_deck_entry[RANK_KEY], similar_deck_entry[DECK_NAME_KEY], similar_deck_entry[SIMILARITY_KEY] * 100))
+
+        elif section_type == REPORT_SECTION_BUY_PATH:
+            writer.write("\n=== Cheapest path through Budget decks to the Desired Decks listed in desired_decks.txt ===\n")
+            for entry in entries:
+                writer.write("\n   Buying the rest of \"%s\" (%s) directly costs %s\n" % (
+                    entry[DECK_NAME_KEY], report.format_price(entry[DECK_PRICE_KEY]), report.format_price(entry[DIRECT_COST_KEY])))
+                if len(entry[BUY_PATH_KEY]) == 0:
+                    writer.write("      None of the Budget decks use any of the cards this deck still needs\n")
+                for buy_path_entry in entry[BUY_PATH_KEY]:
+                    writer.write("\n      Step %s: Budget Deck \"%s\" (%s)\n" % (
+                        buy_path_entry[STEP_KEY], buy_path_entry[DECK_NAME_KEY], report.format_price(buy_path_entry[DECK_PRICE_KEY])))
+                    writer.write("         Cost to complete it now: %s\n" % (report.format_price(buy_path_entry[STEP_COST_KEY])))
+                    writer.write("         Value towards the desired deck: %s\n" % (report.format_price(buy_path_entry[STEP_VALUE_KEY])))
+                    writer.write("         Extra spend: %s\n" % (report.format_price(buy_path_entry[EXTRA_SPEND_KEY])))
+                    writer.write("         Remaining cost of the desired deck: %s\n" % (report.format_price(buy_path_entry[REMAINING_COST_KEY])))
+                    writer.write("         Total spend along this path: %s\n" % (report.format_price(buy_path_entry[TOTAL_SPEND_KEY])))
+                if len(entry[BUY_PATH_KEY]) > 0:
+                    path_premium = entry[BUY_PATH_KEY][-1][TOTAL_SPEND_KEY] - entry[DIRECT_COST_KEY]
+                    if path_premium >= 0:
+                        writer.write("\n      This path costs %s more in total than buying the rest of the deck directly\n" % (report.format_price(path_premium)))
+                    else:
+                        writer.write("\n      This path costs %s less in total than buying the rest of the deck directly\n" % (report.format_price(-path_premium)))
+
+        elif section_type == REPORT_SECTION_BUY_NEXT:
+            writer.write("\n=== Cards to buy next, ranked by the value they add across the whole Metagame ===\n")
+            if len(entries) == 0:
+                writer.write("\n   You already own every card the Metagame decks use\n")
+            for entry in entries:
+                writer.write("\n   #%s %sx %s (%s each)\n" % (entry[RANK_KEY], entry[COPIES_NEEDED_KEY], entry[CARD_NAME_KEY], report.format_price(entry[CARD_PRICE_KEY])))
+                writer.write("      Used by %s Metagame decks you don't have enough copies for\n" % (entry[DECKS_USING_KEY]))
+                writer.write("      Metagame-weighted value: %s\n" % (report.format_price(entry[WEIGHTED_VALUE_KEY])))
+
+        elif section_type == REPORT_SECTION_CARD_STATISTICS:
+            writer.write("\n=== Card statistics across the Metagame decks ===\n")
+            if len(entries) == 0:
+                writer.write("\n   No Metagame decks have been fetched for this format yet\n")
+            for entry in entries:
+                writer.write("\n   #%s %s: played in %s Metagame decks (%.0f%%), %s copies in total\n" % (
+                    entry[RANK_KEY], entry[CARD_NAME_KEY], entry[DECKS_USING_KEY], entry[PLAY_RATE_KEY] * 100, entry[TOTAL_COPIES_KEY]))
+                writer.write("      Average price: %s each\n" % (report.format_price(entry[CARD_PRICE_KEY])))
+                writer.write("      Total value across the Metagame: %s (%s per deck)\n" % (
+                    report.format_price(entry[TOTAL_VALUE_KEY]), report.format_price(entry[WEIGHTED_VALUE_KEY])))
+
+        elif section_type == REPORT_SECTION_SPEND_PLAN:
+            for entry in entries:
+                writer.write("\n=== Desired and Metagame decks that can be completed with a spend limit of %s ===\n" % (report.format_price(entry[SPEND_LIMIT_KEY])))
+                writer.write("\n   %s of %s decks can be completed for %s\n" % (
+                    len(entry[COMPLETED_DECKS_KEY]), entry[CANDIDATE_DECK_COUNT_KEY], report.format_price(entry[TOTAL_SPEND_KEY])))
+                if not entry[PLAN_IS_OPTIMAL_KEY]:
+                    writer.write("   The search was cut short, so a plan completing more decks may exist\n")
+                for completed_deck_entry in entry[COMPLETED_DECKS_KEY]:
+                    writer.write("\n      Step %s: \"%s\" (%s)\n" % (
+                        completed_deck_entry[STEP_KEY], completed_deck_entry[DECK_NAME_KEY], report.format_price(completed_deck_entry[DECK_PRICE_KEY])))
+                    writer.write("         Cost to complete it now: %s\n" % (report.format_price(completed_deck_entry[STEP_COST_KEY])))
+                    writer.write("         Total spend along this plan: %s\n" % (report.format_price(completed_deck_entry[TOTAL_SPEND_KEY])))
+                    if len(completed_deck_entry[CARD_LIST_KEY]) > 0:
+                        render_card_list_as_text(report, writer, completed_deck_entry[CARD_LIST_KEY], "         ")
+
+        elif section_type == REPORT_SECTION_DECK_CLUSTERS:
+            writer.write("\n=== Clusters of near-duplicate Metagame decks ===\n")
+            if len(entries) == 0:
+                writer.write("\n   None of the Metagame decks are near-duplicates of each other\n")
+            for entry in entries:
+                writer.write("\n   Cluster #%s (%s decks):\n" % (entry[CLUSTER_KEY], len(entry[CLUSTER_DECKS_KEY])))
+                for cluster_deck_entry in entry[CLUSTER_DECKS_KEY]:
+                    writer.write("      \"%s\" (%s)\n" % (cluster_deck_entry[DECK_NAME_KEY], report.format_price(cluster_deck_entry[DECK_PRICE_KEY])))
 
 
 """
-For each desired deck, we process each budget deck to determine how many cards from each budget deck
-are present in the given desired deck. We then store them into a large multi-level dictionary for
-eventual reporting
+Write the "List of specific cards" block shared by every text report section
+
+:param indent: The indentation of the "List of specific cards:" line. The cards themselves are indented three more spaces
 """
-def evaluate_budget_decks(owned_cards, desired_decks_list, budget_decks_list):
-    progress_bar = IncrementalBar("   Evaluating", max=len(desired_decks_list) * len(budget_decks_list), suffix='%(percent)d%%')
-    budget_report = {}
-    for desired_deck in desired_decks_list:
-        budget_report[desired_deck.get_deck_name()] = {}
+def render_card_list_as_text(report, writer, card_list, indent):
+    writer.write("%sList of specific cards:\n" % (indent))
+    for card_entry in card_list:
+        writer.write("%s   %sx %s (%s)\n" % (indent, card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], report.format_price(card_entry[CARD_PRICE_KEY])))
 
-        for budget_deck in budget_decks_list:
-            number_of_cards_from_budget_deck_that_are_in_desired_deck = 0
-            value_shared_between_decks = 0.0
-            number_of_owned_cards_that_are_in_budget_deck = 0
-            value_of_budget_deck_owned = 0.0
-            specific_owned_cards_in_budget_deck = []
-
-            # This is literally N^3 and I should be ashamed, but with data sets this small it doesn't matter in the slightest
-            for desired_card_entry in desired_deck.get_deck_list():
-                desired_card_name = desired_card_entry[CARD_NAME_KEY]
-
-                # Check for this card's presence in the first budget deck
-                for budget_card_entry in budget_deck.get_deck_list():
-
-                    # Check to see if we own this card for our Owned Cards mini-report
-                    for owned_card_entry in owned_cards:
-                        owned_card_name = owned_card_entry[CARD_NAME_KEY]
-                        if budget_card_entry[CARD_NAME_KEY].lower() == owned_card_name.lower():
-                            if owned_card_entry[CARD_QTY_KEY] >= budget_card_entry[CARD_QTY_KEY]:
-
-                                # Only process this card if it doesn't already exist in the specific_owned_cards_in_budget_deck list
-                                already_exists = False
-                                for card_record in specific_owned_cards_in_budget_deck:
-                                    if card_record[CARD_NAME_KEY] == owned_card_name:
-                                        already_exists = True
-                                        break
-                                if not already_exists:
-                                    number_of_owned_cards_that_are_in_budget_deck += budget_card_entry[CARD_QTY_KEY]
-                                    value_of_budget_deck_owned += float(
-                                        budget_card_entry[CARD_QTY_KEY]) * budget_card_entry[CARD_PRICE_KEY]
-                                    specific_owned_cards_in_budget_deck.append({CARD_NAME_KEY: owned_card_name, CARD_QTY_KEY: budget_card_entry[CARD_QTY_KEY], CARD_PRICE_KEY: float(
-                                        budget_card_entry[CARD_QTY_KEY]) * budget_card_entry[CARD_PRICE_KEY]})
-
-                            else:
-
-                                # Only add this card if it doesn't already exist in the specific_owned_cards_in_budget_deck list
-                                already_exists = False
-                                for card_record in specific_owned_cards_in_budget_deck:
-                                    if card_record[CARD_NAME_KEY] == owned_card_name:
-                                        already_exists = True
-                                        break
-                                if not already_exists:
-                                    number_of_owned_cards_that_are_in_budget_deck += owned_card_entry[CARD_QTY_KEY]
-                                    value_of_budget_deck_owned += float(
-                                        owned_card_entry[CARD_QTY_KEY]) * budget_card_entry[CARD_PRICE_KEY]
-                                    specific_owned_cards_in_budget_deck.append({CARD_NAME_KEY: owned_card_name, CARD_QTY_KEY: owned_card_entry[CARD_QTY_KEY], CARD_PRICE_KEY: float(
-                                        owned_card_entry[CARD_QTY_KEY]) * budget_card_entry[CARD_PRICE_KEY]})
-
-                    if budget_card_entry[CARD_NAME_KEY].lower() == desired_card_name.lower():
-                        if desired_card_entry[CARD_QTY_KEY] >= budget_card_entry[CARD_QTY_KEY]:
-                            number_of_cards_from_budget_deck_that_are_in_desired_deck += budget_card_entry[
-                                CARD_QTY_KEY]
-                            value_shared_between_decks += float(
-                                budget_card_entry[CARD_QTY_KEY]) * budget_card_entry[CARD_PRICE_KEY]
-                        else:
-                            number_of_cards_from_budget_deck_that_are_in_desired_deck += desired_card_entry[
-                                CARD_QTY_KEY]
-                            value_shared_between_decks += float(
-                                desired_card_entry[CARD_QTY_KEY]) * budget_card_entry[CARD_PRICE_KEY]
-                        break
 
-            # Only bother reporting budget decks that actually overlap
-            if value_shared_between_decks > 0:
-                budget_report[desired_deck.get_deck_name()][budget_deck.get_deck_name()] = {DECK_PRICE_KEY: budget_deck.get_deck_price(), SHARED_CARDS_KEY: "%d/%d" % (number_of_cards_from_budget_deck_that_are_in_desired_deck, budget_deck.get_deck_size(
-                )), SHARED_VALUE_KEY: value_shared_between_decks, OWNED_CARDS_KEY: "%d/%d" % (number_of_owned_cards_that_are_in_budget_deck, budget_deck.get_deck_size()), SAVED_VALUE_KEY: value_of_budget_deck_owned, CARD_LIST_KEY: specific_owned_cards_in_budget_deck}
+"""
+Render the report as a single JSON document of the format:
+    {'Price Unit': 'USD', 'Sections': [{'Section': 'Owned Cards', 'Entries': [...]}, ...]}
+"""
+def render_report_as_json(report, writer):
+    json.dump({PRICE_UNIT_KEY: get_report_price_unit(report),
+               REPORT_SECTIONS_KEY: [{REPORT_SECTION_KEY: section_type, REPORT_ENTRIES_KEY: entries} for (section_type, entries) in report.get_sections()]},
+              writer, indent=2, sort_keys=True)
+    writer.write("\n")
 
-            progress_bar.next()
 
-        # Sort entries by value for this particular desired_deck now that all of the budget decks have been processed
-        budget_decks_sorted_by_desc_value_as_list = sorted(six.iteritems(
-            budget_report[desired_deck.get_deck_name()]), key=lambda kv: kv[1][SHARED_VALUE_KEY], reverse=True)
+"""
+Render the report as CSV with one row per (section, deck) pair, using the columns in REPORT_TABLE_COLUMNS
+"""
+def render_report_as_csv(report, writer):
+    import csv
+    csv_writer = csv.DictWriter(writer, fieldnames=REPORT_TABLE_COLUMNS)
+    csv_writer.writeheader()
+    for row in flatten_report(report):
+        csv_writer.writerow(row)
 
-        # Only keep the top 5 for each
-        budget_report[desired_deck.get_deck_name(
-        )] = budget_decks_sorted_by_desc_value_as_list[:5]
 
-    progress_bar.finish()
+"""
+Render the report as a Parquet file with the same rows and columns as the CSV renderer. This requires the
+optional pyarrow library, and can only be written to a file rather than the terminal.
 
-    return budget_report
+:param report_output_file_name: The path of the Parquet file to write
+"""
+def render_report_as_parquet(report, report_output_file_name):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        print("[ERROR]: The \"parquet\" report format requires the pyarrow library. Install it with \"pip install pyarrow\". Exiting.")
+        sys.exit(0)
+
+    rows = flatten_report(report)
+    columns = dict((column, [row[column] for row in rows]) for column in REPORT_TABLE_COLUMNS)
+    pyarrow.parquet.write_table(pyarrow.Table.from_pydict(columns), report_output_file_name)
 
 
 """
-Give a final evaluation report displaying how the cards that you own line up with the Metagame
-decks you specified desired_decks.txt
+Return the unit every price in the report is given in
 """
-def print_owned_cards_evaluation_report(report_output_file_name, desired_decks_list, owned_cards_overlap_report, use_online_price):
+def get_report_price_unit(report):
+    if report.use_online_price:
+        return 'tix'
+    return 'USD'
 
-    # This is super nasty, but whatever. We print to the file if we're actually given a file to print to. Otherwise we print to the terminal
-    if report_output_file_name != "":
-        with open(report_output_file_name, 'a') as output_file:
-            output_file.write(
-                "\n\n=== Owned Card report for Desired Decks listed in desired_decks.txt ===")
-            for desired_deck_name_key in owned_cards_overlap_report:
-
-                # This is a super clumsy way to fetch the price of the original deck
-                desired_deck_total_cost = 0.0
-                for desired_deck_obj in desired_decks_list:
-                    if desired_deck_obj.get_deck_name().lower() == desired_deck_name_key.lower():
-                        desired_deck_total_cost = desired_deck_obj.get_deck_price()
-                        if use_online_price:
-                            output_file.write("\n\n   Owned cards that are used in \"%s\" (%.2f tix):" %
-                                  (desired_deck_name_key, desired_deck_total_cost))
-                        else:
-                            output_file.write("\n\n   Owned cards that are used in \"%s\" ($%.2f):" %
-                                  (desired_deck_name_key, desired_deck_total_cost))
-
-                # The owned_cards_overlap_report is of the format:
-                # {'Saved Value': 265.96, 'Card List': [{'Card Name': u'Scalding Tarn', 'Card Quantity': 4}], 'Owned Cards': '4/73'}
-                specific_owned_cards_report = owned_cards_overlap_report[desired_deck_name_key]
-                if specific_owned_cards_report[SAVED_VALUE_KEY] == NO_OWNED_OVERLAP_FLAG:
-                    output_file.write(
-                        "\n      None of the cards you own overlap with this deck :(")
-                else:
-                    output_file.write("\n      Number of cards owned: %s" % (
-                        specific_owned_cards_report[OWNED_CARDS_KEY]))
-                    if use_online_price:
-                        output_file.write("\n      Value saved: %.2f tix" %
-                              (specific_owned_cards_report[SAVED_VALUE_KEY]))
-                        output_file.write("\n      Remaining cost: %.2f tix" % (
-                            desired_deck_total_cost - specific_owned_cards_report[SAVED_VALUE_KEY]))
-                    else:
-                        output_file.write("\n      Value saved: $%.2f" %
-                              (specific_owned_cards_report[SAVED_VALUE_KEY]))
-                        output_file.write("\n      Remaining cost: $%.2f" % (
-                            desired_deck_total_cost - specific_owned_cards_report[SAVED_VALUE_KEY]))
-                    output_file.write("\n      List of specific cards:")
-                    for card_entry in specific_owned_cards_report[CARD_LIST_KEY]:
-                        if use_online_price:
-                            output_file.write("\n         %sx %s (%.2f tix)" % (
-                                card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                        else:
-                            output_file.write("\n         %sx %s ($%.2f)" % (
-                                card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
 
-    else:
-        print("\n=== Owned Card report for Desired Decks listed in desired_decks.txt ===")
-        for desired_deck_name_key in owned_cards_overlap_report:
-
-            # This is a super clumsy way to fetch the price of the original deck
-            desired_deck_total_cost = 0.0
-            for desired_deck_obj in desired_decks_list:
-                if desired_deck_obj.get_deck_name().lower() == desired_deck_name_key.lower():
-                    desired_deck_total_cost = desired_deck_obj.get_deck_price()
-                    if use_online_price:
-                        print("\n   Owned cards that are used in \"%s\" (%.2f tix):" %
-                              (desired_deck_name_key, desired_deck_total_cost))
-                    else:
-                        print("\n   Owned cards that are used in \"%s\" ($%.2f):" %
-                              (desired_deck_name_key, desired_deck_total_cost))
-
-            # The owned_cards_overlap_report is of the format:
-            # {'Saved Value': 265.96, 'Card List': [{'Card Name': u'Scalding Tarn', 'Card Quantity': 4}], 'Owned Cards': '4/73'}
-            specific_owned_cards_report = owned_cards_overlap_report[desired_deck_name_key]
-            if specific_owned_cards_report[SAVED_VALUE_KEY] == NO_OWNED_OVERLAP_FLAG:
-                print("      None of the cards you own overlap with this deck :(")
+"""
+Flatten the report into one row per (section, deck) pair for tabular renderers. Columns which do not apply
+to a row are None, and card lists are joined into a single "4x Scalding Tarn; 1x Fatal Push" string.
+"""
+def flatten_report(report):
+    rows = []
+    for (section_type, entries) in report.get_sections():
+        for entry in entries:
+            if section_type == REPORT_SECTION_BUDGET:
+                for budget_deck_entry in entry[BUDGET_DECKS_KEY]:
+                    rows.append(build_report_table_row(report, section_type, budget_deck_entry, entry))
+            elif section_type == REPORT_SECTION_BUY_PATH:
+                for buy_path_entry in entry[BUY_PATH_KEY]:
+                    rows.append(build_report_table_row(report, section_type, buy_path_entry, entry))
+            elif section_type == REPORT_SECTION_SIMILAR_DECKS:
+                for similar_deck_entry in entry[SIMILAR_DECKS_KEY]:
+                    rows.append(build_report_table_row(report, section_type, similar_deck_entry, entry))
+            elif section_type == REPORT_SECTION_SPEND_PLAN:
+                for completed_deck_entry in entry[COMPLETED_DECKS_KEY]:
+                    rows.append(build_report_table_row(report, section_type, completed_deck_entry, None))
+            elif section_type == REPORT_SECTION_DECK_CLUSTERS:
+                for cluster_deck_entry in entry[CLUSTER_DECKS_KEY]:
+                    row = build_report_table_row(report, section_type, cluster_deck_entry, None)
+                    row[CLUSTER_KEY] = entry[CLUSTER_KEY]
+                    rows.append(row)
             else:
-                print("      Number of cards owned: %s" %
-                      (specific_owned_cards_report[OWNED_CARDS_KEY]))
-                if use_online_price:
-                    print("      Value saved: %.2f tix" %
-                          (specific_owned_cards_report[SAVED_VALUE_KEY]))
-                    print("      Remaining cost: %.2f tix" % (
-                        desired_deck_total_cost - specific_owned_cards_report[SAVED_VALUE_KEY]))
-                else:
-                    print("      Value saved: $%.2f" %
-                          (specific_owned_cards_report[SAVED_VALUE_KEY]))
-                    print("      Remaining cost: $%.2f" % (
-                        desired_deck_total_cost - specific_owned_cards_report[SAVED_VALUE_KEY]))
-                print("      List of specific cards:")
-                for card_entry in specific_owned_cards_report[CARD_LIST_KEY]:
-                    if use_online_price:
-                        print("         %sx %s (%.2f tix)" % (
-                            card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                    else:
-                        print("         %sx %s ($%.2f)" % (
-                            card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
+                rows.append(build_report_table_row(report, section_type, entry, None))
+    return rows
 
 
 """
-Print a final report of the Metagame decks that you have share the most value with
-
-:param metagame_deck_recommendation_report: A list of tuples containing (<deck_name>, <report_summary_for_this_deck>) pairs,
-                                                   sorted descending based on the 'Saved Value' key in the <Report_summary_for_this_deck>
+Build a single flattened row. desired_deck_entry is the enclosing desired deck entry for Budget rows, and None otherwise
 """
-def print_metagame_deck_recommendation_report(report_output_file_name, metagame_deck_recommendation_report, use_online_price):
-
-    # This is super nasty, but whatever. We print to the file if we're actually given a file to print to. Otherwise we print to the terminal
-    if report_output_file_name != "":
-        with open(report_output_file_name, 'a') as output_file:
-            output_file.write(
-                "\n\n=== Metagame deck recommendation report based on Cards listed in owned_cards.txt ===")
-
-            # The sort method turns the dictionary into a list of a tuple like this: [('Affinity', {'Saved Value': 62.87, 'Owned Cards': '3/72', 'Deck Price': 1032.95, 'Specific Cards': [{}]}), ...]
-            for deck_summary_entry in metagame_deck_recommendation_report:
-                output_file.write("\n\n   #%s Closest Match:" % (
-                    metagame_deck_recommendation_report.index(deck_summary_entry) + 1))
-                if use_online_price:
-                    output_file.write("\n      Meta Deck: \"%s\" (%.2f tix)" %
-                          (deck_summary_entry[0], deck_summary_entry[1][DECK_PRICE_KEY]))
-                else:
-                    output_file.write("\n      Meta Deck: \"%s\" ($%.2f)" %
-                          (deck_summary_entry[0], deck_summary_entry[1][DECK_PRICE_KEY]))
-                output_file.write("\n      Number of cards owned: %s" %
-                      (deck_summary_entry[1][OWNED_CARDS_KEY]))
-                if use_online_price:
-                    output_file.write("\n      Value of cards owned: %.2f tix" %
-                          (deck_summary_entry[1][SAVED_VALUE_KEY]))
-                else:
-                    output_file.write("\n      Value of cards owned: $%.2f" %
-                          (deck_summary_entry[1][SAVED_VALUE_KEY]))
-                if use_online_price:
-                    output_file.write("\n      Remaining cost: %.2f tix" % (
-                        deck_summary_entry[1][DECK_PRICE_KEY] - deck_summary_entry[1][SAVED_VALUE_KEY]))
-                else:
-                    output_file.write("\n      Remaining cost: $%.2f" % (
-                        deck_summary_entry[1][DECK_PRICE_KEY] - deck_summary_entry[1][SAVED_VALUE_KEY]))
-                output_file.write("\n      List of specific cards:")
-                for card_entry in deck_summary_entry[1][CARD_LIST_KEY]:
-                    if use_online_price:
-                        output_file.write("\n         %sx %s (%.2f tix)" % (
-                            card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                    else:
-                        output_file.write("\n         %sx %s ($%.2f)" % (
-                            card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-    else:
-        print("\n=== Metagame deck recommendation report based on Cards listed in owned_cards.txt ===")
-
-        # The sort method turns the dictionary into a list of a tuple like this: [('Affinity', {'Saved Value': 62.87, 'Owned Cards': '3/72', 'Deck Price': 1032.95, 'Specific Cards': [{}]}), ...]
-        for deck_summary_entry in metagame_deck_recommendation_report:
-            print("\n   #%s Closest Match:" % (
-                metagame_deck_recommendation_report.index(deck_summary_entry) + 1))
-            if use_online_price:
-                print("      Meta Deck: \"%s\" (%.2f tix)" %
-                      (deck_summary_entry[0], deck_summary_entry[1][DECK_PRICE_KEY]))
-            else:
-                print("      Meta Deck: \"%s\" ($%.2f)" %
-                      (deck_summary_entry[0], deck_summary_entry[1][DECK_PRICE_KEY]))
-            print("      Number of cards owned: %s" %
-                  (deck_summary_entry[1][OWNED_CARDS_KEY]))
-            if use_online_price:
-                print("      Value of cards owned: %.2f tix" %
-                      (deck_summary_entry[1][SAVED_VALUE_KEY]))
-            else:
-                print("      Value of cards owned: $%.2f" %
-                      (deck_summary_entry[1][SAVED_VALUE_KEY]))
-            if use_online_price:
-                print("      Remaining cost: %.2f tix" % (
-                    deck_summary_entry[1][DECK_PRICE_KEY] - deck_summary_entry[1][SAVED_VALUE_KEY]))
-            else:
-                print("      Remaining cost: $%.2f" % (
-                    deck_summary_entry[1][DECK_PRICE_KEY] - deck_summary_entry[1][SAVED_VALUE_KEY]))
-            print("      List of specific cards:")
-            for card_entry in deck_summary_entry[1][CARD_LIST_KEY]:
-                if use_online_price:
-                    print("         %sx %s (%.2f tix)" % (
-                        card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                else:
-                    print("         %sx %s ($%.2f)" % (
-                        card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
+def build_report_table_row(report, section_type, entry, desired_deck_entry):
+    row = dict((column, None) for column in REPORT_TABLE_COLUMNS)
+    row[REPORT_SECTION_KEY] = section_type
+    row[PRICE_UNIT_KEY] = get_report_price_unit(report)
+    if desired_deck_entry is not None:
+        row[DESIRED_DECK_NAME_KEY] = desired_deck_entry[DECK_NAME_KEY]
+        row[DESIRED_DECK_PRICE_KEY] = desired_deck_entry.get(DECK_PRICE_KEY)
+        row[DIRECT_COST_KEY] = desired_deck_entry.get(DIRECT_COST_KEY)
+    for column in [RANK_KEY, STEP_KEY, DECK_NAME_KEY, DECK_PRICE_KEY, SIMILARITY_KEY, SHARED_CARDS_KEY, SHARED_VALUE_KEY, OWNED_CARDS_KEY,
+                   STEP_COST_KEY, STEP_VALUE_KEY, EXTRA_SPEND_KEY, REMAINING_COST_KEY, TOTAL_SPEND_KEY, CARD_NAME_KEY, CARD_PRICE_KEY,
+                   COPIES_NEEDED_KEY, DECKS_USING_KEY, WEIGHTED_VALUE_KEY, PLAY_RATE_KEY, TOTAL_COPIES_KEY, TOTAL_VALUE_KEY]:
+        row[column] = entry.get(column)
+    if entry.get(SAVED_VALUE_KEY) not in [None, NO_OWNED_OVERLAP_FLAG]:
+        row[SAVED_VALUE_KEY] = entry[SAVED_VALUE_KEY]
+    if CARD_LIST_KEY in entry:
+        row[CARD_LIST_KEY] = "; ".join(["%sx %s" % (card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY]) for card_entry in entry[CARD_LIST_KEY]])
+    return row
+
+
+# Renderers which write to a file-like object. The Parquet renderer is handled separately, as it can only write to a file
+STREAM_REPORT_RENDERERS = {'text': render_report_as_text, 'json': render_report_as_json, 'csv': render_report_as_csv}
+REPORT_FILE_EXTENSIONS = {'text': 'txt', 'json': 'json', 'csv': 'csv', 'parquet': 'parquet'}
+REPORT_CONTENT_TYPES = {'text': 'text/plain; charset=utf-8', 'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
 
 
 """
-Give a final evaluation report for the Budget decks by iterating
-over each entry and printing it out to the terminal in a clear way
+Render the report in the given format, either to the terminal or, if report_output_file_name is given, to that file.
+The file is opened exactly once and written through a single buffered writer.
+
+:param report: The Report to render
+:param report_format: One of the keys of REPORT_FILE_EXTENSIONS
+:param report_output_file_name: The file to write the report to, or "" to write it to the terminal
 """
-def print_budget_evaluation_report(report_output_file_name, desired_decks_list, budget_deck_report, use_online_price):
+def render_report(report, report_format, report_output_file_name):
+    if report_format == 'parquet':
+        render_report_as_parquet(report, report_output_file_name)
+        return
 
-    # This is super nasty, but whatever. We print to the file if we're actually given a file to print to. Otherwise we print to the terminal
+    renderer = STREAM_REPORT_RENDERERS[report_format]
     if report_output_file_name != "":
-        with open(report_output_file_name, 'a') as output_file:
-            output_file.write(
-                "\n\n=== Budget Deck report comparing against Desired Decks listed in desired_decks.txt ===")
-            for desired_deck_name_key in budget_deck_report:
-
-                # This is a super clumsy way to fetch the price of the original deck
-                for desired_deck_obj in desired_decks_list:
-                    if desired_deck_obj.get_deck_name().lower() == desired_deck_name_key.lower():
-                        if use_online_price:
-                            output_file.write("\n   Budget Decks that compare to Desired Deck: \"%s\" (%.2f tix):" % (
-                                desired_deck_name_key, desired_deck_obj.get_deck_price()))
-                        else:
-                            output_file.write("\n   Budget Decks that compare to Desired Deck: \"%s\" ($%.2f):" % (
-                                desired_deck_name_key, desired_deck_obj.get_deck_price()))
-
-                # The sort method turns the dictionary into a list of a tuple like this: [('Rogues', {'Shared Value': 2.87, 'Shared Cards': '1/72', 'Deck Price': 32.95}), ...]
-                for budget_deck_list_record in budget_deck_report[desired_deck_name_key]:
-                    output_file.write("\n\n      #%s Closest Match:" % (
-                        budget_deck_report[desired_deck_name_key].index(budget_deck_list_record) + 1))
-                    output_file.write("\n         Budget Deck Name: %s" % (
-                        budget_deck_list_record[0]))
-                    if use_online_price:
-                        output_file.write("\n         Budget Deck cost: %s tix" % (
-                            budget_deck_list_record[1][DECK_PRICE_KEY]))
-                    else:
-                        output_file.write("\n         Budget Deck cost: $%s" % (
-                            budget_deck_list_record[1][DECK_PRICE_KEY]))
-                    output_file.write("\n         Number of cards shared: %s" % (
-                        budget_deck_list_record[1][SHARED_CARDS_KEY]))
-                    if use_online_price:
-                        output_file.write("\n         Value shared: %.2f tix" % (
-                            budget_deck_list_record[1][SHARED_VALUE_KEY]))
-                    else:
-                        output_file.write("\n         Value shared: $%.2f" % (
-                            budget_deck_list_record[1][SHARED_VALUE_KEY]))
-                    output_file.write("\n         Owned Cards Report:")
-                    if budget_deck_list_record[1][SAVED_VALUE_KEY] != 0:
-                        output_file.write("\n            Number of cards owned: %s" % (
-                            budget_deck_list_record[1][OWNED_CARDS_KEY]))
-                        if use_online_price:
-                            output_file.write("\n            Value of cards owned: %.2f tix" % (
-                                budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                        else:
-                            output_file.write("\n            Value of cards owned: $%.2f" % (
-                                budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                        if use_online_price:
-                            output_file.write("\n            Remaining cost: %.2f tix" % (
-                                budget_deck_list_record[1][DECK_PRICE_KEY] - budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                        else:
-                            output_file.write("\n            Remaining cost: $%.2f" % (
-                                budget_deck_list_record[1][DECK_PRICE_KEY] - budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                        output_file.write(
-                            "\n            List of specific cards:")
-                        for card_entry in budget_deck_list_record[1][CARD_LIST_KEY]:
-                            if use_online_price:
-                                output_file.write("\n               %sx %s (%.2f tix)" % (
-                                    card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                            else:
-                                output_file.write("\n               %sx %s ($%.2f)" % (
-                                    card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                    else:
-                        output_file.write(
-                            "\n               None of the cards listed in owned_cards.txt are used in this deck :(")
-
+        with open(report_output_file_name, 'w') as output_file:
+            renderer(report, output_file)
     else:
-        print("\n=== Budget Deck report comparing against Desired Decks listed in desired_decks.txt ===")
-        for desired_deck_name_key in budget_deck_report:
-
-            # This is a super clumsy way to fetch the price of the original deck
-            for desired_deck_obj in desired_decks_list:
-                if desired_deck_obj.get_deck_name().lower() == desired_deck_name_key.lower():
-                    print("   Budget Decks that compare to Desired Deck: \"%s\" ($%.2f):" % (
-                        desired_deck_name_key, desired_deck_obj.get_deck_price()))
-
-            # The sort method turns the dictionary into a list of a tuple like this: [('Rogues', {'Shared Value': 2.87, 'Shared Cards': '1/72', 'Deck Price': 32.95}), ...]
-            for budget_deck_list_record in budget_deck_report[desired_deck_name_key]:
-                print("\n      #%s Closest Match:" % (
-                    budget_deck_report[desired_deck_name_key].index(budget_deck_list_record) + 1))
-                print("         Budget Deck Name: %s" %
-                      (budget_deck_list_record[0]))
-                if use_online_price:
-                    print("         Budget Deck cost: %s tix" % (
-                        budget_deck_list_record[1][DECK_PRICE_KEY]))
-                else:
-                    print("         Budget Deck cost: $%s" % (
-                        budget_deck_list_record[1][DECK_PRICE_KEY]))
-                print("         Number of cards shared: %s" % (
-                    budget_deck_list_record[1][SHARED_CARDS_KEY]))
-                if use_online_price:
-                    print("         Value shared: %.2f tix" % (
-                        budget_deck_list_record[1][SHARED_VALUE_KEY]))
-                else:
-                    print("         Value shared: $%.2f" % (
-                        budget_deck_list_record[1][SHARED_VALUE_KEY]))
-                print("         Owned Cards Report:")
-                if budget_deck_list_record[1][SAVED_VALUE_KEY] != 0:
-                    print("            Number of cards owned: %s" % (
-                        budget_deck_list_record[1][OWNED_CARDS_KEY]))
-                    if use_online_price:
-                        print("            Value of cards owned: %.2f tix" % (
-                            budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                    else:
-                        print("            Value of cards owned: $%.2f" % (
-                            budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                    if use_online_price:
-                        print("            Remaining cost: %.2f tix" % (
-                            budget_deck_list_record[1][DECK_PRICE_KEY] - budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                    else:
-                        print("            Remaining cost: $%.2f" % (
-                            budget_deck_list_record[1][DECK_PRICE_KEY] - budget_deck_list_record[1][SAVED_VALUE_KEY]))
-                    print(
-                        "            List of specific cards:")
-                    for card_entry in budget_deck_list_record[1][CARD_LIST_KEY]:
-                        if use_online_price:
-                            print("               %sx %s (%.2f tix)" % (
-                                card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                        else:
-                            print("               %sx %s ($%.2f)" % (
-                                card_entry[CARD_QTY_KEY], card_entry[CARD_NAME_KEY], card_entry[CARD_PRICE_KEY]))
-                else:
-                    print(
-                        "               None of the cards listed in owned_cards.txt are used in this deck :(")
+        renderer(report, sys.stdout)
+        sys.stdout.flush()
 
 
 """
@@ -945,27 +4263,307 @@ def determine_meta_and_budget_URLs(desired_format, use_online_price):
         pricing_query_param = "#online"
 
     if desired_format == "standard":
-        return ("https://www.mtggoldfish.com/metagame/standard/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/standard" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/standard/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/standard" + pricing_query_param)
     elif desired_format == "modern":
-        return ("https://www.mtggoldfish.com/metagame/modern/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/modern" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/modern/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/modern" + pricing_query_param)
     elif desired_format == "pauper":
-        return ("https://www.mtggoldfish.com/metagame/pauper/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/pauper" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/pauper/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/pauper" + pricing_query_param)
     elif desired_format == "legacy":
-        return ("https://www.mtggoldfish.com/metagame/legacy/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/legacy" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/legacy/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/legacy" + pricing_query_param)
     elif desired_format == "vintage":
-        return ("https://www.mtggoldfish.com/metagame/vintage/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/vintage" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/vintage/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/vintage" + pricing_query_param)
     elif desired_format == "frontier":
-        return ("https://www.mtggoldfish.com/metagame/frontier/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/frontier" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/frontier/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/frontier" + pricing_query_param)
     elif desired_format == "commander 1v1":
-        return ("https://www.mtggoldfish.com/metagame/commander_1v1/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/commander_1v1" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/commander_1v1/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/commander_1v1" + pricing_query_param)
     elif desired_format == "commander":
-        return ("https://www.mtggoldfish.com/metagame/commander/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/commander" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/commander/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/commander" + pricing_query_param)
     elif desired_format == "tiny leaders":
-        return ("https://www.mtggoldfish.com/metagame/tiny_leaders/full" + pricing_query_param, "https://www.mtggoldfish.com/decks/budget/tiny_leaders" + pricing_query_param)
+        return (MTGGOLDFISH_BASE_URL + "/metagame/tiny_leaders/full" + pricing_query_param, MTGGOLDFISH_BASE_URL + "/decks/budget/tiny_leaders" + pricing_query_param)
     else:
         return (None, None)
 
 
+
+"""
+Recursively convert a report into something json.dumps can handle. Deck names parsed on Python 3
+are stored as bytes, and the sorted reports are lists of (name, summary) tuples.
+
+:param report: Any of the dicts/lists returned by the evaluate_* functions
+"""
+def make_report_json_safe(report):
+    if isinstance(report, bytes):
+        return report.decode('ascii', 'replace')
+    if isinstance(report, dict):
+        return dict((make_report_json_safe(key), make_report_json_safe(value)) for key, value in six.iteritems(report))
+    if isinstance(report, (list, tuple)):
+        return [make_report_json_safe(entry) for entry in report]
+    return report
+
+
+"""
+Holds every Deck needed to answer queries in memory so that a daemon never has to touch the cache
+or the network while answering a query. The deck lists are replaced wholesale on each refresh, so
+a query always sees one consistent snapshot.
+"""
+class ResidentDeckSet(object):
+    def __init__(self, desired_format, use_online_price, cache_only=False):
+        self.desired_format = desired_format
+        self.use_online_price = use_online_price
+        self.cache_only = cache_only
+        self.desired_decks = []
+        self.metagame_decks = []
+        self.budget_decks = []
+        self.meta_shares = {}
+        self.similarity_index = DeckSimilarityIndex()
+        self.last_refresh = None
+        self.lock = threading.Lock()
+
+        # Refreshes write to the deck cache and the card statistics, so only one runs at a time
+        self.refresh_lock = threading.Lock()
+
+    """
+    Reload the desired decks and re-snapshot the Metagame and Budget landing pages. Decks that are
+    already cached are loaded from the cache, so only newly listed decks are fetched. A refresh requested while
+    another one is running waits for it to finish. Raises a DeckFetchError if the decks could not be loaded, in
+    which case the previous deck data is kept.
+
+    :param update_cache: If set to True, we will ignore any cached versions of these decks
+    """
+    def refresh(self, update_cache=False):
+        with self.refresh_lock:
+            self.refresh_decks(update_cache)
+
+    """
+    Refresh the resident decks while holding the refresh lock, see refresh
+    """
+    def refresh_decks(self, update_cache):
+        (url_for_meta_decks, url_for_budget_decks) = determine_meta_and_budget_URLs(
+            self.desired_format, self.use_online_price)
+
+        print("\n[%s] Refreshing resident %s deck data..." % (datetime.now().strftime('%H:%M:%S'), self.desired_format))
+        meta_shares = {}
+        deck_fetch_plan = DeckFetchPlan()
+        deck_fetch_plan.add_view(DECK_VIEW_DESIRED, parse_desired_deck_URLs(), DECK_VIEW_PRIORITIES[DECK_VIEW_DESIRED])
+        deck_fetch_plan.add_view(DECK_VIEW_METAGAME, parse_deck_urls_from_category_landing_page(url_for_meta_decks, self.cache_only, meta_shares),
+                                 DECK_VIEW_PRIORITIES[DECK_VIEW_METAGAME])
+        deck_fetch_plan.add_view(DECK_VIEW_BUDGET, parse_deck_urls_from_category_landing_page(url_for_budget_decks, self.cache_only),
+                                 DECK_VIEW_PRIORITIES[DECK_VIEW_BUDGET])
+        deck_fetch_plan.fetch(update_cache, self.use_online_price, self.cache_only)
+        desired_decks = deck_fetch_plan.get_decks(DECK_VIEW_DESIRED)
+        metagame_decks = deck_fetch_plan.get_decks(DECK_VIEW_METAGAME)
+        budget_decks = deck_fetch_plan.get_decks(DECK_VIEW_BUDGET)
+
+        # Queries look up owned cards without adding them to CARD_NAMES, so every card of the resident decks is seen here first
+        for deck in desired_decks + metagame_decks + budget_decks:
+            deck.get_deck_list()
+
+        with self.lock:
+            self.desired_decks = desired_decks
+            self.metagame_decks = metagame_decks
+            self.budget_decks = budget_decks
+            self.meta_shares = meta_shares
+            self.similarity_index.sync_decks(metagame_decks)
+            self.last_refresh = datetime.now()
+        CARD_STATISTICS.sync_format(get_card_statistics_format_key(self.desired_format, self.use_online_price), metagame_decks)
+        evict_from_deck_cache()
+
+    """
+    Return a consistent (desired_decks, metagame_decks, budget_decks) snapshot for a single query
+    """
+    def snapshot(self):
+        with self.lock:
+            return (self.desired_decks, self.metagame_decks, self.budget_decks)
+
+    def get_meta_shares(self):
+        with self.lock:
+            return self.meta_shares
+
+    """
+    Build a report of the Metagame decks closest to each desired deck, and the clusters of near-duplicate Metagame decks
+    """
+    def build_similar_decks_report(self):
+        report = Report(self.use_online_price)
+        with self.lock:
+            add_similar_decks_report_section(report, evaluate_similar_decks(self.desired_decks, self.similarity_index))
+            add_deck_clusters_report_section(report, self.similarity_index.find_deck_clusters())
+        return report
+
+    """
+    Build a report of the card statistics of the Metagame decks, ranked by the given key of CARD_STATISTICS_SORT_KEYS
+    """
+    def build_card_statistics_report(self, sort_name):
+        report = Report(self.use_online_price)
+        add_card_statistics_report_section(report, CARD_STATISTICS.get_top_cards(
+            get_card_statistics_format_key(self.desired_format, self.use_online_price), CARD_STATISTICS_SORT_KEYS[sort_name]))
+        return report
+
+    def get_status(self):
+        (desired_decks, metagame_decks, budget_decks) = self.snapshot()
+        last_refresh = None
+        if self.last_refresh is not None:
+            last_refresh = self.last_refresh.strftime('%Y-%m-%dT%H:%M:%S')
+        return {'format': self.desired_format, 'online_prices': bool(self.use_online_price), 'last_refresh': last_refresh,
+                'desired_decks': len(desired_decks), 'metagame_decks': len(metagame_decks), 'budget_decks': len(budget_decks)}
+
+
+"""
+Answers queries against a ResidentDeckSet over HTTP. Every evaluation endpoint takes the contents of an
+owned_cards.txt file as the POST body and returns the same report the terminal run would print, rendered
+as JSON unless another streamable format is requested with "?format=text" or "?format=csv". Duplicate cards in
+the body are rejected unless "?merge_duplicates=true" is given:
+    GET  /status     Counts of resident decks and the time of the last refresh
+    GET  /similar    Metagame decks closest to each desired deck, and clusters of near-duplicate Metagame decks
+    GET  /card-stats Cards played in the most Metagame decks. Append "?sort=copies" or "?sort=value" to rank them differently
+    POST /owned      Owned Cards report for the decks in desired_decks.txt
+    POST /recommend  Metagame Deck Recommendation report
+    POST /budget     Budget Deck report for the decks in desired_decks.txt
+    POST /buy-path   Cheapest Completion Path report for the decks in desired_decks.txt
+    POST /buy-next   What To Buy Next card ranking across the Metagame decks
+    POST /refresh    Refresh the resident decks right away
+
+It is mixed into BaseHTTPRequestHandler by run_daemon so the HTTP server is only imported in daemon mode. Each
+request is answered on its own thread, so queries keep being answered while a refresh runs.
+"""
+class DeckQueryRequestHandlerMixin(object):
+    deck_set = None
+
+    def do_GET(self):
+        endpoint = urlparse(self.path).path
+        report_format = parse_qs(urlparse(self.path).query).get('format', ['json'])[0]
+        if endpoint == '/status':
+            self.send_json(200, self.deck_set.get_status())
+        elif endpoint == '/similar' and report_format in STREAM_REPORT_RENDERERS:
+            self.send_report(self.deck_set.build_similar_decks_report(), report_format)
+        elif endpoint == '/card-stats' and report_format in STREAM_REPORT_RENDERERS:
+            sort_name = parse_qs(urlparse(self.path).query).get('sort', ['decks'])[0]
+            if sort_name not in CARD_STATISTICS_SORT_KEYS:
+                self.send_json(400, {'error': "Unsupported sort \"%s\"" % (sort_name)})
+                return
+            self.send_report(self.deck_set.build_card_statistics_report(sort_name), report_format)
+        else:
+            self.send_json(404, {'error': "Unknown endpoint \"%s\"" % (self.path)})
+
+    def do_POST(self):
+        endpoint = urlparse(self.path).path
+        query_params = parse_qs(urlparse(self.path).query)
+        report_format = query_params.get('format', ['json'])[0]
+        merge_duplicates = query_params.get('merge_duplicates', ['false'])[0].lower() in ['1', 'true']
+        if report_format not in STREAM_REPORT_RENDERERS:
+            self.send_json(400, {'error': "Unsupported report format \"%s\"" % (report_format)})
+            return
+
+        content_length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(content_length).decode('utf-8')
+
+        if endpoint == '/refresh':
+            try:
+                self.deck_set.refresh()
+            except DeckFetchError as fetch_error:
+                self.send_json(500, {'error': str(fetch_error)})
+                return
+            self.send_json(200, self.deck_set.get_status())
+            return
+
+        # The owned cards are only looked up in CARD_NAMES, so that queries don't grow it, see CardNameInterner
+        CARD_NAMES.begin_lookups_only()
+        try:
+            try:
+                owned_cards = parse_owned_cards_from_lines(body.splitlines(True), merge_duplicates)
+            except ValueError as duplicate_card_error:
+                self.send_json(400, {'error': str(duplicate_card_error)})
+                return
+            report = self.evaluate_owned_cards_query(endpoint, owned_cards)
+        finally:
+            CARD_NAMES.end_lookups_only()
+        if report is None:
+            self.send_json(404, {'error': "Unknown endpoint \"%s\"" % (self.path)})
+            return
+
+        self.send_report(report, report_format)
+
+    """
+    Build the report of an evaluation endpoint against the resident decks, or return None if the endpoint is unknown
+    """
+    def evaluate_owned_cards_query(self, endpoint, owned_cards):
+        (desired_decks, metagame_decks, budget_decks) = self.deck_set.snapshot()
+        desired_decks_by_name = dict((desired_deck.get_deck_name().lower(), desired_deck) for desired_deck in desired_decks)
+        report = Report(self.deck_set.use_online_price)
+        if endpoint == '/owned':
+            add_owned_cards_report_section(report, desired_decks_by_name, evaluate_owned_cards(desired_decks, owned_cards))
+        elif endpoint == '/recommend':
+            add_metagame_deck_recommendation_report_section(report, evaluate_metagame_decks(metagame_decks, owned_cards))
+        elif endpoint == '/budget':
+            add_budget_evaluation_report_section(report, desired_decks_by_name, evaluate_budget_decks(owned_cards, desired_decks, budget_decks))
+        elif endpoint == '/buy-path':
+            add_cheapest_completion_path_report_section(report, desired_decks_by_name, evaluate_cheapest_completion_paths(owned_cards, desired_decks, budget_decks))
+        elif endpoint == '/buy-next':
+            add_buy_next_report_section(report, rank_cards_to_buy_next(metagame_decks, owned_cards, self.deck_set.get_meta_shares()))
+        else:
+            return None
+        return report
+
+    def send_report(self, report, report_format):
+        response_writer = six.StringIO()
+        STREAM_REPORT_RENDERERS[report_format](report, response_writer)
+        self.send_body(200, REPORT_CONTENT_TYPES[report_format], response_writer.getvalue())
+
+    def send_json(self, status_code, payload):
+        self.send_body(status_code, REPORT_CONTENT_TYPES['json'], json.dumps(payload))
+
+    def send_body(self, status_code, content_type, body):
+        response_body = body.encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+"""
+Keep all decks resident in memory and answer queries over a local HTTP API until interrupted.
+A background thread refreshes the resident decks every refresh_interval_minutes. Exits if the first refresh fails.
+
+:param deck_set: The ResidentDeckSet to serve. It is refreshed once before the server starts listening
+:param port: The localhost port to listen on
+:param refresh_interval_minutes: How often to refresh the resident decks
+"""
+def run_daemon(deck_set, port, refresh_interval_minutes):
+    global SHOW_PROGRESS_BARS
+    SHOW_PROGRESS_BARS = False
+
+    run_fetch_or_exit(deck_set.refresh)
+
+    stop_event = threading.Event()
+
+    def refresh_on_schedule():
+        while not stop_event.wait(refresh_interval_minutes * 60):
+            try:
+                deck_set.refresh()
+            except Exception as refresh_error:
+                print("   [ERROR]: Scheduled refresh failed, keeping the previous deck data: %s" % (refresh_error))
+
+    refresh_thread = threading.Thread(target=refresh_on_schedule)
+    refresh_thread.daemon = True
+    refresh_thread.start()
+
+    from six.moves import BaseHTTPServer, socketserver
+    request_handler_class = type('DeckQueryRequestHandler', (DeckQueryRequestHandlerMixin, BaseHTTPServer.BaseHTTPRequestHandler), {'deck_set': deck_set})
+    server_class = type('DeckQueryServer', (socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer), {'daemon_threads': True})
+    server = server_class(('127.0.0.1', port), request_handler_class)
+    print("\nDaemon listening on http://127.0.0.1:%d. Press Ctrl+C to stop." % (port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+
+
 if __name__ == "__main__":
     print("")
     print("=====================================================")
@@ -986,6 +4584,42 @@ if __name__ == "__main__":
         help="Parse all Metagame decks of the desired gameplay format (specified with the -F flag) from MTGGoldfish and then run a \"Modern Metagame Deck\" analysis as described in the README. Data for any decks which have been fetched previously will not be re-fetched, unless the \"-u\" flag is specified. Likewise, any new decks fetched will have their data cached for future runs. This can take 10 minutes or more for the first run.",
         action='store_const',
         const=True)
+    parser.add_option("-p", "--buy-path",
+        dest="plan_buy_path",
+        help="Parse all Budget decks of the desired gameplay format (specified with the -F flag) and run a \"Cheapest Completion Path\" analysis as described in the README, listing the order in which to buy Budget decks on the way to each deck in desired_decks.txt so that the least money is spent on cards those decks don't use.",
+        action='store_const',
+        const=True)
+    parser.add_option("-n", "--buy-next",
+        dest="rank_cards_to_buy_next",
+        help="Parse all Metagame decks of the desired gameplay format (specified with the -F flag) and run a \"What To Buy Next\" analysis as described in the README, ranking individual cards by how much they would reduce the remaining cost of the whole Metagame, weighted by each deck's share of the Metagame.",
+        action='store_const',
+        const=True)
+    parser.add_option("--spend-limit",
+        dest="spend_limit",
+        type="float",
+        help="Parse all Metagame decks of the desired gameplay format (specified with the -F flag) and find the largest set of desired and Metagame decks that can all be completed with your owned cards plus purchases costing at most this much, as described in the README. Cards bought for one deck count toward every other deck that plays them.")
+    parser.add_option("--card-stats",
+        dest="show_card_statistics",
+        help="Parse all Metagame decks of the desired gameplay format (specified with the -F flag) and list the cards played in the most Metagame decks, with their total copies, average price and total value across the Metagame. The statistics are kept up to date as decks are fetched and evicted, so they never require re-reading every cached deck.",
+        action='store_const',
+        const=True)
+    parser.add_option("--card-stats-sort",
+        dest="card_statistics_sort",
+        type="choice",
+        choices=sorted(CARD_STATISTICS_SORT_KEYS.keys()),
+        default="decks",
+        help="What the card statistics are ranked by: decks | copies | value [default: %default]")
+    parser.add_option("-s", "--similar",
+        dest="find_similar_decks",
+        help="Parse all Metagame decks of the desired gameplay format (specified with the -F flag) and run a \"Similar Decks\" analysis as described in the README, listing the Metagame decks closest to each deck in desired_decks.txt as well as clusters of near-duplicate Metagame decks.",
+        action='store_const',
+        const=True)
+    parser.add_option("--similarity-weight",
+        dest="similarity_weighting",
+        type="choice",
+        choices=[SIMILARITY_WEIGHT_BY_QUANTITY, SIMILARITY_WEIGHT_BY_PRICE],
+        default=SIMILARITY_WEIGHT_BY_QUANTITY,
+        help="Whether the Similar Decks analysis weighs each card by its quantity or by its total price: quantity | price [default: %default]")
     parser.add_option("-o", "--online",
         dest="use_online_price",
         help="If this flag is specified, all designated analyses will be run using the online (tix) value of cards instead of paper value",
@@ -1002,12 +4636,112 @@ if __name__ == "__main__":
         const=True)
     parser.add_option("-f", "--file",
         dest="print_to_file",
-        help="Informs the script to print all reports to a .txt file. The file name will be of the format: deck_report_MM_DD_YYYY.txt, overwriting any existing report with the same file name.",
+        help="Informs the script to print all reports to a file. The file name will be of the format: deck_report_MM_DD_YYYY.<ext>, where <ext> depends on the report format (\"txt\" for text reports), overwriting any existing report with the same file name.",
+        action='store_const',
+        const=True)
+    parser.add_option("--report-format",
+        dest="report_format",
+        type="choice",
+        choices=sorted(REPORT_FILE_EXTENSIONS.keys()),
+        default="text",
+        help="The format reports are rendered in: text | json | csv | parquet. The \"parquet\" format requires the pyarrow library and is always written to a file [default: %default]")
+    parser.add_option("--show-browser",
+        dest="show_browser",
+        help="Show the browser window while fetching decks instead of running it headless",
+        action='store_const',
+        const=True)
+    parser.add_option("--load-all-resources",
+        dest="load_all_resources",
+        help="Let the browser load images, stylesheets, web fonts and third-party hosts while fetching decks. By default they are blocked, as only the text of each page is read",
+        action='store_const',
+        const=True)
+    parser.add_option("--cache-max-decks",
+        dest="cache_max_decks",
+        type="int",
+        help="Keep at most this many decks in the deck cache, evicting the least recently used decks first. Decks used by the current run are never evicted")
+    parser.add_option("--cache-max-size",
+        dest="cache_max_size_mb",
+        type="float",
+        help="Keep the deck cache below this size in megabytes, evicting the least recently used decks first. Decks used by the current run are never evicted")
+    parser.add_option("--cache-evict-unused-days",
+        dest="cache_max_unused_days",
+        type="float",
+        help="Evict cached decks that haven't been used by any run for this many days, such as decks that dropped off the Metagame and Budget landing pages")
+    parser.add_option("--migrate-cache",
+        dest="migrate_cache",
+        help="Convert every deck in the deck cache that was saved by an older version of this script to the current cache format, then exit. Decks are otherwise converted the first time they are loaded",
+        action='store_const',
+        const=True)
+    parser.add_option("--queue",
+        dest="fetch_queue_file_path",
+        help="Fetch decks through the shared work queue in this SQLite file, together with any fetch workers started with \"--worker\" on this or other machines. Every machine must share the queue file and the deck_cache directory.")
+    parser.add_option("--worker",
+        dest="run_as_fetch_worker",
+        help="Run as a fetch worker for the queue given with \"--queue\": fetch queued decks into the deck cache until stopped with Ctrl+C, instead of running any analysis",
+        action='store_const',
+        const=True)
+    parser.add_option("--min-concurrency",
+        dest="min_in_flight",
+        type="int",
+        default=FETCH_MIN_IN_FLIGHT,
+        help="The fewest decks fetched at once. The number of fetches in flight starts here and is adjusted between the minimum and maximum based on how fast and how reliably MTGGoldfish.com responds [default: %default]")
+    parser.add_option("--max-concurrency",
+        dest="max_in_flight",
+        type="int",
+        default=FETCH_MAX_IN_FLIGHT,
+        help="The most decks fetched at once. Each concurrent fetch may launch its own browser [default: %default]")
+    parser.add_option("--base-url",
+        dest="base_url",
+        help="Fetch everything from this base URL instead of %s, such as a local stand-in server for testing" % (MTGGOLDFISH_DEFAULT_BASE_URL))
+    parser.add_option("-c", "--cache-only",
+        dest="cache_only",
+        help="Never touch the network. All decks, as well as the Metagame and Budget deck lists, are loaded from the cache of previous runs. If anything required is missing from the cache, the script exits immediately with a non-zero exit code. Useful for scripted runs, such as under cron.",
+        action='store_const',
+        const=True)
+    parser.add_option("--owned-cards",
+        dest="owned_cards_file_path",
+        help="Import owned cards from this file instead of owned_cards.txt. Besides the owned_cards.txt syntax, lines such as \"4x Scalding Tarn [ZEN]\" and CSV collection exports with a quantity and a name column are understood.")
+    parser.add_option("-C", "--collection",
+        dest="collection_file_paths",
+        action="append",
+        help="Evaluate this collection file instead of owned_cards.txt. Give the flag once per collection to evaluate several collections against the same decks in a single run, with a separate report for each, named after its file")
+    parser.add_option("--merge-duplicates",
+        dest="merge_duplicates",
+        help="If a card is listed more than once in the owned cards, add its quantities together instead of exiting",
+        action='store_const',
+        const=True)
+    parser.add_option("-d", "--daemon",
+        dest="run_as_daemon",
+        help="Keep all desired, Metagame and Budget decks of the desired format resident in memory and answer Owned Cards, Recommendation and Budget queries over a local HTTP API instead of running once. See the README for the endpoints.",
         action='store_const',
         const=True)
+    parser.add_option("--port",
+        dest="daemon_port",
+        type="int",
+        default=8765,
+        help="The localhost port the daemon listens on [default: %default]")
+    parser.add_option("--refresh-interval",
+        dest="refresh_interval_minutes",
+        type="int",
+        default=60,
+        help="How often, in minutes, the daemon refreshes its resident deck data [default: %default]")
     (options, args) = parser.parse_args()
 
-    owned_cards = parse_owned_cards()
+    if options.base_url:
+        MTGGOLDFISH_BASE_URL = options.base_url.rstrip('/')
+
+    if options.collection_file_paths and options.owned_cards_file_path:
+        print("\n[ERROR] The \"--collection\" and \"--owned-cards\" flags cannot be combined, list every collection with \"--collection\" instead. Exiting")
+        sys.exit(1)
+
+    # Every collection is evaluated against the same decks. Without the "--collection" flag there is only one, owned_cards.txt
+    if options.collection_file_paths:
+        collections = []
+        for collection_file_path in options.collection_file_paths:
+            collection_name = get_collection_name(collection_file_path, [collection_name for (collection_name, owned_cards) in collections])
+            collections.append((collection_name, parse_owned_cards(collection_file_path, options.merge_duplicates)))
+    else:
+        collections = [(None, parse_owned_cards(options.owned_cards_file_path, options.merge_duplicates))]
     desired_deck_URLs = parse_desired_deck_URLs()
 
     # Sanitize Format input
@@ -1017,57 +4751,136 @@ if __name__ == "__main__":
             options.desired_format)
         sys.exit(0)
 
+    if options.show_browser:
+        BROWSER_HEADLESS = False
+    if options.load_all_resources:
+        BROWSER_BLOCK_RESOURCES = False
+
+    if options.min_in_flight < 1 or options.max_in_flight < options.min_in_flight:
+        print("\n[ERROR] \"--min-concurrency\" must be at least 1 and no more than \"--max-concurrency\". Exiting")
+        sys.exit(1)
+    FETCH_MIN_IN_FLIGHT = options.min_in_flight
+    FETCH_MAX_IN_FLIGHT = options.max_in_flight
+
+    if options.spend_limit is not None and options.spend_limit < 0:
+        print("\n[ERROR] The spend limit cannot be negative. Exiting")
+        sys.exit(1)
+
+    if options.cache_only and options.update_cache:
+        print("\n[ERROR] The \"-c\" and \"-u\" flags cannot be combined, as updating the cache requires fetching from the network. Exiting")
+        sys.exit(1)
+
+    cache_max_size_bytes = None
+    if options.cache_max_size_mb is not None:
+        cache_max_size_bytes = int(options.cache_max_size_mb * 1024 * 1024)
+    DECK_CACHE.configure(options.cache_max_decks, cache_max_size_bytes, options.cache_max_unused_days)
+
+    if options.migrate_cache:
+        print("\nConverting cached decks to the current cache format...")
+        (num_converted_decks, num_current_decks, num_unreadable_decks) = DECK_CACHE.migrate()
+        print("   Converted %s decks. %s decks were already in the current format and %s could not be read." % (
+            num_converted_decks, num_current_decks, num_unreadable_decks))
+        sys.exit(0)
+
+    if options.run_as_fetch_worker and not options.fetch_queue_file_path:
+        print("\n[ERROR] The \"--worker\" flag requires the \"--queue\" flag. Exiting")
+        sys.exit(1)
+
+    fetch_queue = None
+    if options.fetch_queue_file_path:
+        if options.cache_only:
+            print("\n[ERROR] The \"-c\" and \"--queue\" flags cannot be combined, as the queue is only used for fetching from the network. Exiting")
+            sys.exit(1)
+        fetch_queue = FetchQueue(options.fetch_queue_file_path)
+
+    if options.run_as_fetch_worker:
+        run_fetch_worker(fetch_queue)
+        sys.exit(0)
+
+    if options.run_as_daemon:
+        run_daemon(ResidentDeckSet(options.desired_format.lower(), options.use_online_price, options.cache_only),
+                   options.daemon_port, options.refresh_interval_minutes)
+        sys.exit(0)
+
     (url_for_meta_decks, url_for_budget_decks) = determine_meta_and_budget_URLs(
         options.desired_format, options.use_online_price)
 
     start_time = time.time()
-    print("\nFetching Deck information for decks listed in desired_decks.txt.")
-    desired_decks = parse_decks_from_list_of_urls(
-        options.update_cache, desired_deck_URLs, options.use_online_price)
+
+    # Every deck the run needs is collected into a single plan first, so that each unique deck is only fetched once
+    deck_fetch_plan = DeckFetchPlan()
+    deck_fetch_plan.add_view(DECK_VIEW_DESIRED, desired_deck_URLs, DECK_VIEW_PRIORITIES[DECK_VIEW_DESIRED])
 
     # If the User hasn't specified any cards in owned_cards.txt, then the only other reason to run this script at all is
-    # to generate a report on the Budget Decks from MTGGoldfish.com. So that's what we will do.
-    no_owned_cards_in_list = (len(
-        owned_cards) == 1 and owned_cards[0][CARD_NAME_KEY] == "name of card that doesn't exist") or len(
-        owned_cards) == 0
+    # to generate a report on the Budget Decks from MTGGoldfish.com. So that's what we will do. In a batch, the analyses
+    # that need owned cards are only skipped if no collection has any
+    collections_without_owned_cards = [is_owned_cards_list_empty(owned_cards) for (collection_name, owned_cards) in collections]
+    no_owned_cards_in_list = all(collections_without_owned_cards)
     should_run_budget_analysis = False
-    if options.parse_budget or no_owned_cards_in_list:
+    if options.parse_budget or any(collections_without_owned_cards):
         should_run_budget_analysis = True
-    if should_run_budget_analysis and len(desired_decks) == 0:
+    if options.plan_buy_path and deck_fetch_plan.get_view_size(DECK_VIEW_DESIRED) == 0:
+        print(
+            "\n[ERROR] Buy Path analysis requested but there are no decks listed in desired_decks.txt. Exiting")
+        sys.exit(0)
+    if should_run_budget_analysis and deck_fetch_plan.get_view_size(DECK_VIEW_DESIRED) == 0:
         print(
             "\n[ERROR] Budget Analysis implied but there are no decks listed in desired_decks.txt. Exiting")
         sys.exit(0)
 
-    # Perform Metagame Recommendation Analysis if desired
-    metagame_decks = []
-    if options.recommend_meta_decks:
-
-        # We can't recommend meta decks if the User supplied no cards
-        if no_owned_cards_in_list:
-            print(
-                "\n[ERROR]: Recommend flag set, but no cards provided in owned_cards.txt. Skipping")
+    # Perform Metagame Recommendation and/or Similarity Analysis if desired
+    # We can't recommend meta decks if the User supplied no cards
+    if options.recommend_meta_decks and no_owned_cards_in_list:
+        print(
+            "\n[ERROR]: Recommend flag set, but no cards provided in owned_cards.txt. Skipping")
+    should_recommend_meta_decks = options.recommend_meta_decks and not no_owned_cards_in_list
+    metagame_analyses = []
+    if should_recommend_meta_decks:
+        metagame_analyses.append(("Recommend", "Recommendation"))
+    if options.find_similar_decks:
+        metagame_analyses.append(("Similar", "Similarity"))
+    if options.rank_cards_to_buy_next:
+        metagame_analyses.append(("Buy Next", "What To Buy Next"))
+    if options.spend_limit is not None:
+        metagame_analyses.append(("Spend Limit", "Completion Plan"))
+    if options.show_card_statistics:
+        metagame_analyses.append(("Card Stats", "Card Statistics"))
+    meta_shares = {}
+    if len(metagame_analyses) > 0:
+        flag_names = " and ".join([flag_name for (flag_name, analysis_name) in metagame_analyses])
+        analysis_names = " and ".join([analysis_name for (flag_name, analysis_name) in metagame_analyses])
+        if len(metagame_analyses) == 1:
+            status_msg = "\n%s flag set. " % (flag_names)
         else:
-            print("\nRecommend flag set. Fetching Deck information of all %s Metagame decks for Recommendation analysis..." %
-                options.desired_format)
-            metagame_urls_list = parse_deck_urls_from_category_landing_page(
-                url_for_meta_decks)
-            metagame_decks = parse_decks_from_list_of_urls(
-                options.update_cache, metagame_urls_list, options.use_online_price)
+            status_msg = "\n%s flags set. " % (flag_names)
+        print(status_msg + "Collecting all %s Metagame decks for %s analysis..." %
+            (options.desired_format, analysis_names))
+        metagame_urls_list = run_fetch_or_exit(parse_deck_urls_from_category_landing_page,
+            url_for_meta_decks, options.cache_only, meta_shares)
+        deck_fetch_plan.add_view(DECK_VIEW_METAGAME, metagame_urls_list, DECK_VIEW_PRIORITIES[DECK_VIEW_METAGAME])
 
     # Perform Budget Analysis if desired
-    budget_decks = []
-    if should_run_budget_analysis and len(url_for_budget_decks) > 0:
+    if (should_run_budget_analysis or options.plan_buy_path) and len(url_for_budget_decks) > 0:
         status_msg = ""
         if options.parse_budget is True:
             status_msg = "\nBudget flag set. "
+        elif options.plan_buy_path and not no_owned_cards_in_list:
+            status_msg = "\nBuy Path flag set. "
         else:
             status_msg = "\nowned_cards.txt was empty. "
-        print(status_msg + "Fetching Deck information of all %s Budget decks for budget analysis..." %
+        print(status_msg + "Collecting all %s Budget decks for budget analysis..." %
             options.desired_format)
-        budget_decks_url_list = parse_deck_urls_from_category_landing_page(
-            url_for_budget_decks)
-        budget_decks = parse_decks_from_list_of_urls(
-            options.update_cache, budget_decks_url_list, options.use_online_price)
+        budget_decks_url_list = run_fetch_or_exit(parse_deck_urls_from_category_landing_page,
+            url_for_budget_decks, options.cache_only)
+        deck_fetch_plan.add_view(DECK_VIEW_BUDGET, budget_decks_url_list, DECK_VIEW_PRIORITIES[DECK_VIEW_BUDGET])
+
+    print("\nFetching Deck information of %s unique decks (%s desired, %s Metagame and %s Budget decks)." % (
+        deck_fetch_plan.get_unique_deck_count(), deck_fetch_plan.get_view_size(DECK_VIEW_DESIRED),
+        deck_fetch_plan.get_view_size(DECK_VIEW_METAGAME), deck_fetch_plan.get_view_size(DECK_VIEW_BUDGET)))
+    run_fetch_or_exit(deck_fetch_plan.fetch, options.update_cache, options.use_online_price, options.cache_only, fetch_queue)
+    desired_decks = deck_fetch_plan.get_decks(DECK_VIEW_DESIRED)
+    metagame_decks = deck_fetch_plan.get_decks(DECK_VIEW_METAGAME)
+    budget_decks = deck_fetch_plan.get_decks(DECK_VIEW_BUDGET)
 
     # Print a statement about the time it took to perform the fetches
     remaining_seconds = (time.time() - start_time)
@@ -1076,33 +4889,104 @@ if __name__ == "__main__":
         num_minutes = remaining_seconds / 60
         remaining_seconds -= (num_minutes * 60)
     print("\nDone fetching all Deck information. Fetch took %d minutes and %d seconds" % (
-        num_minutes, remaining_seconds))          
+        num_minutes, remaining_seconds))
+
+    # The card statistics of the format follow whichever Metagame decks are listed right now
+    card_statistics_format_key = get_card_statistics_format_key(options.desired_format.lower(), options.use_online_price)
+    if len(metagame_decks) > 0:
+        CARD_STATISTICS.sync_format(card_statistics_format_key, metagame_decks)
+    evict_from_deck_cache()
+
+    # A single collection re-uses the results of the previous run for every deck the changes to the owned cards don't affect,
+    # while a batch of collections is scored against the decks in a single pass
+    owned_cards_lists = [owned_cards for (collection_name, owned_cards) in collections]
+    evaluation_cache = None
+    batch_evaluator = None
+    if len(collections) == 1:
+        evaluation_cache = EvaluationCache(owned_cards_lists[0])
+    else:
+        batch_evaluator = CollectionBatchEvaluator(desired_decks, metagame_decks, budget_decks)
 
     if not no_owned_cards_in_list and len(desired_decks) != 0:
         print("\nComputing Owned Cards evaluations...")
-        owned_cards_overlap_report = evaluate_owned_cards(
-            desired_decks, owned_cards)
+        if batch_evaluator is None:
+            owned_cards_overlap_reports = [evaluate_owned_cards(
+                desired_decks, owned_cards_lists[0], evaluation_cache)]
+        else:
+            owned_cards_overlap_reports = batch_evaluator.evaluate_owned_cards(owned_cards_lists)
 
     # We can't recommend meta decks if the User supplied no cards
     if options.recommend_meta_decks and not no_owned_cards_in_list:
         print("\nComputing %s Metagame Deck Recommendation evaluations..." %
             options.desired_format)
-        metagame_deck_recommendation_report = evaluate_metagame_decks(
-            metagame_decks, owned_cards)
+        if batch_evaluator is None:
+            metagame_deck_recommendation_reports = [evaluate_metagame_decks(
+                metagame_decks, owned_cards_lists[0], evaluation_cache)]
+        else:
+            metagame_deck_recommendation_reports = batch_evaluator.evaluate_metagame_decks(owned_cards_lists)
+
+    if options.plan_buy_path and len(budget_decks) > 0:
+        print("\nComputing Cheapest Completion Path evaluations...")
+        if batch_evaluator is None:
+            buy_path_reports = [evaluate_cheapest_completion_paths(
+                owned_cards_lists[0], desired_decks, budget_decks)]
+        else:
+            buy_path_reports = batch_evaluator.evaluate_cheapest_completion_paths(owned_cards_lists)
+
+    if options.rank_cards_to_buy_next:
+        print("\nComputing %s What To Buy Next rankings..." %
+            options.desired_format)
+        if batch_evaluator is None:
+            buy_next_reports = [rank_cards_to_buy_next(
+                metagame_decks, owned_cards_lists[0], meta_shares)]
+        else:
+            buy_next_reports = batch_evaluator.rank_cards_to_buy_next(owned_cards_lists, meta_shares)
+
+    if options.spend_limit is not None:
+        print("\nComputing %s Spend Limit Completion Plans..." %
+            options.desired_format)
+        deck_completion_planner = DeckCompletionPlanner(desired_decks + metagame_decks)
+        spend_plan_reports = [deck_completion_planner.plan(
+            owned_cards, options.spend_limit) for owned_cards in owned_cards_lists]
+
+    if options.show_card_statistics:
+        card_statistics_report = CARD_STATISTICS.get_top_cards(
+            card_statistics_format_key, CARD_STATISTICS_SORT_KEYS[options.card_statistics_sort])
 
-    if should_run_budget_analysis and len(budget_decks) == 0:
-        print("\n[ERROR]: There aren't any Budget decks for %s to run an analysis on. Skipping Budget analysis." %
+    if options.find_similar_decks:
+        print("\nComputing %s Metagame Deck Similarity evaluations..." %
+            options.desired_format)
+        similarity_index = DeckSimilarityIndex(options.similarity_weighting)
+        similarity_index.sync_decks(metagame_decks)
+        similar_decks_report = evaluate_similar_decks(
+            desired_decks, similarity_index)
+        metagame_deck_clusters = similarity_index.find_deck_clusters()
+
+    if (should_run_budget_analysis or options.plan_buy_path) and len(budget_decks) == 0:
+        print("\n[ERROR]: There aren't any Budget decks for %s to run an analysis on. Skipping Budget and Buy Path analyses." %
                 options.desired_format)
 
     if should_run_budget_analysis and len(budget_decks) > 0:
         print("\nComputing Budget Deck List evaluations...")
-        budget_deck_report = evaluate_budget_decks(
-            owned_cards, desired_decks, budget_decks)
+        if batch_evaluator is None:
+            budget_deck_reports = [evaluate_budget_decks(
+                owned_cards_lists[0], desired_decks, budget_decks, evaluation_cache)]
+        else:
+            budget_deck_reports = batch_evaluator.evaluate_budget_decks(owned_cards_lists)
+
+    if evaluation_cache is not None:
+        if evaluation_cache.reused_result_count > 0:
+            print("\n%d of %d deck evaluations were re-used from the previous run." % (
+                evaluation_cache.reused_result_count, evaluation_cache.reused_result_count + evaluation_cache.evaluated_result_count))
+        evaluation_cache.save()
+
+    # Parquet can't be written to the terminal, so it always goes to a file
+    if options.report_format == 'parquet':
+        options.print_to_file = True
 
-    report_output_file_name = ""
     if options.print_to_file:
 
-        # Generate an output file with today's date, and open it for appending
+        # Generate an output file with today's date. It is opened for writing, so any report already generated today is replaced
         todays_date = datetime.now()
         month = todays_date.month
         day = todays_date.day
@@ -1110,51 +4994,84 @@ if __name__ == "__main__":
             month = "0%s" % (todays_date.month)
         if day <= 9:
             day = "0%s" % (todays_date.day)
-        report_file_name = "deck_report_%s_%s_%s.txt" % (
-            month, day, todays_date.year)
-
-        script_dir = os.path.dirname(__file__)
-
-        # If we've already generated a report today, we don't want to continue appending to that existing report, so we remove it
-        if os.path.isfile(os.path.join(script_dir, report_file_name)):
-            os.remove(os.path.join(script_dir, report_file_name))
-        report_output_file_name = os.path.join(script_dir, report_file_name)
+        report_file_date = "%s_%s_%s" % (month, day, todays_date.year)
 
         print("Generating report...")
-    else:
+    elif options.report_format == 'text':
         print("")
         print("============================================")
         print("================ Report(s) =================")
         print("============================================")
 
-    analysis_has_been_performed = False
-    if not no_owned_cards_in_list and len(desired_decks) != 0:
-        analysis_has_been_performed = True
-        print_owned_cards_evaluation_report(
-            report_output_file_name, desired_decks, owned_cards_overlap_report, options.use_online_price)
-
-    if options.recommend_meta_decks and not no_owned_cards_in_list:
-        analysis_has_been_performed = True
-        print_metagame_deck_recommendation_report(
-            report_output_file_name, metagame_deck_recommendation_report, options.use_online_price)
-
-    if should_run_budget_analysis and len(budget_decks) > 0:
-        analysis_has_been_performed = True
-        print_budget_evaluation_report(
-            report_output_file_name, desired_decks, budget_deck_report, options.use_online_price)
+    desired_decks_by_name = dict((desired_deck.get_deck_name().lower(), desired_deck) for desired_deck in desired_decks)
 
-    if options.print_to_file and analysis_has_been_performed:
-        todays_date = datetime.now()
-        month = todays_date.month
-        day = todays_date.day
-        if month <= 9:
-            month = "0%s" % (todays_date.month)
-        if day <= 9:
-            day = "0%s" % (todays_date.day)
-        print("Report has been printed to file: \"deck_report_%s_%s_%s.txt\"" %
-              (month, day, todays_date.year))
+    # Every collection gets its own report. The report file of each collection in a batch is named after the collection
+    for (collection_position, (collection_name, owned_cards)) in enumerate(collections):
+        collection_has_no_owned_cards = collections_without_owned_cards[collection_position]
 
-    if not analysis_has_been_performed:
-        print("No analysis was performed during this run due to the data that was fetched/provided being insufficient. Try again with different data.")
+        report_output_file_name = ""
+        if options.print_to_file:
+            if collection_name is None:
+                report_file_name = "deck_report_%s.%s" % (report_file_date, REPORT_FILE_EXTENSIONS[options.report_format])
+            else:
+                report_file_name = "deck_report_%s_%s.%s" % (collection_name, report_file_date, REPORT_FILE_EXTENSIONS[options.report_format])
+            script_dir = os.path.dirname(__file__)
+            report_output_file_name = os.path.join(script_dir, report_file_name)
+        elif collection_name is not None and options.report_format == 'text':
+            print("\n================ Collection: %s ================" % (collection_name))
+
+        report = Report(options.use_online_price)
+
+        analysis_has_been_performed = False
+        if not collection_has_no_owned_cards and len(desired_decks) != 0:
+            analysis_has_been_performed = True
+            add_owned_cards_report_section(
+                report, desired_decks_by_name, owned_cards_overlap_reports[collection_position])
+
+        if options.recommend_meta_decks and not collection_has_no_owned_cards:
+            analysis_has_been_performed = True
+            add_metagame_deck_recommendation_report_section(
+                report, metagame_deck_recommendation_reports[collection_position])
+
+        if (options.parse_budget or collection_has_no_owned_cards) and len(budget_decks) > 0:
+            analysis_has_been_performed = True
+            add_budget_evaluation_report_section(
+                report, desired_decks_by_name, budget_deck_reports[collection_position])
+
+        if options.plan_buy_path and len(budget_decks) > 0:
+            analysis_has_been_performed = True
+            add_cheapest_completion_path_report_section(
+                report, desired_decks_by_name, buy_path_reports[collection_position])
+
+        if options.rank_cards_to_buy_next and len(metagame_decks) > 0:
+            analysis_has_been_performed = True
+            add_buy_next_report_section(
+                report, buy_next_reports[collection_position])
+
+        if options.spend_limit is not None:
+            analysis_has_been_performed = True
+            add_spend_plan_report_section(
+                report, spend_plan_reports[collection_position])
+
+        if options.show_card_statistics and len(metagame_decks) > 0:
+            analysis_has_been_performed = True
+            add_card_statistics_report_section(
+                report, card_statistics_report)
+
+        if options.find_similar_decks and len(metagame_decks) > 0:
+            analysis_has_been_performed = True
+            add_similar_decks_report_section(
+                report, similar_decks_report)
+            add_deck_clusters_report_section(
+                report, metagame_deck_clusters)
+
+        if analysis_has_been_performed:
+            render_report(report, options.report_format, report_output_file_name)
+
+        if options.print_to_file and analysis_has_been_performed:
+            print("Report has been printed to file: \"%s\"" % (report_file_name))
+
+        if not analysis_has_been_performed:
+            print("No analysis was performed during this run due to the data that was fetched/provided being insufficient. Try again with different data.")
 
     sys.exit(0)
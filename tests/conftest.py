@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mtggoldfish
+
+
+"""
+Build a Deck from a list of (card name, quantity, individual card price) tuples. Card names are interned the way the deck
+parsers intern them, and the deck is priced with paper prices read from its full deck page unless told otherwise.
+"""
+def build_deck(deck_id, cards, deck_name=None, price_type=mtggoldfish.PRICE_TYPE_PAPER, page_hash='page', prices_fetched_time=None):
+    deck = mtggoldfish.Deck()
+    deck.deck_name = deck_name or "Deck %s" % (deck_id)
+    deck.deck_url = "https://www.mtggoldfish.com/deck/%s#paper" % (deck_id)
+    deck.deck_list = [{mtggoldfish.CARD_NAME_KEY: mtggoldfish.CARD_NAMES.intern_card_name(card_name), mtggoldfish.CARD_QTY_KEY: card_quantity,
+                       mtggoldfish.CARD_PRICE_KEY: card_price} for (card_name, card_quantity, card_price) in cards]
+    deck.deck_price = sum([card_quantity * card_price for (card_name, card_quantity, card_price) in cards])
+    deck.price_type = price_type
+    deck.page_hash = page_hash
+    deck.prices_fetched_time = prices_fetched_time
+    return deck
+
+
+"""
+Point the deck cache and the card statistics at an empty directory for the duration of a test
+"""
+@pytest.fixture
+def deck_cache(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('deck_cache'))
+    cache = mtggoldfish.DeckCache(cache_dir)
+    monkeypatch.setattr(mtggoldfish, 'DECK_CACHE', cache)
+    monkeypatch.setattr(mtggoldfish, 'CARD_STATISTICS', mtggoldfish.CardStatistics(os.path.join(cache_dir, mtggoldfish.CARD_STATISTICS_FILE_NAME)))
+    monkeypatch.setattr(mtggoldfish, 'SHOW_PROGRESS_BARS', False)
+    return cache
@@ -0,0 +1,104 @@
+import random
+
+import mtggoldfish
+from conftest import build_deck
+
+
+PAPER_FORMAT_KEY = mtggoldfish.get_card_statistics_format_key('modern', False)
+ONLINE_FORMAT_KEY = mtggoldfish.get_card_statistics_format_key('modern', True)
+
+
+def build_random_deck(deck_id, randomizer):
+    return build_deck(deck_id, [("Card %d" % (card_index), randomizer.randint(1, 4), round(randomizer.uniform(0.1, 30.0), 2))
+                                for card_index in randomizer.sample(range(50), 12)])
+
+
+"""
+Compute the statistics of a format from scratch, to compare the incrementally maintained ones against
+"""
+def recompute_top_cards(tmpdir, decks_list):
+    card_statistics = mtggoldfish.CardStatistics(str(tmpdir.join('recomputed_card_statistics')))
+    card_statistics.sync_format(PAPER_FORMAT_KEY, decks_list)
+    return card_statistics.get_top_cards(PAPER_FORMAT_KEY, mtggoldfish.DECKS_USING_KEY, 1000)
+
+
+def assert_same_top_cards(top_cards, expected_top_cards):
+    assert [card_name for (card_name, card_statistics) in top_cards] == [card_name for (card_name, card_statistics) in expected_top_cards]
+    for ((card_name, card_statistics), (expected_card_name, expected_card_statistics)) in zip(top_cards, expected_top_cards):
+        for (statistic_key, expected_value) in expected_card_statistics.items():
+            assert abs(card_statistics[statistic_key] - expected_value) < 1e-6
+
+
+def test_incremental_updates_match_full_recompute(tmpdir, deck_cache):
+    randomizer = random.Random(3)
+    statistics_file_path = str(tmpdir.join('card_statistics'))
+    card_statistics = mtggoldfish.CardStatistics(statistics_file_path)
+    decks_by_id = dict((str(deck_id), build_random_deck(deck_id, randomizer)) for deck_id in range(30))
+    card_statistics.sync_format(PAPER_FORMAT_KEY, list(decks_by_id.values()))
+
+    for step in range(200):
+        operation = randomizer.random()
+        if operation < 0.3:
+            deck_id = str(randomizer.randrange(60))
+            decks_by_id[deck_id] = build_random_deck(deck_id, randomizer)
+            card_statistics.sync_format(PAPER_FORMAT_KEY, list(decks_by_id.values()))
+        elif operation < 0.5 and len(decks_by_id) > 0:
+            deck_id = randomizer.choice(sorted(decks_by_id))
+            decks_by_id[deck_id] = build_random_deck(deck_id, randomizer)
+            card_statistics.refresh_deck(deck_id, decks_by_id[deck_id])
+        elif operation < 0.7 and len(decks_by_id) > 0:
+            deck_id = randomizer.choice(sorted(decks_by_id))
+            del decks_by_id[deck_id]
+            card_statistics.remove_deck(deck_id)
+        else:
+            card_statistics.save()
+            card_statistics = mtggoldfish.CardStatistics(statistics_file_path)
+
+        assert card_statistics.get_deck_count(PAPER_FORMAT_KEY) == len(decks_by_id)
+        assert_same_top_cards(card_statistics.get_top_cards(PAPER_FORMAT_KEY, mtggoldfish.DECKS_USING_KEY, 1000),
+                              recompute_top_cards(tmpdir, list(decks_by_id.values())))
+
+
+def test_statistics_of_a_card():
+    card_statistics = mtggoldfish.CardStatistics('unused')
+    card_statistics.formats = {}
+    card_statistics.sync_format(PAPER_FORMAT_KEY, [build_deck('1', [('Lightning Bolt', 4, 1.0), ('Goblin Guide', 4, 3.0)]),
+                                                   build_deck('2', [('Lightning Bolt', 2, 2.0)])])
+
+    top_cards = card_statistics.get_top_cards(PAPER_FORMAT_KEY, mtggoldfish.TOTAL_COPIES_KEY)
+    assert [card_name for (card_name, statistics) in top_cards] == ['Lightning Bolt', 'Goblin Guide']
+    lightning_bolt_statistics = top_cards[0][1]
+    assert lightning_bolt_statistics[mtggoldfish.DECKS_USING_KEY] == 2
+    assert lightning_bolt_statistics[mtggoldfish.PLAY_RATE_KEY] == 1.0
+    assert lightning_bolt_statistics[mtggoldfish.TOTAL_COPIES_KEY] == 6
+    assert lightning_bolt_statistics[mtggoldfish.CARD_PRICE_KEY] == 1.5
+    assert lightning_bolt_statistics[mtggoldfish.TOTAL_VALUE_KEY] == 8.0
+    assert lightning_bolt_statistics[mtggoldfish.WEIGHTED_VALUE_KEY] == 4.0
+
+
+def test_decks_with_other_price_type_are_refused(deck_cache):
+    card_statistics = mtggoldfish.CARD_STATISTICS
+    paper_deck = build_deck('1', [('Lightning Bolt', 4, 1.0)])
+    online_deck = build_deck('1', [('Lightning Bolt', 4, 0.05)], price_type=mtggoldfish.PRICE_TYPE_ONLINE)
+    assert card_statistics.sync_format(PAPER_FORMAT_KEY, [paper_deck]) == 1
+    assert card_statistics.sync_format(ONLINE_FORMAT_KEY, [paper_deck]) == 0
+
+    # An online run re-saving the deck with tix prices leaves its paper statistics alone
+    deck_cache.save(online_deck, '1')
+    assert card_statistics.sync_format(PAPER_FORMAT_KEY, [online_deck]) == 0
+    assert card_statistics.get_top_cards(PAPER_FORMAT_KEY)[0][1][mtggoldfish.CARD_PRICE_KEY] == 1.0
+    assert card_statistics.get_deck_count(ONLINE_FORMAT_KEY) == 0
+
+
+def test_evicted_decks_are_removed(deck_cache):
+    deck_cache.configure(max_decks=1)
+    decks = [build_deck('1', [('Lightning Bolt', 4, 1.0)]), build_deck('2', [('Goblin Guide', 4, 3.0)])]
+    for deck in decks:
+        deck_cache.save(deck, mtggoldfish.get_deck_id_from_url(deck.get_deck_url()))
+    mtggoldfish.CARD_STATISTICS.sync_format(PAPER_FORMAT_KEY, decks)
+    deck_cache.deck_ids_used_by_this_run = set(['2'])
+
+    deck_cache.evict()
+
+    assert mtggoldfish.CARD_STATISTICS.get_deck_count(PAPER_FORMAT_KEY) == 1
+    assert [card_name for (card_name, statistics) in mtggoldfish.CARD_STATISTICS.get_top_cards(PAPER_FORMAT_KEY)] == ['Goblin Guide']
@@ -0,0 +1,36 @@
+import random
+
+import mtggoldfish
+from conftest import build_deck
+
+
+def build_random_decks(randomizer, first_deck_id, num_decks):
+    return [build_deck(str(deck_id), [("Card %d" % (card_index), randomizer.randint(1, 4), round(randomizer.uniform(0.1, 30.0), 2))
+                                      for card_index in randomizer.sample(range(60), 12)])
+            for deck_id in range(first_deck_id, first_deck_id + num_decks)]
+
+
+def build_random_collection(randomizer):
+    return [{mtggoldfish.CARD_NAME_KEY: "Card %d" % (card_index), mtggoldfish.CARD_QTY_KEY: randomizer.randint(1, 4)}
+            for card_index in randomizer.sample(range(60), 20)]
+
+
+def test_batch_matches_single_collections(monkeypatch):
+    monkeypatch.setattr(mtggoldfish, 'SHOW_PROGRESS_BARS', False)
+    randomizer = random.Random(7)
+    desired_decks = build_random_decks(randomizer, 0, 3)
+    metagame_decks = build_random_decks(randomizer, 100, 15)
+    budget_decks = build_random_decks(randomizer, 200, 25)
+    meta_shares = dict((str(deck_id), randomizer.uniform(0.01, 0.1)) for deck_id in range(100, 110))
+    owned_cards_lists = [build_random_collection(randomizer) for collection_index in range(4)] + [[]]
+
+    batch_evaluator = mtggoldfish.CollectionBatchEvaluator(desired_decks, metagame_decks, budget_decks)
+
+    # Running each analysis twice checks that the indexes built by the first run are re-used as they are
+    for run in range(2):
+        assert batch_evaluator.evaluate_cheapest_completion_paths(owned_cards_lists) == [
+            mtggoldfish.evaluate_cheapest_completion_paths(owned_cards, desired_decks, budget_decks) for owned_cards in owned_cards_lists]
+        assert batch_evaluator.rank_cards_to_buy_next(owned_cards_lists, meta_shares) == [
+            mtggoldfish.rank_cards_to_buy_next(metagame_decks, owned_cards, meta_shares) for owned_cards in owned_cards_lists]
+    assert batch_evaluator.evaluate_budget_decks(owned_cards_lists) == [
+        mtggoldfish.evaluate_budget_decks(owned_cards, desired_decks, budget_decks) for owned_cards in owned_cards_lists]
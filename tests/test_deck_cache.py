@@ -0,0 +1,125 @@
+import os
+import pickle
+import time
+from datetime import datetime
+
+import pytest
+
+import mtggoldfish
+from conftest import build_deck
+
+
+DECK_CARDS = [('Goblin Guide', 4, 2.0), (u'Lim-Dûl\'s Vault', 1, 0.5), ('Lightning Bolt', 4, 1.25)]
+
+
+def get_card_tuples(deck):
+    return [(card_entry[mtggoldfish.CARD_NAME_KEY], card_entry[mtggoldfish.CARD_QTY_KEY], card_entry[mtggoldfish.CARD_PRICE_KEY])
+            for card_entry in deck.get_deck_list()]
+
+
+def build_dated_deck(deck_id, cards=DECK_CARDS, **kwargs):
+    deck = build_deck(deck_id, cards, **kwargs)
+    deck.deck_date = datetime(2017, 10, 5)
+    return deck
+
+
+@pytest.mark.parametrize('compression', [True, False])
+def test_deck_round_trips_through_the_codec(monkeypatch, compression):
+    monkeypatch.setattr(mtggoldfish, 'DECK_CACHE_COMPRESSION', compression)
+    deck = build_dated_deck('7', price_type=mtggoldfish.PRICE_TYPE_ONLINE, prices_fetched_time=1507200000.5)
+
+    cached_deck_data = mtggoldfish.encode_deck_for_cache(deck)
+    assert mtggoldfish.is_encoded_deck(cached_deck_data)
+    assert (cached_deck_data[:1] == mtggoldfish.DECK_FILE_ZLIB_HEADER) == compression
+    decoded_deck = mtggoldfish.decode_deck_from_cache(cached_deck_data)
+
+    # The deck list is only decoded once it is needed
+    assert decoded_deck.encoded_deck_list is not None
+    assert (decoded_deck.get_deck_name(), decoded_deck.get_deck_url(), decoded_deck.get_deck_date(), decoded_deck.get_deck_price()) == (
+        deck.get_deck_name(), deck.get_deck_url(), deck.get_deck_date(), deck.get_deck_price())
+    assert (decoded_deck.page_hash, decoded_deck.price_type, decoded_deck.prices_fetched_time) == ('page', mtggoldfish.PRICE_TYPE_ONLINE, 1507200000.5)
+    assert get_card_tuples(decoded_deck) == get_card_tuples(deck)
+    assert mtggoldfish.get_deck_hash(decoded_deck) == mtggoldfish.get_deck_hash(deck)
+
+
+def test_other_versions_are_refused():
+    cached_deck_data = mtggoldfish.encode_deck_for_cache(build_dated_deck('7'))
+    newer_deck_data = mtggoldfish.zlib.decompress(cached_deck_data).replace(
+        b'"Version": %d' % (mtggoldfish.DECK_FILE_VERSION), b'"Version": %d' % (mtggoldfish.DECK_FILE_VERSION + 1))
+
+    with pytest.raises(ValueError):
+        mtggoldfish.decode_deck_from_cache(newer_deck_data)
+    with pytest.raises(ValueError):
+        mtggoldfish.decode_deck_from_cache(b'{"Format": "something-else"}\n[]\n')
+
+
+def test_pickled_deck_is_only_read_by_migrate(deck_cache, capsys):
+    os.makedirs(deck_cache.cache_dir)
+    pickled_deck = build_dated_deck('7')
+    with open(os.path.join(deck_cache.cache_dir, '7_10_05_2017'), 'wb') as pickled_deck_file:
+        pickle.dump(pickled_deck, pickled_deck_file, pickle.HIGHEST_PROTOCOL)
+
+    assert not deck_cache.contains('7')
+    assert "[WARNING]" in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        deck_cache.load('7')
+
+    assert deck_cache.migrate() == (1, 0, 0)
+    assert deck_cache.contains('7')
+    assert deck_cache.get_cached_date('7') == datetime(2017, 10, 5)
+    assert get_card_tuples(deck_cache.load('7')) == get_card_tuples(pickled_deck)
+    assert deck_cache.migrate() == (0, 1, 0)
+
+
+def cache_decks_used_at(deck_cache, last_used_times):
+    for (deck_id, last_used_time) in sorted(last_used_times.items()):
+        deck_cache.save(build_dated_deck(deck_id), deck_id)
+    deck_cache.last_used_times.update(last_used_times)
+    deck_cache.deck_ids_used_by_this_run = set()
+
+
+def test_least_recently_used_decks_are_evicted_first(deck_cache):
+    now = time.time()
+    cache_decks_used_at(deck_cache, {'1': now - 300, '2': now - 100, '3': now - 400, '4': now - 200})
+    deck_cache.configure(max_decks=2)
+
+    assert deck_cache.evict() == 2
+    assert sorted(deck_cache.get_deck_ids()) == ['2', '4']
+    assert sorted(name for name in os.listdir(deck_cache.cache_dir) if mtggoldfish.is_deck_cache_file_name(name)) == [
+        mtggoldfish.get_deck_cache_file_name('2'), mtggoldfish.get_deck_cache_file_name('4')]
+
+
+def test_decks_used_by_this_run_are_never_evicted(deck_cache):
+    now = time.time()
+    cache_decks_used_at(deck_cache, {'1': now - 300, '2': now - 100, '3': now - 400})
+    deck_cache.deck_ids_used_by_this_run = set(['3'])
+    deck_cache.configure(max_decks=1)
+
+    assert deck_cache.evict() == 2
+    assert deck_cache.get_deck_ids() == ['3']
+
+
+def test_unused_decks_are_evicted_before_size_bounds(deck_cache):
+    now = time.time()
+    cache_decks_used_at(deck_cache, {'1': now - 10 * 24 * 60 * 60, '2': now - 100, '3': now - 200, '4': now - 300})
+    deck_cache.configure(max_size_bytes=deck_cache.file_sizes['2'] + deck_cache.file_sizes['3'], max_unused_days=7)
+
+    assert deck_cache.evict() == 2
+    assert sorted(deck_cache.get_deck_ids()) == ['2', '3']
+
+
+def test_last_used_times_survive_a_reload(deck_cache):
+    now = time.time()
+    cache_decks_used_at(deck_cache, {'1': now - 100, '2': now - 300, '3': now - 200})
+    deck_cache.evict()
+
+    # Stray files in the cache directory are neither decks nor evicted
+    with open(os.path.join(deck_cache.cache_dir, '.DS_Store'), 'w') as stray_file:
+        stray_file.write('stray')
+    reloaded_cache = mtggoldfish.DeckCache(deck_cache.cache_dir)
+    reloaded_cache.configure(max_decks=1)
+
+    assert sorted(reloaded_cache.get_deck_ids()) == ['1', '2', '3']
+    assert reloaded_cache.evict() == 2
+    assert reloaded_cache.get_deck_ids() == ['1']
+    assert os.path.isfile(os.path.join(deck_cache.cache_dir, '.DS_Store'))
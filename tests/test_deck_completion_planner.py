@@ -0,0 +1,60 @@
+import itertools
+import random
+
+import mtggoldfish
+from conftest import build_deck
+
+
+def build_random_decks(randomizer, card_prices, num_decks):
+    return [build_deck(str(deck_id), [("Card %d" % (card_index), randomizer.randint(1, 4), card_prices[card_index])
+                                      for card_index in randomizer.sample(range(len(card_prices)), 8)])
+            for deck_id in range(num_decks)]
+
+
+"""
+Find the plan completing the most decks (and, among those, spending the least) by trying every set of decks
+"""
+def plan_by_brute_force(decks, owned_card_quantities, card_prices, spend_limit):
+    best_plan = (0, 0.0)
+    for num_decks in range(1, len(decks) + 1):
+        for deck_set in itertools.combinations(decks, num_decks):
+            needed_quantities = {}
+            for deck in deck_set:
+                for card_entry in deck.get_deck_list():
+                    card_name = card_entry[mtggoldfish.CARD_NAME_KEY]
+                    needed_quantities[card_name] = max(needed_quantities.get(card_name, 0), card_entry[mtggoldfish.CARD_QTY_KEY])
+            spend = sum(max(0, card_quantity - owned_card_quantities.get(card_name, 0)) * card_prices[int(card_name.split()[1])]
+                        for (card_name, card_quantity) in needed_quantities.items())
+            if spend <= spend_limit and (num_decks > best_plan[0] or (num_decks == best_plan[0] and spend < best_plan[1] - 1e-9)):
+                best_plan = (num_decks, spend)
+    return best_plan
+
+
+def test_plan_matches_brute_force():
+    randomizer = random.Random(1)
+    card_prices = [round(randomizer.expovariate(1 / 3.0), 2) for card_index in range(60)]
+    for trial in range(40):
+        decks = build_random_decks(randomizer, card_prices, 9)
+        owned_cards = [{mtggoldfish.CARD_NAME_KEY: "Card %d" % (card_index), mtggoldfish.CARD_QTY_KEY: randomizer.randint(1, 4)}
+                       for card_index in randomizer.sample(range(60), 20)]
+        spend_limit = randomizer.uniform(10, 120)
+
+        plan = mtggoldfish.DeckCompletionPlanner(decks).plan(owned_cards, spend_limit, 10 ** 6)
+
+        owned_card_quantities = dict((owned_card[mtggoldfish.CARD_NAME_KEY], owned_card[mtggoldfish.CARD_QTY_KEY]) for owned_card in owned_cards)
+        (best_num_decks, best_spend) = plan_by_brute_force(decks, owned_card_quantities, card_prices, spend_limit)
+        assert plan[mtggoldfish.PLAN_IS_OPTIMAL_KEY]
+        assert len(plan[mtggoldfish.COMPLETED_DECKS_KEY]) == best_num_decks
+        assert abs(plan[mtggoldfish.TOTAL_SPEND_KEY] - best_spend) < 1e-6
+        assert abs(sum(step[mtggoldfish.STEP_COST_KEY] for step in plan[mtggoldfish.COMPLETED_DECKS_KEY]) - plan[mtggoldfish.TOTAL_SPEND_KEY]) < 1e-6
+
+
+def test_search_deeper_than_the_recursion_limit():
+    # Every card is shared by a pair of decks, so no deck has an exclusive cost and the bound never cuts the search short
+    decks = [build_deck(str(deck_id), [("Card %d" % (deck_id // 2), 1, 1.0)]) for deck_id in range(1500)]
+
+    plan = mtggoldfish.DeckCompletionPlanner(decks).plan([], 400.0, 3000)
+
+    assert len(plan[mtggoldfish.COMPLETED_DECKS_KEY]) == 800
+    assert plan[mtggoldfish.TOTAL_SPEND_KEY] == 400.0
+    assert not plan[mtggoldfish.PLAN_IS_OPTIMAL_KEY]
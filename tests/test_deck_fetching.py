@@ -0,0 +1,230 @@
+import threading
+import time
+
+import pytest
+from six.moves import BaseHTTPServer, socketserver
+
+import mtggoldfish
+from conftest import build_deck
+
+
+"""
+Stands in for MTGGoldfish.com by serving the plain-text decklist of every deck. The first throttled_requests requests are
+answered with a 429 and the given Retry-After header, and every response is delayed by delay_seconds.
+"""
+class StandInServer(object):
+    def __init__(self, decklist_text, throttled_requests=0, retry_after=None, delay_seconds=0.0):
+        self.decklist_text = decklist_text
+        self.throttled_requests = throttled_requests
+        self.retry_after = retry_after
+        self.delay_seconds = delay_seconds
+        self.num_requests = 0
+        self.num_in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+        stand_in = self
+
+        class StandInRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stand_in.lock:
+                    stand_in.num_requests += 1
+                    stand_in.num_in_flight += 1
+                    stand_in.peak_in_flight = max(stand_in.peak_in_flight, stand_in.num_in_flight)
+                    is_throttled = stand_in.num_requests <= stand_in.throttled_requests
+                try:
+                    time.sleep(stand_in.delay_seconds)
+                    if is_throttled:
+                        self.send_response(429)
+                        if stand_in.retry_after is not None:
+                            self.send_header('Retry-After', stand_in.retry_after)
+                        self.end_headers()
+                        return
+
+                    body = stand_in.decklist_text.encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stand_in.lock:
+                        stand_in.num_in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        server_class = type('StandInHTTPServer', (socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer), {'daemon_threads': True})
+        self.server = server_class(('127.0.0.1', 0), StandInRequestHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def get_deck_url(self, deck_id):
+        return "http://127.0.0.1:%d/deck/%s#paper" % (self.server.server_address[1], deck_id)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+DECKLIST_TEXT = "4 Goblin Guide\n4 Lightning Bolt\n10 Mountain\n\n2 Smash to Smithereens\n"
+CACHED_DECK_CARDS = [('Goblin Guide', 4, 2.0), ('Lightning Bolt', 4, 1.0), ('Smash to Smithereens', 2, 0.25)]
+
+
+@pytest.fixture
+def price_book(deck_cache):
+    price_book = mtggoldfish.PriceBook(mtggoldfish.PRICE_TYPE_PAPER)
+    price_book.add_deck(build_deck('1', CACHED_DECK_CARDS, prices_fetched_time=time.time()))
+    return price_book
+
+
+@pytest.fixture
+def no_browser(monkeypatch):
+    def new_web_driver():
+        raise RuntimeError("The stand-in server has no deck pages")
+    monkeypatch.setattr(mtggoldfish, 'new_web_driver', new_web_driver)
+
+
+def start_stand_in_server(request, *args, **kwargs):
+    stand_in = StandInServer(*args, **kwargs)
+    request.addfinalizer(stand_in.stop)
+    return stand_in
+
+
+def cache_decks(deck_cache, deck_ids):
+    for deck_id in deck_ids:
+        deck_cache.save(build_deck(deck_id, CACHED_DECK_CARDS, prices_fetched_time=time.time()), deck_id)
+
+
+def test_limit_grows_additively_with_fast_fetches():
+    controller = mtggoldfish.AdaptiveConcurrencyController(1, 4, 10.0)
+    limits = []
+    for fetch_index in range(12):
+        controller.release(controller.acquire(), mtggoldfish.FETCH_OUTCOME_SUCCESS)
+        limits.append(controller.get_limit())
+
+    # Each success adds 1/limit, so growing from a limit of n to n + 1 takes about n fast fetches
+    assert limits == sorted(limits)
+    assert limits[:6] == [2, 2, 2, 3, 3, 3]
+    assert limits[-1] == 4
+
+
+def test_limit_is_halved_once_per_round():
+    controller = mtggoldfish.AdaptiveConcurrencyController(1, 8, 10.0)
+    controller.limit = 8.0
+    fetch_start_times = [controller.acquire() for fetch_index in range(8)]
+    for fetch_start_time in fetch_start_times:
+        controller.release(fetch_start_time, mtggoldfish.FETCH_OUTCOME_ERROR)
+    assert controller.get_limit() == 4
+
+    controller.release(controller.acquire(), mtggoldfish.FETCH_OUTCOME_ERROR)
+    assert controller.get_limit() == 2
+
+
+def test_slow_fetch_decreases_limit():
+    controller = mtggoldfish.AdaptiveConcurrencyController(1, 4, 10.0)
+    controller.limit = 4.0
+    controller.release(controller.acquire() - 11.0, mtggoldfish.FETCH_OUTCOME_SUCCESS)
+    assert controller.get_limit() == 2
+
+
+def test_text_decklist_is_priced_from_price_book(request, deck_cache, price_book):
+    stand_in = start_stand_in_server(request, DECKLIST_TEXT)
+    cache_decks(deck_cache, ['7'])
+
+    (deck, cached_deck) = mtggoldfish.fetch_deck_from_text_decklist(stand_in.get_deck_url('7'), '7', mtggoldfish.PRICE_TYPE_PAPER, price_book)
+
+    assert [(card_entry[mtggoldfish.CARD_NAME_KEY], card_entry[mtggoldfish.CARD_QTY_KEY], card_entry[mtggoldfish.CARD_PRICE_KEY])
+            for card_entry in deck.get_deck_list()] == CACHED_DECK_CARDS
+    assert deck.get_deck_price() == 12.5
+    assert deck.page_hash is None and deck.prices_fetched_time is None
+    assert cached_deck.get_deck_name() == "Deck 7"
+
+
+def test_text_decklist_without_price_falls_back_to_deck_page(request, deck_cache, price_book):
+    stand_in = start_stand_in_server(request, DECKLIST_TEXT + "1 Eidolon of the Great Revel\n")
+    cache_decks(deck_cache, ['7'])
+
+    assert mtggoldfish.fetch_deck_from_text_decklist(stand_in.get_deck_url('7'), '7', mtggoldfish.PRICE_TYPE_PAPER, price_book) is None
+
+
+def test_throttled_fetch_waits_for_retry_after(request, deck_cache, price_book, no_browser):
+    stand_in = start_stand_in_server(request, DECKLIST_TEXT, throttled_requests=1, retry_after='1')
+    cache_decks(deck_cache, ['7'])
+    controller = mtggoldfish.AdaptiveConcurrencyController(1, 4, 10.0)
+    worker = mtggoldfish.DeckFetchWorker(controller, False, price_book)
+
+    fetch_start_time = time.time()
+    fetched_deck = worker.fetch_deck(stand_in.get_deck_url('7'), '7')
+
+    assert fetched_deck is not None and fetched_deck[2]
+    assert time.time() - fetch_start_time >= 1.0
+    assert stand_in.num_requests == 2
+    stats = controller.get_stats()
+    assert stats[mtggoldfish.FETCH_OUTCOME_THROTTLED] == 1 and stats[mtggoldfish.FETCH_OUTCOME_SUCCESS] == 1
+
+
+def test_fetch_gives_up_after_max_attempts(request, monkeypatch, deck_cache, price_book, no_browser):
+    monkeypatch.setattr(mtggoldfish, 'FETCH_MAX_ATTEMPTS', 3)
+    stand_in = start_stand_in_server(request, DECKLIST_TEXT, throttled_requests=100, retry_after='0')
+    cache_decks(deck_cache, ['7'])
+    controller = mtggoldfish.AdaptiveConcurrencyController(1, 4, 10.0)
+
+    assert mtggoldfish.DeckFetchWorker(controller, False, price_book).fetch_deck(stand_in.get_deck_url('7'), '7') is None
+    assert stand_in.num_requests == 3
+    assert controller.get_stats()[mtggoldfish.FETCH_OUTCOME_THROTTLED] == 3
+
+
+def test_failed_fetch_raises_deck_fetch_error(request, monkeypatch, deck_cache, price_book, no_browser):
+    monkeypatch.setattr(mtggoldfish, 'FETCH_MAX_ATTEMPTS', 2)
+    stand_in = start_stand_in_server(request, DECKLIST_TEXT, throttled_requests=100, retry_after='0')
+    cache_decks(deck_cache, ['7'])
+
+    with pytest.raises(mtggoldfish.DeckFetchError):
+        mtggoldfish.parse_decks_from_list_of_urls(True, [stand_in.get_deck_url('7')], False)
+
+
+def test_concurrent_fetches_ramp_up_to_max_in_flight(request, deck_cache, price_book, no_browser):
+    stand_in = start_stand_in_server(request, DECKLIST_TEXT, delay_seconds=0.05)
+    deck_ids = [str(deck_id) for deck_id in range(10, 30)]
+    cache_decks(deck_cache, deck_ids)
+
+    (fetched_decks, failed_deck_URLs, stats) = mtggoldfish.fetch_decks_concurrently(
+        [(stand_in.get_deck_url(deck_id), deck_id) for deck_id in deck_ids], False, price_book, mtggoldfish.SilentProgressBar())
+
+    assert failed_deck_URLs == []
+    assert sorted(fetched_decks) == sorted(deck_ids)
+    assert 1 < stats['peak in flight'] <= mtggoldfish.FETCH_MAX_IN_FLIGHT
+    assert stand_in.peak_in_flight <= mtggoldfish.FETCH_MAX_IN_FLIGHT
+
+
+def test_deck_page_prices_ignore_currency_and_separators():
+    deck = mtggoldfish.build_deck_from_page_data("https://www.mtggoldfish.com/deck/7#paper", {
+        'title': "Grixis Shadow\nby someone", 'description': "Deck Source\nOct 05, 2017",
+        'rows': [['4', 'Scalding Tarn', 'ZEN', '$ 1,271.96'], ['1', 'Thoughtseize', 'THS', '\n12.50\n'], ['Creatures (2)'],
+                 ['2', 'Island', 'UNH', '$ 0.50']]})
+
+    assert [(card_entry[mtggoldfish.CARD_QTY_KEY], card_entry[mtggoldfish.CARD_PRICE_KEY]) for card_entry in deck.get_deck_list()] == [
+        (4, 317.99), (1, 12.5)]
+    assert abs(deck.get_deck_price() - 1284.46) < 1e-9
+
+
+def test_landing_page_tile_without_url_raises(monkeypatch):
+    driver_quits = []
+
+    class StandInDriver(object):
+        def get(self, url):
+            pass
+
+        def execute_script(self, script, *args):
+            return [{'url': "https://www.mtggoldfish.com/deck/1#paper", 'share': None}, {'url': None, 'share': None}]
+
+        def quit(self):
+            driver_quits.append(True)
+
+    monkeypatch.setattr(mtggoldfish, 'new_web_driver', StandInDriver)
+    monkeypatch.setattr(mtggoldfish, 'wait_for_element_by_class_name', lambda driver, class_name: None)
+
+    with pytest.raises(mtggoldfish.DeckFetchError):
+        mtggoldfish.parse_deck_urls_from_category_landing_page("https://www.mtggoldfish.com/decks/budget/modern#paper")
+    assert driver_quits == [True]
@@ -0,0 +1,90 @@
+import pickle
+
+import mtggoldfish
+
+
+OWNED_CARDS = [{mtggoldfish.CARD_NAME_KEY: 'Lightning Bolt', mtggoldfish.CARD_QTY_KEY: 4},
+               {mtggoldfish.CARD_NAME_KEY: 'Goblin Guide', mtggoldfish.CARD_QTY_KEY: 2}]
+
+
+def test_results_are_reused_after_reload(tmpdir):
+    cache_file_path = str(tmpdir.join('evaluation_cache'))
+    owned_result = {mtggoldfish.SAVED_VALUE_KEY: 4.0, mtggoldfish.CARD_LIST_KEY: [{mtggoldfish.CARD_NAME_KEY: 'Lightning Bolt'}]}
+    evaluation_cache = mtggoldfish.EvaluationCache(OWNED_CARDS, cache_file_path)
+    evaluation_cache.get_result(mtggoldfish.REPORT_SECTION_OWNED_CARDS, '1', 'hash 1', True, lambda: owned_result)
+    evaluation_cache.get_result(mtggoldfish.REPORT_SECTION_BUDGET, ('desired', '2'), ('hash 1', 'hash 2'), True, lambda: None)
+    evaluation_cache.save()
+
+    evaluation_cache = mtggoldfish.EvaluationCache(OWNED_CARDS, cache_file_path)
+    assert evaluation_cache.changed_card_keys == set()
+    assert evaluation_cache.get_result(mtggoldfish.REPORT_SECTION_OWNED_CARDS, '1', 'hash 1', False, lambda: None) == owned_result
+    assert evaluation_cache.get_result(mtggoldfish.REPORT_SECTION_BUDGET, ('desired', '2'), ('hash 1', 'hash 2'), False, lambda: 'evaluated') is None
+    assert (evaluation_cache.reused_result_count, evaluation_cache.evaluated_result_count) == (2, 0)
+
+
+def test_changed_cards_are_found(tmpdir):
+    cache_file_path = str(tmpdir.join('evaluation_cache'))
+    mtggoldfish.EvaluationCache(OWNED_CARDS, cache_file_path).save()
+
+    edited_owned_cards = [dict(OWNED_CARDS[0]), {mtggoldfish.CARD_NAME_KEY: 'Goblin Guide', mtggoldfish.CARD_QTY_KEY: 4}]
+    evaluation_cache = mtggoldfish.EvaluationCache(edited_owned_cards, cache_file_path)
+    assert evaluation_cache.changed_card_keys == set([mtggoldfish.get_card_key('Goblin Guide')])
+
+
+class Unpickled(object):
+    unpickled = False
+
+    def __reduce__(self):
+        return (mark_unpickled, ())
+
+
+def mark_unpickled():
+    Unpickled.unpickled = True
+    return {}
+
+
+def test_pickled_cache_is_never_unpickled(tmpdir, capsys):
+    cache_file_path = str(tmpdir.join('evaluation_cache'))
+    with open(cache_file_path, 'wb') as cache_file:
+        pickle.dump(Unpickled(), cache_file, pickle.HIGHEST_PROTOCOL)
+
+    evaluation_cache = mtggoldfish.EvaluationCache(OWNED_CARDS, cache_file_path)
+
+    assert not Unpickled.unpickled
+    assert evaluation_cache.changed_card_keys is None
+    assert "[WARNING]" in capsys.readouterr().out
+
+
+def evaluate_saved_value(owned_cards, cache_file_path, analysis_names):
+    evaluation_cache = mtggoldfish.EvaluationCache(owned_cards, cache_file_path)
+    owned_cards_by_key = mtggoldfish.build_card_entry_index(owned_cards)
+    saved_values = {}
+
+    # The evaluated deck plays every owned card, so it is affected by any change to the collection
+    deck_is_affected = evaluation_cache.changed_card_keys is None or len(evaluation_cache.changed_card_keys) > 0
+    for analysis_name in analysis_names:
+        saved_values[analysis_name] = evaluation_cache.get_result(analysis_name, '1', 'hash 1', deck_is_affected,
+                                                                  lambda: sum(card_entry[mtggoldfish.CARD_QTY_KEY] for card_entry in owned_cards_by_key.values()))
+    evaluation_cache.save()
+    return saved_values
+
+
+def test_results_of_analyses_skipped_after_a_collection_change_are_dropped(tmpdir):
+    cache_file_path = str(tmpdir.join('evaluation_cache'))
+    edited_owned_cards = [dict(OWNED_CARDS[0]), {mtggoldfish.CARD_NAME_KEY: 'Goblin Guide', mtggoldfish.CARD_QTY_KEY: 4}]
+    both_analyses = [mtggoldfish.REPORT_SECTION_OWNED_CARDS, mtggoldfish.REPORT_SECTION_METAGAME]
+
+    # Run with both analyses, then edit the collection and run without the Metagame Recommendation, then run with it again
+    assert evaluate_saved_value(OWNED_CARDS, cache_file_path, both_analyses) == dict((analysis_name, 6) for analysis_name in both_analyses)
+    assert evaluate_saved_value(edited_owned_cards, cache_file_path, both_analyses[:1]) == {mtggoldfish.REPORT_SECTION_OWNED_CARDS: 8}
+    assert evaluate_saved_value(edited_owned_cards, cache_file_path, both_analyses) == dict((analysis_name, 8) for analysis_name in both_analyses)
+
+
+def test_results_of_skipped_analyses_are_kept_while_the_collection_is_unchanged(tmpdir):
+    cache_file_path = str(tmpdir.join('evaluation_cache'))
+    both_analyses = [mtggoldfish.REPORT_SECTION_OWNED_CARDS, mtggoldfish.REPORT_SECTION_METAGAME]
+    evaluate_saved_value(OWNED_CARDS, cache_file_path, both_analyses)
+    evaluate_saved_value(OWNED_CARDS, cache_file_path, both_analyses[:1])
+
+    evaluation_cache = mtggoldfish.EvaluationCache(OWNED_CARDS, cache_file_path)
+    assert evaluation_cache.get_result(mtggoldfish.REPORT_SECTION_METAGAME, '1', 'hash 1', False, lambda: None) == 6
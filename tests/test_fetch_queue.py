@@ -0,0 +1,148 @@
+import sqlite3
+import time
+
+import pytest
+
+import mtggoldfish
+from conftest import build_deck
+
+
+DECK_URLS = ["https://www.mtggoldfish.com/deck/1#paper", "https://www.mtggoldfish.com/deck/2#paper"]
+
+
+@pytest.fixture
+def queue_file_path(tmpdir):
+    return str(tmpdir.join('fetch_queue.sqlite'))
+
+
+"""
+Open one connection to the queue per worker, the way separate worker processes would
+"""
+@pytest.fixture
+def open_queue(request, queue_file_path):
+    def open_fetch_queue():
+        fetch_queue = mtggoldfish.FetchQueue(queue_file_path)
+        request.addfinalizer(fetch_queue.close)
+        return fetch_queue
+    return open_fetch_queue
+
+
+def get_statuses(fetch_queue, use_online_price=False):
+    return dict((deck_id, status) for (deck_id, (status, last_error)) in fetch_queue.get_task_statuses(['1', '2'], use_online_price).items())
+
+
+def test_expired_lease_goes_to_another_worker(open_queue):
+    publisher = open_queue()
+    first_worker = open_queue()
+    second_worker = open_queue()
+    publisher.publish(DECK_URLS, False, time.time())
+
+    assert first_worker.claim('first', lease_seconds=-1) == ('1', DECK_URLS[0], False)
+    assert second_worker.claim('second') == ('1', DECK_URLS[0], False)
+    assert first_worker.claim('first') == ('2', DECK_URLS[1], False)
+
+    # The first worker's lease on deck 1 expired, so completing it late changes nothing
+    first_worker.complete('1', False, 'first')
+    assert get_statuses(publisher) == {'1': mtggoldfish.FETCH_TASK_CLAIMED, '2': mtggoldfish.FETCH_TASK_CLAIMED}
+    second_worker.complete('1', False, 'second')
+    first_worker.complete('2', False, 'first')
+    assert get_statuses(publisher) == {'1': mtggoldfish.FETCH_TASK_DONE, '2': mtggoldfish.FETCH_TASK_DONE}
+    assert second_worker.claim('second') is None
+
+
+def test_live_lease_is_not_handed_out_again(open_queue):
+    publisher = open_queue()
+    publisher.publish(DECK_URLS[:1], False, time.time())
+
+    assert open_queue().claim('first') is not None
+    assert open_queue().claim('second') is None
+
+
+def test_paper_and_online_fetches_are_separate_tasks(open_queue):
+    fetch_queue = open_queue()
+    fetch_queue.publish(DECK_URLS[:1], False, time.time())
+    fetch_queue.publish(DECK_URLS[:1], True, time.time())
+    fetch_queue.publish(DECK_URLS[:1], True, time.time())
+
+    assert fetch_queue.claim('worker') == ('1', DECK_URLS[0], False)
+    assert fetch_queue.claim('worker') == ('1', DECK_URLS[0], True)
+    assert fetch_queue.claim('worker') is None
+
+    fetch_queue.complete('1', True, 'worker')
+    assert get_statuses(fetch_queue, False) == {'1': mtggoldfish.FETCH_TASK_CLAIMED}
+    assert get_statuses(fetch_queue, True) == {'1': mtggoldfish.FETCH_TASK_DONE}
+
+
+def test_deck_fetched_after_cache_check_is_not_queued_again(open_queue):
+    fetch_queue = open_queue()
+    cache_checked_time = time.time()
+    fetch_queue.publish(DECK_URLS[:1], False, cache_checked_time)
+    fetch_queue.claim('worker')
+    fetch_queue.complete('1', False, 'worker')
+
+    # A second publisher checked the cache before the deck was written, so the fetch it asks for has already happened
+    fetch_queue.publish(DECK_URLS[:1], False, cache_checked_time)
+    assert get_statuses(fetch_queue) == {'1': mtggoldfish.FETCH_TASK_DONE}
+
+    # A publisher that checked the cache after the deck was written wants it fetched again, e.g. to update the cache
+    fetch_queue.publish(DECK_URLS[:1], False, time.time() + 1)
+    assert get_statuses(fetch_queue) == {'1': mtggoldfish.FETCH_TASK_PENDING}
+
+
+def test_deck_is_given_up_on_after_max_attempts(monkeypatch, open_queue):
+    monkeypatch.setattr(mtggoldfish, 'FETCH_QUEUE_MAX_ATTEMPTS', 2)
+    fetch_queue = open_queue()
+    fetch_queue.publish(DECK_URLS[:1], False, time.time())
+
+    fetch_queue.claim('worker')
+    fetch_queue.fail('1', False, 'worker', "timed out")
+    assert get_statuses(fetch_queue) == {'1': mtggoldfish.FETCH_TASK_PENDING}
+    fetch_queue.claim('worker')
+    fetch_queue.fail('1', False, 'worker', "timed out again")
+    assert fetch_queue.get_task_statuses(['1'], False) == {'1': (mtggoldfish.FETCH_TASK_FAILED, "timed out again")}
+
+    # A deck that was given up on is always queued again
+    fetch_queue.publish(DECK_URLS[:1], False, 0.0)
+    assert fetch_queue.get_task_statuses(['1'], False) == {'1': (mtggoldfish.FETCH_TASK_PENDING, None)}
+
+
+def test_queue_keyed_by_deck_alone_is_carried_over(queue_file_path, open_queue):
+    connection = sqlite3.connect(queue_file_path)
+    connection.execute("CREATE TABLE fetch_tasks (deck_id TEXT PRIMARY KEY, deck_url TEXT NOT NULL, use_online_price INTEGER NOT NULL,"
+                       " status TEXT NOT NULL, worker_id TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)")
+    connection.execute("INSERT INTO fetch_tasks (deck_id, deck_url, use_online_price, status) VALUES (?, ?, ?, ?)",
+                       ('1', DECK_URLS[0], 0, mtggoldfish.FETCH_TASK_PENDING))
+    connection.commit()
+    connection.close()
+
+    fetch_queue = open_queue()
+    fetch_queue.publish(DECK_URLS[:1], True, time.time())
+    assert fetch_queue.claim('worker') == ('1', DECK_URLS[0], False)
+    assert fetch_queue.claim('worker') == ('1', DECK_URLS[0], True)
+
+
+def test_coordinator_fetches_queued_decks_on_a_single_box(monkeypatch, deck_cache, open_queue):
+    fetched_deck_ids = []
+
+    class StandInDriver(object):
+        def get(self, deck_url):
+            pass
+
+        def quit(self):
+            pass
+
+    def fetch_deck_from_page(driver, deck_url, deck_id, use_online_price):
+        fetched_deck_ids.append(deck_id)
+        mtggoldfish.DECK_CACHE.save(build_deck(deck_id, [('Lightning Bolt', 4, 1.0)]), deck_id)
+
+    monkeypatch.setattr(mtggoldfish, 'new_web_driver', StandInDriver)
+    monkeypatch.setattr(mtggoldfish, 'fetch_deck_from_page', fetch_deck_from_page)
+    fetch_queue = open_queue()
+
+    decks = mtggoldfish.parse_decks_from_list_of_urls(False, DECK_URLS, False, fetch_queue=fetch_queue)
+    assert [deck.get_deck_name() for deck in decks] == ["Deck 1", "Deck 2"]
+    assert sorted(fetched_deck_ids) == ['1', '2']
+
+    # Both decks are cached now, so a second run doesn't queue them again
+    mtggoldfish.parse_decks_from_list_of_urls(False, DECK_URLS, False, fetch_queue=fetch_queue)
+    assert sorted(fetched_deck_ids) == ['1', '2']